@@ -0,0 +1,144 @@
+"""Benchmark: LLM request throughput with ainvoke vs threads running invoke.
+
+A stub server in a child process (so its threads do not compete with the
+client for the GIL) answers ``POST /chat/completions`` after
+``--llm-latency`` seconds. ``--requests`` calls are issued at each
+concurrency level (1, 10 and 100 by default) with:
+
+- async:   asyncio.gather over LLM.ainvoke, capped by set_max_concurrency
+- threads: a ThreadPoolExecutor of that many workers calling LLM.invoke
+
+Reported per level: requests per second and p50/p95 latency of a call
+(each of ``concurrency`` workers issues calls back to back).
+With an endpoint that only waits, throughput should grow with concurrency
+until the client or the server saturates; the async variant gets there on
+one thread.
+
+Usage (from 3_Building_Agents/):
+    python benchmarks/async_throughput.py [--requests 200] [--levels 1 10 100] [--llm-latency 0.05]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "exercises"))
+
+from lib.llm import LLM, set_max_concurrency  # noqa: E402
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def serve(latency: float, ports):
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.latency = latency
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_server(latency: float):
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(latency, ports), daemon=True)
+    process.start()
+    return process, ports.get()
+
+
+def timed(call, *args):
+    start = time.perf_counter()
+    call(*args)
+    return time.perf_counter() - start
+
+
+async def run_async(llm: LLM, requests: int, concurrency: int):
+    set_max_concurrency(concurrency)
+
+    queue = iter(range(requests))
+    latencies = []
+
+    async def worker():
+        for i in queue:
+            start = time.perf_counter()
+            await llm.ainvoke(f"question {i}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(llm.ainvoke("warm up") for _ in range(concurrency)))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+def run_threads(llm: LLM, requests: int, concurrency: int):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(llm.invoke, ["warm up"] * concurrency))
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda i: timed(llm.invoke, f"question {i}"), range(requests)))
+        return time.perf_counter() - start, latencies
+
+
+def report(name, concurrency, elapsed, latencies, requests):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:>8} {concurrency:>6} {requests / elapsed:>10.1f} "
+          f"{statistics.median(latencies) * 1000:>9.1f} {p95 * 1000:>9.1f}")
+    return requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="calls per concurrency level")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 100], help="concurrency levels")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per LLM call")
+    args = parser.parse_args()
+
+    server, port = start_server(args.llm_latency)
+    llm = LLM(model="stub", api_key="stub-key", base_url=f"http://127.0.0.1:{port}")
+
+    print(f"{args.requests} requests per level, LLM {args.llm_latency:.3f}s per call")
+    print(f"{'variant':>8} {'conc.':>6} {'req/s':>10} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for concurrency in args.levels:
+        elapsed, latencies = asyncio.run(run_async(llm, args.requests, concurrency))
+        rate = report("async", concurrency, elapsed, latencies, args.requests)
+        elapsed, latencies = run_threads(llm, args.requests, concurrency)
+        report("threads", concurrency, elapsed, latencies, args.requests)
+        print(f"{'':>8} {'':>6} ideal {concurrency / args.llm_latency:>8.1f}  (async at {rate * args.llm_latency / concurrency:.0%})")
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark: a fresh OpenAI client per LLM call vs the shared pooled client.
+
+A local stub server answers ``POST /chat/completions`` with a canned tool
+call, so only client-side costs are measured. Every iteration mirrors one
+pass of the Agent tool loop (build the LLM adapter if needed, invoke it):
+
+- fresh:  ``LLM(client=OpenAI(...))`` per iteration (what Agent steps used to do)
+- shared: one ``LLM`` reusing ``lib.llm.shared_client`` for every iteration
+
+The report shows latency per iteration and how many TCP connections the
+server accepted. The stub speaks plain HTTP on localhost, so the saving
+excludes TLS handshakes and network round trips, which a real endpoint adds
+to every new connection.
+
+Usage (from 3_Building_Agents/):
+    python benchmarks/llm_client_pooling.py [--iterations 200]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "exercises"))
+
+from openai import OpenAI  # noqa: E402
+
+from lib.llm import LLM  # noqa: E402
+from lib.messages import SystemMessage, UserMessage  # noqa: E402
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "tool_calls",
+        "message": {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": "call_0",
+                "type": "function",
+                "function": {"name": "lookup", "arguments": "{\"query\": \"stub\"}"},
+            }],
+        },
+    }],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(server, make_llm, iterations: int):
+    messages = [SystemMessage(content="You are a helpful agent."), UserMessage(content="Look this up")]
+    server.connections = 0
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        make_llm().invoke(messages)
+        timings.append(time.perf_counter() - start)
+    return timings, server.connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    shared = LLM(model="stub", api_key="stub-key", base_url=base_url)
+    variants = {
+        "fresh": lambda: LLM(model="stub", client=OpenAI(api_key="stub-key", base_url=base_url)),
+        "shared": lambda: shared,
+    }
+    for make_llm in variants.values():
+        measure(server, make_llm, 5)  # warm up imports and the shared pool
+
+    print(f"{args.iterations} iterations against {base_url}")
+    print(f"{'variant':>8} {'mean (ms)':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'connections':>12}")
+    means = {}
+    for name, make_llm in variants.items():
+        timings, connections = measure(server, make_llm, args.iterations)
+        timings.sort()
+        means[name] = statistics.mean(timings)
+        print(f"{name:>8} {means[name] * 1000:>10.2f} {timings[len(timings) // 2] * 1000:>9.2f} "
+              f"{timings[int(len(timings) * 0.95)] * 1000:>9.2f} {connections:>12}")
+    print(f"saved per iteration: {(means['fresh'] - means['shared']) * 1000:.2f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
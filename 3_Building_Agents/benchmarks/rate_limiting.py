@@ -0,0 +1,169 @@
+"""Benchmark: a burst of LLM calls against a rate-limited endpoint.
+
+A fake provider in a child process answers ``POST /chat/completions`` after
+``--llm-latency`` seconds while its own token buckets (``--rpm`` requests
+and ``--tpm`` tokens per minute, enforced per second) allow it, and with
+429 plus ``Retry-After`` / ``retry-after-ms`` headers otherwise. A batch of
+``--calls`` LLM.invoke() calls is issued from ``--workers`` threads with:
+
+- client:  LLM(...) (the OpenAI client's own retries: 2, honouring Retry-After)
+- limiter: LLM(..., rate_limiter=RateLimiter(rpm, tpm)) shared by the workers
+
+Reported per variant: calls that succeeded or failed, 429s the server sent,
+wall time, and for the limiter the mean time a call waited in the limiter
+(queue and backoff) versus the time spent in requests.
+
+Usage (from 3_Building_Agents/):
+    python benchmarks/rate_limiting.py [--calls 200] [--workers 32] [--rpm 1200] [--tpm 200000]
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "exercises"))
+
+from lib.llm import LLM  # noqa: E402
+from lib.rate_limiting import RateLimiter, TokenBucket  # noqa: E402
+
+COMPLETION_TOKENS = 40
+
+
+def completion(prompt_tokens: int) -> bytes:
+    return json.dumps({
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": COMPLETION_TOKENS,
+                  "total_tokens": prompt_tokens + COMPLETION_TOKENS},
+    }).encode("utf-8")
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """Chat completions behind per-second request and token buckets"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/stats"):
+            return self._send(200, json.dumps(self.server.counts).encode("utf-8"))
+        prompt_tokens = len(body) // 4
+        server = self.server
+        with server.lock:
+            now = time.monotonic()
+            tokens = prompt_tokens + COMPLETION_TOKENS
+            # Rejected requests do not count against the limits
+            wait = max(server.requests.wait_time(1, now), server.tokens.wait_time(tokens, now))
+            if wait > 0:
+                server.counts["throttled"] += 1
+            else:
+                server.requests.take(1)
+                server.tokens.take(tokens)
+                server.counts["served"] += 1
+        if wait > 0:
+            return self._send(429, b'{"error": {"message": "Rate limit reached", "type": "requests"}}', {
+                "retry-after-ms": str(int(wait * 1000)),
+                "Retry-After": str(math.ceil(wait)),
+            })
+        time.sleep(server.latency)
+        self._send(200, completion(prompt_tokens))
+
+    def _send(self, status, payload, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeProvider(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def serve(rpm: float, tpm: float, latency: float, ports):
+    server = FakeProvider(("127.0.0.1", 0), RateLimitedHandler)
+    # Per-minute limits enforced over one-second windows, as providers do
+    server.requests = TokenBucket(rpm, max(1.0, rpm / 60))
+    server.tokens = TokenBucket(tpm, tpm / 60)
+    server.latency = latency
+    server.lock = threading.Lock()
+    server.counts = {"served": 0, "throttled": 0}
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_provider(rpm: float, tpm: float, latency: float):
+    """Fake provider in a child process; returns (process, base_url)"""
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, args=(rpm, tpm, latency, ports), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{ports.get()}"
+
+
+def provider_counts(llm: LLM) -> dict:
+    return llm.client.post("/stats", body={}, cast_to=object)
+
+
+def run_batch(llm: LLM, calls: int, workers: int):
+    def call(i):
+        try:
+            llm.invoke(f"Question {i}: " + "context " * 50)
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(call, range(calls)))
+    return sum(results), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--rpm", type=float, default=1200, help="provider requests per minute")
+    parser.add_argument("--tpm", type=float, default=200_000, help="provider tokens per minute")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per served call")
+    args = parser.parse_args()
+
+    print(f"{args.calls} calls from {args.workers} threads; provider {args.rpm:.0f} RPM, "
+          f"{args.tpm:.0f} TPM, {args.llm_latency:.3f}s per call")
+    print(f"{'variant':>8} {'ok':>5} {'failed':>7} {'429s':>6} {'time (s)':>9} {'wait (s)':>9} {'server (s)':>11}")
+    for name in ("client", "limiter"):
+        # A fresh provider per variant, so both start with full buckets
+        process, base_url = start_provider(args.rpm, args.tpm, args.llm_latency)
+        limiter = RateLimiter(args.rpm, args.tpm) if name == "limiter" else None
+        llm = LLM(model="stub", api_key="stub-key", base_url=base_url, rate_limiter=limiter)
+        ok, elapsed = run_batch(llm, args.calls, args.workers)
+        counts = provider_counts(llm)
+        wait = server = "-"
+        if limiter is not None:
+            report = limiter.stats.report()
+            wait, server = f"{report['mean_wait_seconds']:.3f}", f"{report['mean_server_seconds']:.3f}"
+        print(f"{name:>8} {ok:>5} {args.calls - ok:>7} {counts['throttled']:>6} {elapsed:>9.2f} {wait:>9} {server:>11}")
+        if limiter is not None:
+            stats = limiter.stats
+            print(f"{'':>8} limiter: {stats.attempts} attempts, {stats.retries} retries, "
+                  f"{stats.estimated_tokens} tokens estimated vs {stats.used_tokens} used")
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
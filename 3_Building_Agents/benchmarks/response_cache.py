@@ -0,0 +1,126 @@
+"""Benchmark: repeated evaluation passes with and without the response cache.
+
+A local stub server answers ``POST /chat/completions`` after
+``--llm-latency`` seconds. An evaluation set of ``--questions`` prompts is
+run ``--passes`` times at temperature 0 with:
+
+- none:   LLM(...) (every call goes to the server)
+- memory: LLM(..., cache=ResponseCache()) (in-process LRU)
+- sqlite: the first pass in one ResponseCache, the later passes in a fresh
+          ResponseCache on the same SQLite file, as a rerun in a new
+          process would see it
+
+Reported per variant: wall time, requests that reached the server and the
+cache counters (hits, misses, bytes saved).
+
+Usage (from 3_Building_Agents/):
+    python benchmarks/response_cache.py [--questions 50] [--passes 3] [--llm-latency 0.05]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "exercises"))
+
+from lib.llm import LLM, ResponseCache  # noqa: E402
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": "A grounded answer of a few sentences. " * 5},
+    }],
+    "usage": {"prompt_tokens": 40, "completion_tokens": 40, "total_tokens": 80},
+}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(latency: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_pass(llm: LLM, questions):
+    for question in questions:
+        llm.invoke(question)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--passes", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per LLM call")
+    args = parser.parse_args()
+
+    server = start_server(args.llm_latency)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    questions = [f"Evaluation question {i}: which games were released in {1990 + i}?"
+                 for i in range(args.questions)]
+
+    def make_llm(cache=None) -> LLM:
+        return LLM(model="stub", temperature=0.0, api_key="stub-key", base_url=base_url, cache=cache)
+
+    print(f"{args.questions} questions x {args.passes} passes, LLM {args.llm_latency:.3f}s per call")
+    print(f"{'variant':>8} {'time (s)':>9} {'requests':>9} {'hits':>6} {'misses':>7} {'KiB saved':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "responses.db")
+        for name in ("none", "memory", "sqlite"):
+            server.requests = 0
+            cache = ResponseCache(path=path) if name == "sqlite" else ResponseCache() if name == "memory" else None
+            llm = make_llm(cache)
+            start = time.perf_counter()
+            run_pass(llm, questions)
+            if name == "sqlite":
+                # later passes run as a fresh process would: empty memory tier, same file
+                first = cache.stats
+                cache = ResponseCache(path=path)
+                llm = make_llm(cache)
+            for _ in range(args.passes - 1):
+                run_pass(llm, questions)
+            elapsed = time.perf_counter() - start
+            if cache is None:
+                print(f"{name:>8} {elapsed:>9.3f} {server.requests:>9} {'-':>6} {'-':>7} {'-':>10}")
+                continue
+            stats = cache.stats
+            hits = stats.hits + (first.hits if name == "sqlite" else 0)
+            misses = stats.misses + (first.misses if name == "sqlite" else 0)
+            print(f"{name:>8} {elapsed:>9.3f} {server.requests:>9} {hits:>6} {misses:>7} "
+                  f"{stats.bytes_saved / 1024:>10.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark: encoding Run objects with lib.archive vs pickle vs plain JSON.
+
+Builds synthetic agent-style runs (a tool-calling loop whose message list
+grows every step) and reports encode/decode throughput and bytes per run:
+
+- pickle:       pickle.dumps(run)
+- json:         every snapshot's full state through lib.serialization
+- archive:      lib.archive.encode_run (messages stored once per run)
+- archive+zlib: the same record, zlib-compressed
+
+Usage (from 3_Building_Agents/):
+    python benchmarks/run_serialization.py [--runs 200] [--turns 10]
+"""
+
+import argparse
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+from typing import Annotated, List, Optional, TypedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "exercises"))
+
+from lib.archive import encode_run, decode_run  # noqa: E402
+from lib.messages import AIMessage, SystemMessage, ToolMessage, UserMessage  # noqa: E402
+from lib.serialization import to_jsonable, from_jsonable  # noqa: E402
+from lib.state_machine import StateMachine, Step, EntryPoint, Termination, append  # noqa: E402
+from lib.tooling import ToolCall  # noqa: E402
+
+
+class ConversationState(TypedDict):
+    turn: int
+    turns: int
+    messages: Annotated[List[dict], append]
+    current_tool_calls: Optional[List[ToolCall]]
+
+
+def llm_step(state):
+    turn = state["turn"]
+    if turn < state["turns"]:
+        call = ToolCall(
+            id=f"call_{turn}", type="function",
+            function={"name": "lookup", "arguments": json.dumps({"query": f"question {turn}"})},
+        )
+        return {"messages": [AIMessage(content=None, tool_calls=[call])], "current_tool_calls": [call]}
+    return {"messages": [AIMessage(content="Final answer " * 20)], "current_tool_calls": None}
+
+
+def tool_step(state):
+    call = state["current_tool_calls"][0]
+    result = ToolMessage(content="result text " * 30, tool_call_id=call.id, name=call.function.name)
+    return {"messages": [result], "current_tool_calls": None, "turn": state["turn"] + 1}
+
+
+def build_machine() -> StateMachine[ConversationState]:
+    machine = StateMachine[ConversationState](ConversationState)
+    entry = EntryPoint[ConversationState]()
+    llm = Step[ConversationState]("llm", llm_step)
+    tools = Step[ConversationState]("tools", tool_step)
+    termination = Termination[ConversationState]()
+    machine.add_steps([entry, llm, tools, termination])
+    machine.connect(entry, llm)
+    machine.connect(llm, [tools, termination],
+                    lambda state: tools if state["current_tool_calls"] else termination)
+    machine.connect(tools, llm)
+    return machine
+
+
+def plain_json_encode(run) -> bytes:
+    return json.dumps([to_jsonable(s.state_data) for s in run.snapshots]).encode("utf-8")
+
+
+def plain_json_decode(data: bytes):
+    return [from_jsonable(state) for state in json.loads(data)]
+
+
+def measure(runs, encode, decode):
+    start = time.perf_counter()
+    encoded = [encode(run) for run in runs]
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in encoded:
+        decode(data)
+    decode_time = time.perf_counter() - start
+    size = sum(len(data) for data in encoded) / len(encoded)
+    return len(runs) / encode_time, len(runs) / decode_time, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=10, help="tool calls per run")
+    args = parser.parse_args()
+    logging.getLogger("lib.state_machine").setLevel(logging.WARNING)
+
+    machine = build_machine()
+    runs = [
+        machine.run({
+            "turn": 0, "turns": args.turns, "current_tool_calls": None,
+            "messages": [SystemMessage(content="You are a helpful agent."),
+                         UserMessage(content=f"Question number {i}")],
+        })
+        for i in range(args.runs)
+    ]
+
+    codecs = {
+        "pickle": (pickle.dumps, pickle.loads),
+        "json": (plain_json_encode, plain_json_decode),
+        "archive": (encode_run, decode_run),
+        "archive+zlib": (lambda run: encode_run(run, compress=True), decode_run),
+    }
+    print(f"{args.runs} runs, {len(runs[0].snapshots)} snapshots each")
+    print(f"{'codec':>13} {'encode runs/s':>14} {'decode runs/s':>14} {'bytes/run':>10}")
+    for name, (encode, decode) in codecs.items():
+        encode_rate, decode_rate, size = measure(runs, encode, decode)
+        print(f"{name:>13} {encode_rate:>14.0f} {decode_rate:>14.0f} {size:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark: memory held by ShortTermMemory over many agent sessions.
+
+Simulates an Agent serving ``--sessions`` distinct sessions, ``--turns``
+queries each: every turn loads the session's last run, continues its
+conversation through a tool-calling StateMachine (no LLM involved) and stores
+the result. Traced heap memory is reported as sessions accumulate:
+
+- unbounded: every full Run kept forever (what Agent used to do)
+- lru:       InMemorySessionStore(max_sessions) holding Run.final_only() copies
+- sqlite:    SqliteSessionStore(max_sessions) holding the same, on disk
+
+Usage (from 3_Building_Agents/):
+    python benchmarks/session_memory.py [--sessions 10000] [--max-sessions 1000]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Annotated, List, Optional, TypedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "exercises"))
+
+from lib.memory import InMemorySessionStore, ShortTermMemory, SqliteSessionStore  # noqa: E402
+from lib.messages import AIMessage, SystemMessage, ToolMessage, UserMessage  # noqa: E402
+from lib.state_machine import StateMachine, Step, EntryPoint, Termination, append  # noqa: E402
+from lib.tooling import ToolCall  # noqa: E402
+
+
+class ConversationState(TypedDict):
+    calls: int
+    messages: Annotated[List[dict], append]
+    current_tool_calls: Optional[List[ToolCall]]
+
+
+def llm_step(state):
+    if state["calls"] == 0:
+        call = ToolCall(
+            id=f"call_{len(state['messages'])}", type="function",
+            function={"name": "lookup", "arguments": json.dumps({"query": state["messages"][-1].content})},
+        )
+        return {"messages": [AIMessage(content=None, tool_calls=[call])], "current_tool_calls": [call]}
+    return {"messages": [AIMessage(content="Final answer " * 20)], "current_tool_calls": None}
+
+
+def tool_step(state):
+    call = state["current_tool_calls"][0]
+    result = ToolMessage(content="result text " * 30, tool_call_id=call.id, name=call.function.name)
+    return {"messages": [result], "current_tool_calls": None, "calls": state["calls"] + 1}
+
+
+def build_machine() -> StateMachine[ConversationState]:
+    machine = StateMachine[ConversationState](ConversationState)
+    entry = EntryPoint[ConversationState]()
+    llm = Step[ConversationState]("llm", llm_step)
+    tools = Step[ConversationState]("tools", tool_step)
+    termination = Termination[ConversationState]()
+    machine.add_steps([entry, llm, tools, termination])
+    machine.connect(entry, llm)
+    machine.connect(llm, [tools, termination],
+                    lambda state: tools if state["current_tool_calls"] else termination)
+    machine.connect(tools, llm)
+    return machine
+
+
+def turn(machine, memory: ShortTermMemory, session_id: str, query: str, final_only: bool):
+    memory.create_session(session_id)
+    last_run = memory.get_last_object(session_id)
+    messages = last_run.get_final_state()["messages"] if last_run else [SystemMessage(content="You are helpful.")]
+    run = machine.run({
+        "calls": 0,
+        "messages": messages + [UserMessage(content=query)],
+        "current_tool_calls": None,
+    })
+    memory.add(run.final_only() if final_only else run, session_id)
+
+
+def measure(name, memory, final_only, args, machine):
+    print(f"{name}:")
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(args.sessions):
+        for t in range(args.turns):
+            turn(machine, memory, f"session-{i}", f"question {t} of session {i}", final_only)
+        if (i + 1) % args.report_every == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            print(f"  {i + 1:>7} sessions {current / 2**20:>9.1f} MiB  "
+                  f"{len(memory.get_all_sessions()):>6} stored  {time.perf_counter() - start:>6.1f}s")
+    tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--turns", type=int, default=2, help="queries per session")
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    parser.add_argument("--report-every", type=int, default=2000)
+    args = parser.parse_args()
+    logging.getLogger("lib.state_machine").setLevel(logging.WARNING)
+
+    machine = build_machine()
+    with tempfile.TemporaryDirectory() as tmp:
+        variants = {
+            "unbounded": (ShortTermMemory(InMemorySessionStore(max_sessions=None)), False),
+            "lru": (ShortTermMemory(InMemorySessionStore(max_sessions=args.max_sessions)), True),
+            "sqlite": (ShortTermMemory(SqliteSessionStore(os.path.join(tmp, "sessions.db"),
+                                                          max_sessions=args.max_sessions)), True),
+        }
+        for name, (memory, final_only) in variants.items():
+            measure(name, memory, final_only, args, machine)
+            del memory
+            variants[name] = None
+        print(f"sqlite file: {os.path.getsize(os.path.join(tmp, 'sessions.db')) / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark: web search after the LLM answer vs speculatively alongside it.
+
+A local stub server answers ``POST /chat/completions`` with a plain answer
+after ``--llm-latency`` seconds, and the ``web_search`` tool sleeps for
+``--search-latency`` seconds, so each Agent.invoke() runs one LLM call, the
+web search and the comparison LLM call:
+
+- sequential:  Agent(...) (the web search starts after the LLM answer)
+- speculative: Agent(..., speculative_web_search=True) (it starts with the query)
+
+The report shows the end-to-end latency of both and the latency the
+speculative search hid, as recorded in each Run's metadata.
+
+Usage (from 3_Building_Agents/):
+    python benchmarks/speculative_web_search.py [--runs 10] [--llm-latency 0.5] [--search-latency 0.8]
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "exercises"))
+
+from lib.agents import Agent  # noqa: E402
+from lib.tooling import tool  # noqa: E402
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{
+        "index": 0,
+        "finish_reason": "stop",
+        "message": {"role": "assistant", "content": "Paris is the capital of France."},
+    }],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 8, "total_tokens": 18},
+}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(latency: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(agent: Agent, runs: int):
+    timings, saved = [], []
+    for i in range(runs):
+        start = time.perf_counter()
+        run = agent.invoke("What is the capital of France?", session_id=f"session-{i}")
+        timings.append(time.perf_counter() - start)
+        saved.append(run.metadata.get("speculative_web_search", {}).get("saved_seconds", 0.0))
+    return timings, saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.8, help="seconds per web search")
+    args = parser.parse_args()
+    logging.getLogger("lib.state_machine").setLevel(logging.WARNING)
+
+    server = start_server(args.llm_latency)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["OPENAI_API_KEY"] = "stub-key"
+
+    @tool
+    def web_search(query: str) -> str:
+        """Search the web"""
+        time.sleep(args.search_latency)
+        return f"Results for {query}: Paris is the capital and largest city of France."
+
+    variants = {
+        "sequential": Agent("stub", "You answer questions.", tools=[web_search]),
+        "speculative": Agent("stub", "You answer questions.", tools=[web_search], speculative_web_search=True),
+    }
+    print(f"{args.runs} runs, LLM {args.llm_latency:.2f}s per call, web search {args.search_latency:.2f}s")
+    print(f"{'variant':>12} {'mean (s)':>9} {'p50 (s)':>8} {'hidden (s)':>11}")
+    means = {}
+    for name, agent in variants.items():
+        timings, saved = measure(agent, args.runs)
+        means[name] = statistics.mean(timings)
+        print(f"{name:>12} {means[name]:>9.3f} {statistics.median(timings):>8.3f} {statistics.mean(saved):>11.3f}")
+    print(f"end-to-end saved per run: {means['sequential'] - means['speculative']:.3f} s "
+          f"({(1 - means['speculative'] / means['sequential']) * 100:.0f}%)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Micro-benchmark: per-step engine overhead of lib.state_machine.StateMachine.
+
+Runs a workflow whose only business step is a trivial counter that loops on
+itself, so nearly all of the measured time is spent in the engine (schema
+filtering, transition resolution, snapshot bookkeeping).
+
+Usage (from 3_Building_Agents/):
+    python benchmarks/state_machine_overhead.py [--steps 2000] [--repeat 5]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import time
+from typing import List, Optional, TypedDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "exercises"))
+
+from lib.state_machine import StateMachine, Step, EntryPoint, Termination  # noqa: E402
+
+
+class CounterState(TypedDict):
+    count: int
+    limit: int
+    messages: List[str]
+    note: Optional[str]
+
+
+def build_machine() -> StateMachine[CounterState]:
+    machine = StateMachine[CounterState](CounterState)
+    entry = EntryPoint[CounterState]()
+    tick = Step[CounterState]("tick", lambda state: {"count": state["count"] + 1})
+    termination = Termination[CounterState]()
+    machine.add_steps([entry, tick, termination])
+    machine.connect(entry, tick)
+    machine.connect(
+        tick, [tick, termination],
+        lambda state: tick if state["count"] < state["limit"] else termination,
+    )
+    return machine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quiet", action="store_true",
+                        help="silence the StateMachine progress logger")
+    args = parser.parse_args()
+
+    if args.quiet:
+        logging.getLogger("lib.state_machine").setLevel(logging.WARNING)
+
+    machine = build_machine()
+    if hasattr(machine, "compile"):
+        machine.compile()
+
+    initial: CounterState = {"count": 0, "limit": args.steps, "messages": [], "note": None}
+    timings = []
+    for _ in range(args.repeat):
+        # Progress output is part of the engine cost, but terminal speed is not
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            machine.run(initial)
+            timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(f"steps per run:      {args.steps}")
+    print(f"best run:           {best * 1000:.1f} ms")
+    print(f"per-step overhead:  {best / args.steps * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Benchmark: sending every tool schema vs only the top-k relevant ones.
+
+Registers a catalogue of 40 tools (games, weather, finance, calendar, ...)
+and, for a set of queries with a known right tool, compares:
+
+- all:   every schema in every request (what LLM.invoke does by default)
+- top-k: the schemas TfidfToolSelector ranks highest for the query
+         (plus EmbeddingToolSelector when chromadb's local model loads)
+
+Reported per request: schema tokens, request bytes, the time to rank the
+tools, whether the right tool was among those sent (recall) and the
+client-side latency of LLM.invoke against a local stub server. The stub
+answers instantly, so the latency column only covers building, sending
+and parsing the request; a real endpoint additionally spends prefill time
+on every prompt token saved.
+
+Usage (from 3_Building_Agents/):
+    python benchmarks/tool_selection.py [--k 5] [--iterations 50] [--embeddings]
+"""
+
+import argparse
+import inspect
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "exercises"))
+
+from lib.llm import LLM  # noqa: E402
+from lib.messages import SystemMessage, UserMessage  # noqa: E402
+from lib.tool_selection import EmbeddingToolSelector, TfidfToolSelector  # noqa: E402
+from lib.tooling import Tool  # noqa: E402
+from lib.windowing import count_tokens  # noqa: E402
+
+CATALOGUE = [
+    ("retrieve_game", "Search the video game database for titles matching a query", ["query", "limit"]),
+    ("game_release_date", "Get the release date and platforms of a video game", ["title"]),
+    ("game_reviews", "Fetch critic and user review scores for a video game", ["title"]),
+    ("game_publisher", "Look up the publisher and developer studio of a game", ["title"]),
+    ("current_weather", "Current weather conditions, temperature and wind for a city", ["city"]),
+    ("weather_forecast", "Multi-day weather forecast with rain probability for a city", ["city", "days"]),
+    ("air_quality", "Air pollution index and pollen levels for a location", ["city"]),
+    ("stock_quote", "Latest stock price and daily change for a ticker symbol", ["ticker"]),
+    ("currency_convert", "Convert an amount of money between two currencies at today's exchange rate",
+     ["amount", "from_currency", "to_currency"]),
+    ("crypto_price", "Current price of a cryptocurrency such as bitcoin or ether", ["coin"]),
+    ("loan_calculator", "Monthly payment and total interest of a loan or mortgage", ["principal", "rate", "years"]),
+    ("create_event", "Create a calendar event or meeting with attendees", ["title", "start", "attendees"]),
+    ("list_events", "List upcoming calendar events and meetings for a day", ["date"]),
+    ("cancel_event", "Cancel or delete a calendar meeting", ["event_id"]),
+    ("send_email", "Send an email message to a recipient", ["to", "subject", "body"]),
+    ("search_email", "Search the inbox for emails by sender or keyword", ["query"]),
+    ("send_sms", "Send a text message to a phone number", ["phone", "text"]),
+    ("calculator", "Evaluate an arithmetic expression", ["expression"]),
+    ("unit_convert", "Convert between units of length, mass, volume or temperature", ["value", "from_unit", "to_unit"]),
+    ("solve_equation", "Solve an algebraic equation for a variable", ["equation", "variable"]),
+    ("read_file", "Read the contents of a file from disk", ["path"]),
+    ("write_file", "Write text content to a file on disk", ["path", "content"]),
+    ("list_directory", "List the files in a directory", ["path"]),
+    ("web_search", "Search the web for recent information and news", ["query"]),
+    ("fetch_url", "Download the text of a web page at a URL", ["url"]),
+    ("translate_text", "Translate text into another language", ["text", "target_language"]),
+    ("summarize_text", "Summarize a long text into a few sentences", ["text"]),
+    ("flight_search", "Find flights between two airports on a date", ["origin", "destination", "date"]),
+    ("hotel_search", "Find hotels with availability in a city for given dates", ["city", "check_in", "check_out"]),
+    ("restaurant_search", "Find restaurants by cuisine near a location", ["cuisine", "location"]),
+    ("directions", "Driving or walking directions and travel time between two places", ["origin", "destination"]),
+    ("recipe_search", "Find cooking recipes by ingredient or dish name", ["query"]),
+    ("nutrition_facts", "Calories and nutrients of a food item", ["food"]),
+    ("movie_showtimes", "Cinema showtimes for a movie near a location", ["movie", "location"]),
+    ("sports_scores", "Latest scores and results of a sports team", ["team"]),
+    ("news_headlines", "Top news headlines for a topic or country", ["topic"]),
+    ("wikipedia_lookup", "Encyclopedia summary of a person, place or concept", ["topic"]),
+    ("create_reminder", "Set a reminder or alarm at a time", ["text", "time"]),
+    ("todo_add", "Add an item to the to-do list", ["item"]),
+    ("run_python", "Execute a Python code snippet and return its output", ["code"]),
+]
+
+QUERIES = [
+    ("Which games did Nintendo publish in 2017?", "game_publisher"),
+    ("When was Elden Ring released and on which platforms?", "game_release_date"),
+    ("Find me some open world adventure games", "retrieve_game"),
+    ("What are the review scores for Hades?", "game_reviews"),
+    ("Will it rain in Lisbon this weekend?", "weather_forecast"),
+    ("What's the temperature in Paris right now?", "current_weather"),
+    ("How much is 250 euros in US dollars?", "currency_convert"),
+    ("What is Apple's stock price today?", "stock_quote"),
+    ("Schedule a meeting with Ana tomorrow at 10", "create_event"),
+    ("What meetings do I have on Friday?", "list_events"),
+    ("Email the report to my manager", "send_email"),
+    ("Convert 5 miles to kilometers", "unit_convert"),
+    ("What is 17% of 2,340?", "calculator"),
+    ("Translate 'good morning' into Japanese", "translate_text"),
+    ("Find a flight from Lisbon to Berlin on May 3", "flight_search"),
+    ("Book a hotel in Rome for next week", "hotel_search"),
+    ("How many calories are in an avocado?", "nutrition_facts"),
+    ("Remind me to call mom at 6pm", "create_reminder"),
+    ("What were last night's Lakers scores?", "sports_scores"),
+    ("Show me the files in the project folder", "list_directory"),
+]
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ok"}}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+}).encode("utf-8")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_tool(name, description, params) -> Tool:
+    def func(**kwargs):
+        return name
+    func.__signature__ = inspect.Signature([
+        inspect.Parameter(p, inspect.Parameter.KEYWORD_ONLY, annotation=str) for p in params
+    ])
+    func.__annotations__ = {p: str for p in params}
+    return Tool(func, name=name, description=description)
+
+
+def measure(llm, selector, k, iterations):
+    tokens, sizes, rank_times, latencies, hits = [], [], [], [], 0
+    for query, expected in QUERIES:
+        messages = [SystemMessage(content="You are a helpful assistant."), UserMessage(content=query)]
+        start = time.perf_counter()
+        names = selector.select(query, k) if selector else None
+        rank_times.append(time.perf_counter() - start)
+        hits += names is None or expected in names
+        payload = llm._build_payload(messages, names)
+        tokens.append(count_tokens(json.dumps(payload.get("tools", [])), "gpt-4o-mini"))
+        sizes.append(len(json.dumps(payload)))
+        start = time.perf_counter()
+        for _ in range(iterations):
+            llm.invoke(messages, tool_names=names)
+        latencies.append((time.perf_counter() - start) / iterations)
+    return (statistics.mean(tokens), statistics.mean(sizes), statistics.mean(rank_times),
+            hits / len(QUERIES), statistics.mean(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=5, help="tools sent per request")
+    parser.add_argument("--iterations", type=int, default=50, help="requests per query")
+    parser.add_argument("--embeddings", action="store_true", help="also try EmbeddingToolSelector")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    tools = [make_tool(*entry) for entry in CATALOGUE]
+    llm = LLM(model="stub", tools=tools, api_key="stub-key", base_url=f"http://127.0.0.1:{server.server_address[1]}")
+    llm.invoke("warm up")
+
+    variants = {"all": None, f"tfidf top-{args.k}": TfidfToolSelector().fit(tools)}
+    if args.embeddings:
+        try:
+            variants[f"embed top-{args.k}"] = EmbeddingToolSelector().fit(tools)
+        except Exception as error:  # chromadb missing or its model cannot be downloaded
+            print(f"embeddings unavailable: {error}")
+
+    print(f"{len(tools)} tools, {len(QUERIES)} queries, {args.iterations} requests each")
+    print(f"{'variant':>14} {'schema tok':>11} {'req bytes':>10} {'rank (us)':>10} {'recall':>7} {'invoke (ms)':>12}")
+    results = {}
+    for name, selector in variants.items():
+        results[name] = measure(llm, selector, args.k, args.iterations)
+        tokens, size, rank_time, recall, latency = results[name]
+        print(f"{name:>14} {tokens:>11.0f} {size:>10.0f} {rank_time * 1e6:>10.1f} {recall:>7.0%} {latency * 1000:>12.2f}")
+    full = results["all"]
+    for name, (tokens, _, rank_time, _, latency) in results.items():
+        if name != "all":
+            print(f"{name}: {full[0] - tokens:.0f} prompt tokens saved per request "
+                  f"({1 - tokens / full[0]:.0%}), {(full[4] - latency - rank_time) * 1000:.2f} ms client-side")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,186 @@
-from typing import TypedDict, List, Optional, Union, TypeVar
+from typing import Annotated, Any, Callable, Dict, Iterator, TypedDict, List, Optional, Set, Tuple, Union, TypeVar
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import partial
+import asyncio
 import json
+import queue
+import threading
+import time
 
-from lib.state_machine import StateMachine, Step, EntryPoint, Termination, Run
-from lib.llm import LLM
+from lib.state_machine import (
+    StateMachine, Step, EntryPoint, Termination, Run, Resource, CancellationToken, append,
+)
+from lib.checkpoint import Checkpointer
+from lib.llm import LLM, ResponseCache
 from lib.messages import AIMessage, UserMessage, SystemMessage, ToolMessage
 from lib.tooling import Tool, ToolCall
-from lib.memory import ShortTermMemory
+from lib.memory import InMemorySessionStore, SessionStore, ShortTermMemory
+from lib.rate_limiting import RateLimiter
+from lib.tool_selection import TfidfToolSelector, ToolSelector
+from lib.windowing import ContextWindow, count_tokens, message_tokens, summary_prompt, window_messages
+
+DEFAULT_MAX_TOOL_WORKERS = 8
+
+# Content of the ToolMessage answering a repeat of an earlier identical call
+DUPLICATE_TOOL_CALL_PREFIX = "Duplicate of tool call "
+
+
+def _tool_call_key(call: ToolCall) -> Tuple[str, str]:
+    """(name, canonical arguments), equal for repeats of the same tool call"""
+    try:
+        arguments = json.dumps(json.loads(call.function.arguments or "{}"), sort_keys=True, separators=(",", ":"))
+    except json.JSONDecodeError:
+        arguments = call.function.arguments
+    return call.function.name, arguments
+
+
+def _is_duplicate(message: ToolMessage) -> bool:
+    return (message.content or "").startswith(DUPLICATE_TOOL_CALL_PREFIX)
+
+
+# Added to the prompt of the final LLM call once a run is out of budget
+BUDGET_EXCEEDED_NOTE = (
+    "The budget for this request is exhausted: no more tools can be called. "
+    "Give your final answer now, using only the information gathered so far."
+)
+SKIPPED_TOOL_CALL = "Not executed: the tool-call budget of this request is exhausted."
+
+
+@dataclass(frozen=True)
+class RunBudget:
+    """Per-run limits of the Agent's tool loop; None disables a limit.
+
+    Limits are checked between steps: the step crossing one completes, then
+    remaining tool calls are answered without running them and the model is
+    asked for a final answer from the context it already has (one more LLM
+    call, without tools).
+
+    Attributes:
+        max_tokens: LLM tokens (prompt and completion) spent by the run
+        max_seconds: Wall-clock seconds since the run started
+        max_tool_calls: Tool executions (repeats answered by deduplication
+            are free)
+    """
+    max_tokens: Optional[int] = None
+    max_seconds: Optional[float] = None
+    max_tool_calls: Optional[int] = None
+
+    def exceeded(self, tokens: int, seconds: float, tool_calls: int) -> Optional[str]:
+        """Name of the first limit reached ("tokens", "seconds", "tool_calls"), or None"""
+        if self.max_tokens is not None and tokens >= self.max_tokens:
+            return "tokens"
+        if self.max_seconds is not None and seconds >= self.max_seconds:
+            return "seconds"
+        if self.max_tool_calls is not None and tool_calls >= self.max_tool_calls:
+            return "tool_calls"
+        return None
+
+
+@dataclass
+class AgentEvent:
+    """One item yielded by Agent.stream().
+
+    Attributes:
+        type: ``"text"`` (LLM content delta in ``content``),
+            ``"tool_call_start"`` / ``"tool_call_end"`` (``tool_call`` began
+            executing / finished with ``result``) or ``"run"`` (the finished
+            ``run``, always the last event).
+    """
+    type: str
+    content: Optional[str] = None
+    tool_call: Optional[ToolCall] = None
+    result: Optional[ToolMessage] = None
+    run: Optional[Run] = None
+
+
+class _StreamContext:
+    """Per-call plumbing of Agent.stream(), handed to steps as a Resource var"""
+
+    def __init__(self, max_workers: int):
+        self.events: queue.Queue = queue.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tools")
+        # Tool calls started while the LLM was still streaming, by tool_call_id
+        self.pending: Dict[str, Future] = {}
+
+    def emit(self, event: AgentEvent):
+        self.events.put(event)
+
+
+# Workers running speculative web searches, shared by every Agent of the process
+SEARCH_POOL_WORKERS = DEFAULT_MAX_TOOL_WORKERS
+_search_pool: Optional[ThreadPoolExecutor] = None
+_search_pool_lock = threading.Lock()
+
+
+def _shared_search_pool() -> ThreadPoolExecutor:
+    """Process-wide pool for speculative web searches, created on first use.
+
+    Agents come and go (notebooks build one per cell); a pool per Agent
+    would leave idle threads behind for each of them.
+    """
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=SEARCH_POOL_WORKERS,
+                                              thread_name_prefix="agent-web-search")
+        return _search_pool
+
+
+class _SpeculativeSearch:
+    """Web search started as soon as a query arrives, overlapping the LLM steps.
+
+    The web search only depends on the user query, so it can run while the
+    model is still answering; the web_search step, and any ``web_search``
+    tool call the model makes for the same query, then pick up its result
+    instead of searching again. Searches the run never reaches are discarded
+    (cancelled if they have not started yet).
+    """
+
+    def __init__(self, pool: ThreadPoolExecutor, web_search_tool: Tool, query: str):
+        self.query = query
+        self.used = False
+        self.search_seconds: Optional[float] = None
+        self.waited_seconds = 0.0
+        self.future = pool.submit(self._search, web_search_tool, query)
+
+    def _search(self, web_search_tool: Tool, query: str) -> str:
+        start = time.perf_counter()
+        try:
+            return str(web_search_tool(query=query))
+        finally:
+            self.search_seconds = time.perf_counter() - start
+
+    def answers(self, function_name: str, function_args: Dict[str, Any]) -> bool:
+        """Whether a tool call with these name and arguments asks for this search"""
+        return function_name == "web_search" and function_args == {"query": self.query}
+
+    def result(self) -> str:
+        """Wait for the search and return its result"""
+        self.used = True
+        start = time.perf_counter()
+        try:
+            return self.future.result()
+        finally:
+            self.waited_seconds = time.perf_counter() - start
+
+    def discard(self):
+        """Drop the search if the run did not use it"""
+        if not self.used:
+            self.future.cancel()
+
+    def report(self) -> dict:
+        """Counters recorded in a Run's metadata"""
+        saved = 0.0
+        if self.used and self.search_seconds is not None:
+            saved = max(self.search_seconds - self.waited_seconds, 0.0)
+        return {
+            "used": self.used,
+            "search_seconds": self.search_seconds,
+            "waited_seconds": self.waited_seconds,
+            "saved_seconds": saved,
+        }
+
 
 # Define the state schema
 class AgentState(TypedDict):
@@ -18,19 +193,41 @@ class AgentState(TypedDict):
         current_tool_calls: Pending tool calls returned by the LLM; None when no tools are requested.
         session_id: Identifier that groups multiple runs into a single conversation session.
         comparison: Comparison between the agent's answer and web search results; None if unavailable.
+        total_tokens: LLM tokens spent by the current run.
+        tool_call_count: Tools executed by the current run.
+        started_at: Wall-clock start of the current run (``time.time()``).
+        budget_exceeded: Limit of the Agent's RunBudget that ended the tool loop, if any.
+        selected_tools: Names of the tools advertised to the model in this run; None for all.
     """
     user_query: str  # The current user query being processed
     instructions: str  # System instructions for the agent
-    messages: List[dict]  # List of conversation messages
+    messages: Annotated[List[dict], append]  # Conversation messages; steps return only new ones
     current_tool_calls: Optional[List[ToolCall]]  # Current pending tool calls
     comparison: Optional[str]  # Comparison between agent answer and web search results
+    total_tokens: int  # LLM tokens spent by this run
+    tool_call_count: int  # Tools executed by this run
+    started_at: float  # time.time() when this run started
+    budget_exceeded: Optional[str]  # RunBudget limit that ended the tool loop
+    selected_tools: Optional[List[str]]  # Tools advertised in this run (None: all)
     
 class Agent:
     def __init__(self, 
                  model_name: str,
                  instructions: str, 
                  tools: List[Tool] = None,
-                 temperature: float = 0.7):
+                 temperature: float = 0.7,
+                 checkpointer: Optional[Checkpointer] = None,
+                 max_tool_workers: int = DEFAULT_MAX_TOOL_WORKERS,
+                 context_budget: Optional[int] = None,
+                 summarize_history: bool = True,
+                 session_store: Optional[SessionStore] = None,
+                 dedupe_tool_calls: bool = True,
+                 budget: Optional[RunBudget] = None,
+                 max_tools: Optional[int] = None,
+                 tool_selector: Optional[ToolSelector] = None,
+                 llm_cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 speculative_web_search: bool = False):
         """
         Initialize an Agent
         
@@ -39,15 +236,89 @@ class Agent:
             instructions: System instructions for the agent
             tools: Optional list of tools available to the agent
             temperature: Temperature parameter for LLM (default: 0.7)
+            checkpointer: Optional durable store for runs, enabling resume()
+            max_tool_workers: Maximum tool calls of one LLM response executed
+                concurrently (1 runs them sequentially)
+            context_budget: Optional token budget for the history sent at the
+                start of each run; older turns beyond it are trimmed
+            summarize_history: Fold trimmed turns into a rolling summary
+                message (one extra LLM call per trim) instead of dropping them
+            session_store: Where session memory lives (default: a bounded
+                in-memory LRU; see lib.memory for TTL and SQLite stores)
+            dedupe_tool_calls: Answer a tool call repeating an earlier call of
+                the same run (same tool, same arguments) with a reference to
+                that call's result instead of running the tool again
+            budget: Optional token, time and tool-call limits applied to each
+                run; see RunBudget
+            max_tools: Advertise only the ``max_tools`` tools most relevant to
+                each query instead of every tool's schema (None sends all);
+                if the model calls a tool left out, the run re-expands to
+                the full tool set
+            tool_selector: Ranking used with ``max_tools`` (default:
+                TfidfToolSelector; see lib.tool_selection for embeddings)
+            llm_cache: Optional ResponseCache shared by the Agent's LLM calls
+                (only temperature 0 calls are cached unless it allows more)
+            rate_limiter: Optional RateLimiter pacing the Agent's LLM calls
+                under requests/min and tokens/min limits and retrying 429s;
+                share one instance across agents using the same API key
+            speculative_web_search: Start the ``web_search`` tool as soon as a
+                query arrives, in parallel with the LLM steps, instead of
+                after the final answer
         """
         self.instructions = instructions
         self.tools = tools if tools else []
+        # Name-keyed registry for O(1) dispatch of tool calls
+        self._tools_by_name = {tool.name: tool for tool in self.tools}
         self.model_name = model_name
         self.temperature = temperature
+        self.checkpointer = checkpointer
+        self.max_tool_workers = max_tool_workers
+        self.context_budget = context_budget
+        self.summarize_history = summarize_history
+        self.dedupe_tool_calls = dedupe_tool_calls
+        self.budget = budget
+        self.llm_cache = llm_cache
+        self.rate_limiter = rate_limiter
+        self.max_tools = max_tools
+        self.tool_selector = None
+        if max_tools is not None:
+            selector = tool_selector if tool_selector is not None else TfidfToolSelector()
+            self.tool_selector = selector.fit(self.tools)
+        self.speculative_web_search = speculative_web_search
+
+        # LLM adapters are built once and reused by every step, run and thread
+        self._llms = {}
+        self._llms_lock = threading.Lock()
         
         # Initialize memory and state machine
-        self.memory = ShortTermMemory()
+        self.memory = ShortTermMemory(session_store if session_store is not None else InMemorySessionStore())
         self.workflow = self._create_state_machine()
+        # Same graph with coroutine LLM and tool steps, run by ainvoke()
+        self.async_workflow = self._create_state_machine(asynchronous=True)
+
+    def _get_llm(self, with_tools: bool = True) -> LLM:
+        """Return the Agent's long-lived LLM adapter, building it on first use.
+
+        Adapters share the process-wide OpenAI client of `lib.llm`, so every
+        iteration of the tool loop reuses the same HTTP connection pool.
+
+        Args:
+            with_tools: Whether the adapter advertises ``self.tools`` to the model.
+        """
+        llm = self._llms.get(with_tools)
+        if llm is None:
+            with self._llms_lock:
+                llm = self._llms.get(with_tools)
+                if llm is None:
+                    llm = LLM(
+                        model=self.model_name,
+                        temperature=self.temperature,
+                        tools=self.tools if with_tools else [],
+                        cache=self.llm_cache,
+                        rate_limiter=self.rate_limiter,
+                    )
+                    self._llms[with_tools] = llm
+        return llm
 
     def _prepare_messages_step(self, state: AgentState) -> AgentState:
         """Step logic: Prepare messages for LLM consumption.
@@ -61,11 +332,11 @@ class Agent:
         Returns:
             Updated state with the ``messages`` list ready for the LLM step.
         """
-        messages = state.get("messages", [])
+        messages = []
         
         # If no messages exist, start with system message
-        if not messages:
-            messages = [SystemMessage(content=state["instructions"])]
+        if not state.get("messages"):
+            messages.append(SystemMessage(content=state["instructions"]))
             
         # Add the new user message
         messages.append(UserMessage(content=state["user_query"]))
@@ -75,7 +346,7 @@ class Agent:
             "session_id": state["session_id"]
         }
 
-    def _llm_step(self, state: AgentState) -> AgentState:
+    def _llm_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
         """Step logic: Process the current state through the LLM.
 
         Sends the accumulated message history to the language model and captures
@@ -87,33 +358,236 @@ class Agent:
         Returns:
             Updated state with the LLM's AIMessage appended to ``messages``
             and ``current_tool_calls`` set to the requested tool calls (or None).
+            Once the run is out of budget, the model is called without tools
+            for a final answer and ``budget_exceeded`` names the limit hit.
         """
-        # Initialize LLM
-        llm = LLM(
-            model=self.model_name,
-            temperature=self.temperature,
-            tools=self.tools
-        )
+        stream = resource.vars.get("stream") if resource else None
+        messages, exceeded, tool_names = self._llm_request(state)
+        if stream is None:
+            response = self._get_llm(with_tools=not exceeded).invoke(messages, tool_names=tool_names)
+        else:
+            response = self._stream_llm_response(state, stream, messages, with_tools=not exceeded,
+                                                 tool_names=tool_names,
+                                                 speculation=resource.vars.get("web_search"))
+        return self._llm_update(state, messages, exceeded, response)
+
+    async def _allm_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
+        """Coroutine `_llm_step` used by ainvoke().
+
+        Awaits `LLM.ainvoke`, so the workflow's LLM calls wait on the event
+        loop instead of each holding a worker thread.
+        """
+        messages, exceeded, tool_names = self._llm_request(state)
+        response = await self._get_llm(with_tools=not exceeded).ainvoke(messages, tool_names=tool_names)
+        return self._llm_update(state, messages, exceeded, response)
+
+    def _llm_request(self, state: AgentState) -> Tuple[List, Optional[str], Optional[List[str]]]:
+        """Messages, budget limit hit (if any) and tool names of the next LLM call.
 
-        response = llm.invoke(state["messages"])
+        Out of budget, the model gets no tools and a note asking it to answer
+        from the context gathered so far.
+        """
+        exceeded = self._budget_exceeded(state)
+        messages = state["messages"]
+        if exceeded:
+            messages = messages + [SystemMessage(content=BUDGET_EXCEEDED_NOTE)]
+        tool_names = None if exceeded else self._tool_names(state)
+        return messages, exceeded, tool_names
+
+    def _llm_update(self, state: AgentState, messages: List, exceeded: Optional[str],
+                    response: AIMessage) -> AgentState:
+        """State update recording the LLM ``response`` to ``messages``"""
         tool_calls = response.tool_calls if response.tool_calls else None
 
         # Create AI message with content and tool calls
-        ai_message = AIMessage(content=response.content, tool_calls=tool_calls)
+        ai_message = AIMessage(content=response.content, tool_calls=tool_calls,
+                               token_usage=response.token_usage)
         
         return {
-            "messages": state["messages"] + [ai_message],
+            "messages": [ai_message],
             "current_tool_calls": tool_calls,
-            "session_id": state["session_id"]
+            "session_id": state["session_id"],
+            "total_tokens": state.get("total_tokens", 0) + self._call_tokens(messages, response),
+            "budget_exceeded": exceeded or state.get("budget_exceeded"),
+        }
+
+    def _stream_llm_response(self, state: AgentState, stream: _StreamContext,
+                             messages: List, with_tools: bool = True,
+                             tool_names: Optional[List[str]] = None,
+                             speculation: Optional[_SpeculativeSearch] = None) -> AIMessage:
+        """Stream one LLM response into ``stream`` and return the final AIMessage.
+
+        Text deltas are emitted as they arrive. Each tool call is submitted
+        to the stream's executor as soon as its arguments are complete, so
+        it runs while the model is still generating; ``_tool_step`` then
+        collects the result instead of calling the tool again. Repeats of
+        calls already made in this run, and calls beyond the run's tool-call
+        budget, are not submitted.
+        """
+        answered = self._answered_tool_calls(state)
+        allowance = self._tool_allowance(state)
+        response = None
+        for event in self._get_llm(with_tools).stream(messages, tool_names=tool_names):
+            if event.type == "text":
+                stream.emit(AgentEvent("text", content=event.content))
+            elif event.type == "tool_call" and self._find_duplicate(answered, event.tool_call) is None:
+                if allowance is not None:
+                    if allowance <= 0:
+                        continue
+                    allowance -= 1
+                stream.pending[event.tool_call.id] = stream.pool.submit(
+                    self._execute_tool_call, event.tool_call, stream.emit, speculation
+                )
+            else:
+                response = event.message
+        return response
+
+    @staticmethod
+    def _run_messages(state: AgentState) -> List:
+        """Messages added by the current run: from its user query onwards"""
+        messages = state["messages"]
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], UserMessage) and messages[i].content == state["user_query"]:
+                return messages[i:]
+        return messages
+
+    def _answered_tool_calls(self, state: AgentState) -> Dict[Tuple[str, str], str]:
+        """Tool calls answered earlier in the current run.
+
+        Returns:
+            A dict mapping each call's ``_tool_call_key`` to the id of the
+            first call that produced a result for it (empty when
+            ``dedupe_tool_calls`` is off).
+        """
+        if not self.dedupe_tool_calls:
+            return {}
+        keys = {}
+        answered = {}
+        for message in self._run_messages(state):
+            for call in getattr(message, "tool_calls", None) or []:
+                keys[call.id] = _tool_call_key(call)
+            if isinstance(message, ToolMessage) and message.tool_call_id in keys and not _is_duplicate(message):
+                answered.setdefault(keys[message.tool_call_id], message.tool_call_id)
+        return answered
+
+    def _find_duplicate(self, answered: Dict[Tuple[str, str], str], call: ToolCall) -> Optional[str]:
+        """Id of the earlier call ``call`` repeats, or None (then ``call`` is registered in ``answered``).
+
+        Calls to unknown tools are never registered: they get no result to
+        point at.
+        """
+        if not self.dedupe_tool_calls:
+            return None
+        key = _tool_call_key(call)
+        if key in answered:
+            return answered[key]
+        if call.function.name in self._tools_by_name:
+            answered[key] = call.id
+        return None
+
+    def _call_tokens(self, messages: List, response: AIMessage) -> int:
+        """Tokens of one LLM call: the reported usage, or an estimate of prompt and reply"""
+        usage = getattr(response, "token_usage", None)
+        if usage is not None:
+            return usage.total_tokens
+        return sum(message_tokens(m, self.model_name) for m in messages) + message_tokens(response, self.model_name)
+
+    def _budget_exceeded(self, state: AgentState) -> Optional[str]:
+        """Name of the RunBudget limit the run has reached, or None"""
+        if self.budget is None:
+            return None
+        return self.budget.exceeded(
+            tokens=state.get("total_tokens") or 0,
+            seconds=time.time() - (state.get("started_at") or time.time()),
+            tool_calls=state.get("tool_call_count") or 0,
+        )
+
+    def _tool_allowance(self, state: AgentState) -> Optional[int]:
+        """How many more tools the run may execute (None: no limit)"""
+        if self.budget is None:
+            return None
+        if self._budget_exceeded(state):
+            return 0
+        if self.budget.max_tool_calls is None:
+            return None
+        return self.budget.max_tool_calls - (state.get("tool_call_count") or 0)
+
+    def _select_tools(self, query: str) -> Optional[List[str]]:
+        """Tools most relevant to ``query`` when tool selection is on and would drop some, else None"""
+        if self.tool_selector is None or len(self.tools) <= self.max_tools:
+            return None
+        return self.tool_selector.select(query, self.max_tools)
+
+    def _tool_names(self, state: AgentState) -> Optional[List[str]]:
+        """Tool names to advertise in the next LLM call of the run (None: all).
+
+        Re-expand guard: a call to a tool outside the run's selection means
+        the ranking missed a tool the model needs, so from then on the run
+        advertises every tool.
+        """
+        selected = state.get("selected_tools")
+        if selected is None:
+            return None
+        called = {
+            call.function.name
+            for message in self._run_messages(state)
+            for call in getattr(message, "tool_calls", None) or []
         }
+        if called - set(selected):
+            return None
+        return selected
+
+    def _execute_tool_call(self, call: ToolCall,
+                           emit: Optional[Callable[[AgentEvent], None]] = None,
+                           speculation: Optional[_SpeculativeSearch] = None) -> Optional[ToolMessage]:
+        """Run one tool call and wrap its result in a ToolMessage.
+
+        Args:
+            call: Tool call requested by the model.
+            emit: Optional callback receiving ``tool_call_start`` and
+                ``tool_call_end`` events (used by ``stream()``).
+            speculation: The run's speculative web search, if any; a
+                ``web_search`` call for the same query takes its result.
+
+        Returns:
+            The ToolMessage answering ``call``, or None when no tool in
+            ``self.tools`` matches the requested name.
+        """
+        # Access tool call data correctly
+        function_name = call.function.name
+        function_args = json.loads(call.function.arguments)
+        tool = self._tools_by_name.get(function_name)
+        if tool is None:
+            return None
+        if emit:
+            emit(AgentEvent("tool_call_start", tool_call=call))
+        if speculation is not None and speculation.answers(function_name, function_args):
+            result = speculation.result()
+        else:
+            result = str(tool(**function_args))
+        tool_message = ToolMessage(
+            content=json.dumps(result),
+            tool_call_id=call.id,
+            name=function_name,
+        )
+        if emit:
+            emit(AgentEvent("tool_call_end", tool_call=call, result=tool_message))
+        return tool_message
 
-    def _tool_step(self, state: AgentState) -> AgentState:
+    def _tool_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
         """Step logic: Execute any pending tool calls.
 
-        Iterates over ``current_tool_calls``, dispatches each call to the
-        matching tool in ``self.tools``, and collects the results as
-        ToolMessages. Clears ``current_tool_calls`` after execution to
-        prevent infinite loops.
+        Dispatches each of ``current_tool_calls`` to the matching tool in
+        ``self.tools``, concurrently when the model requested several (up to
+        ``max_tool_workers`` at once, subject to each tool's
+        ``max_concurrency``), and collects the results as ToolMessages in
+        the order of the calls. A call repeating an earlier call of this run
+        (same tool, same arguments) is not executed again: its ToolMessage
+        points at the earlier result. Calls beyond the run's budget are
+        answered without running them. A ``web_search`` call for the user
+        query takes the run's speculative search result, if there is one.
+        Clears ``current_tool_calls`` after execution to prevent infinite
+        loops.
 
         Args:
             state: Current agent state with ``current_tool_calls`` populated.
@@ -122,53 +596,122 @@ class Agent:
             Updated state with ToolMessages appended to ``messages`` and
             ``current_tool_calls`` reset to None.
         """
+        new_calls, originals, skipped = self._plan_tool_calls(state)
+        stream = resource.vars.get("stream") if resource else None
+        speculation = resource.vars.get("web_search") if resource else None
+        execute = partial(self._execute_tool_call, speculation=speculation)
+
+        # Independent calls run concurrently; results keep the tool_call_id order
+        if stream is not None:
+            # Calls started early by the streaming LLM step are only awaited
+            futures = [
+                stream.pending.pop(call.id, None)
+                or stream.pool.submit(execute, call, stream.emit)
+                for call in new_calls
+            ]
+            results = [future.result() for future in futures]
+        elif len(new_calls) > 1 and self.max_tool_workers > 1:
+            workers = min(len(new_calls), self.max_tool_workers)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-tools") as pool:
+                results = list(pool.map(execute, new_calls))
+        else:
+            results = [execute(call) for call in new_calls]
+        return self._tool_update(state, new_calls, originals, skipped, results)
+
+    async def _atool_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
+        """Coroutine `_tool_step` used by ainvoke(): up to ``max_tool_workers`` tools at once in worker threads"""
+        new_calls, originals, skipped = self._plan_tool_calls(state)
+        speculation = resource.vars.get("web_search") if resource else None
+        slots = asyncio.Semaphore(max(1, self.max_tool_workers))
+
+        async def execute(call: ToolCall) -> Optional[ToolMessage]:
+            async with slots:
+                return await asyncio.to_thread(self._execute_tool_call, call, speculation=speculation)
+
+        results = await asyncio.gather(*(execute(call) for call in new_calls))
+        return self._tool_update(state, new_calls, originals, skipped, results)
+
+    def _plan_tool_calls(self, state: AgentState) -> Tuple[List[ToolCall], Dict[str, str], Set[str]]:
+        """Calls to execute, repeats (id -> id of the earlier call) and ids over the budget"""
+        tool_calls = state["current_tool_calls"] or []
+
+        # Repeats of a call already made in this run reuse its result
+        answered = self._answered_tool_calls(state)
+        originals = {}
+        for call in tool_calls:
+            original = self._find_duplicate(answered, call)
+            if original is not None:
+                originals[call.id] = original
+        new_calls = [call for call in tool_calls if call.id not in originals]
+
+        # Calls beyond the run's budget are answered without running them
+        allowance = self._tool_allowance(state)
+        skipped = set()
+        if allowance is not None and len(new_calls) > allowance:
+            skipped = {call.id for call in new_calls[max(allowance, 0):]}
+            new_calls = new_calls[:max(allowance, 0)]
+        return new_calls, originals, skipped
+
+    def _tool_update(self, state: AgentState, new_calls: List[ToolCall], originals: Dict[str, str],
+                     skipped: Set[str], results: List[Optional[ToolMessage]]) -> AgentState:
+        """State update answering every pending call, in the order the model made them"""
         tool_calls = state["current_tool_calls"] or []
+        results_by_id = {message.tool_call_id: message for message in results if message is not None}
+
         tool_messages = []
-        
         for call in tool_calls:
-            # Access tool call data correctly
-            function_name = call.function.name
-            function_args = json.loads(call.function.arguments)
-            tool_call_id = call.id
-            # Find the matching tool
-            tool = next((t for t in self.tools if t.name == function_name), None)
-            if tool:
-                result = str(tool(**function_args))
-                tool_message = ToolMessage(
-                    content=json.dumps(result), 
-                    tool_call_id=tool_call_id, 
-                    name=function_name, 
-                )
-                tool_messages.append(tool_message)
+            if call.id in originals:
+                tool_messages.append(ToolMessage(
+                    content=f"{DUPLICATE_TOOL_CALL_PREFIX}{originals[call.id]} "
+                            "(same tool and arguments): reuse its result above.",
+                    tool_call_id=call.id,
+                    name=call.function.name,
+                ))
+            elif call.id in skipped:
+                tool_messages.append(ToolMessage(
+                    content=SKIPPED_TOOL_CALL, tool_call_id=call.id, name=call.function.name,
+                ))
+            elif call.id in results_by_id:
+                tool_messages.append(results_by_id[call.id])
         
         # Clear tool calls and add results to messages
         return {
-            "messages": state["messages"] + tool_messages,
+            "messages": tool_messages,
             "current_tool_calls": None,
-            "session_id": state["session_id"]
+            "session_id": state["session_id"],
+            "tool_call_count": (state.get("tool_call_count") or 0) + len(new_calls),
+            "budget_exceeded": "tool_calls" if skipped else state.get("budget_exceeded"),
         }
 
-    def _web_search_step(self, state: AgentState) -> AgentState:
+    def _web_search_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
         """Step logic: Perform a web search for the user query.
 
         Finds a tool named ``web_search`` in ``self.tools``, calls it with the
         user query, and appends the result as a UserMessage so subsequent steps
         can access it. Returns an unchanged state if no web search tool exists.
+        When a speculative search for the query was started with the run, its
+        result is awaited instead of searching again.
 
         Args:
             state: Current agent state with ``user_query`` and ``messages``.
+            resource: Run resources; ``vars["web_search"]`` holds the
+                speculative search, if any.
 
         Returns:
             Updated state with web search result appended to ``messages``,
             or the original state when no web search tool is configured.
         """
-        web_search_tool = next((t for t in self.tools if t.name == "web_search"), None)
+        web_search_tool = self._tools_by_name.get("web_search")
         if web_search_tool is None:
             return {}
 
-        result = str(web_search_tool(query=state["user_query"]))
+        speculation = resource.vars.get("web_search") if resource is not None else None
+        if speculation is not None and speculation.query == state["user_query"]:
+            result = speculation.result()
+        else:
+            result = str(web_search_tool(query=state["user_query"]))
         web_message = UserMessage(content=f"[Web Search Results]: {result}")
-        return {"messages": state["messages"] + [web_message]}
+        return {"messages": [web_message]}
 
     def _comparison_step(self, state: AgentState) -> AgentState:
         """Step logic: Compare the agent's response with web search results.
@@ -185,20 +728,35 @@ class Agent:
             Updated state with ``comparison`` set to the LLM-generated
             comparison text, or None if no web search result was found.
         """
+        comparison_messages = self._comparison_messages(state)
+        if comparison_messages is None:
+            return {"comparison": None}
+        response = self._get_llm(with_tools=False).invoke(comparison_messages)
+        return {"comparison": response.content}
+
+    async def _acomparison_step(self, state: AgentState) -> AgentState:
+        """Coroutine `_comparison_step` used by ainvoke(): awaits LLM.ainvoke"""
+        comparison_messages = self._comparison_messages(state)
+        if comparison_messages is None:
+            return {"comparison": None}
+        response = await self._get_llm(with_tools=False).ainvoke(comparison_messages)
+        return {"comparison": response.content}
+
+    def _comparison_messages(self, state: AgentState) -> Optional[List]:
+        """Prompt comparing the last answer with the web search result (None without one)"""
         web_result = next(
             (m.content for m in reversed(state["messages"])
              if getattr(m, "role", "") == "user" and m.content.startswith("[Web Search Results]")),
             None,
         )
         if web_result is None:
-            return {"comparison": None}
+            return None
 
         agent_answer = next(
             (m.content for m in reversed(state["messages"])
              if getattr(m, "role", "") == "assistant"),
             "",
         )
-        llm = LLM(model=self.model_name, temperature=self.temperature, tools=[])
         comparison_messages = [
             SystemMessage(content="You compare an AI agent's answer with web search results."),
             UserMessage(
@@ -209,10 +767,9 @@ class Agent:
                 )
             ),
         ]
-        response = llm.invoke(comparison_messages)
-        return {"comparison": response.content}
+        return comparison_messages
 
-    def _create_state_machine(self) -> StateMachine[AgentState]:
+    def _create_state_machine(self, asynchronous: bool = False) -> StateMachine[AgentState]:
         """Create the internal state machine for the agent.
 
         Assembles the workflow by connecting the entry point, message preparation,
@@ -220,18 +777,25 @@ class Agent:
         steps. The conditional edge after the LLM step routes to tool execution
         when tool calls are present, or to the web search step otherwise.
 
+        Args:
+            asynchronous: Use the coroutine variants of the LLM, tool and
+                comparison steps, for StateMachine.arun (see ainvoke()).
+                Step ids are the same, so either workflow can resume a run
+                checkpointed by the other.
+
         Returns:
             A compiled StateMachine ready to be invoked with an AgentState.
         """
-        machine = StateMachine[AgentState](AgentState)
+        machine = StateMachine[AgentState](AgentState, checkpointer=self.checkpointer)
 
         # Create steps
         entry = EntryPoint[AgentState]()
         message_prep = Step[AgentState]("message_prep", self._prepare_messages_step)
-        llm_processor = Step[AgentState]("llm_processor", self._llm_step)
-        tool_executor = Step[AgentState]("tool_executor", self._tool_step)
+        llm_processor = Step[AgentState]("llm_processor", self._allm_step if asynchronous else self._llm_step)
+        tool_executor = Step[AgentState]("tool_executor", self._atool_step if asynchronous else self._tool_step)
         web_search = Step[AgentState]("web_search", self._web_search_step)
-        comparison = Step[AgentState]("comparison", self._comparison_step)
+        comparison = Step[AgentState]("comparison",
+                                      self._acomparison_step if asynchronous else self._comparison_step)
         termination = Termination[AgentState]()
 
         machine.add_steps([entry, message_prep, llm_processor, tool_executor, web_search, comparison, termination])
@@ -262,19 +826,17 @@ class Agent:
 
         return machine
 
-    def invoke(self, query: str, session_id: Optional[str] = None) -> Run:
-        """
-        Run the agent on a query
-        
-        Args:
-            query: The user's query to process
-            session_id: Optional session identifier (uses "default" if None)
-            
-        Returns:
-            The final run object after processing
-        """
-        session_id = session_id or "default"
+    def _summarize_history(self, previous_summary: Optional[str], messages: List) -> str:
+        """Fold trimmed messages into the rolling summary of the conversation"""
+        return self._get_llm(with_tools=False).invoke(summary_prompt(previous_summary, messages)).content or ""
+
+    def _initial_state(self, query: str, session_id: str) -> Tuple[AgentState, Optional[ContextWindow]]:
+        """Build the initial state, continuing the session's last conversation.
 
+        With a ``context_budget``, the previous messages are windowed to fit
+        it (leaving room for the new query); the ContextWindow describing
+        what was trimmed is returned alongside the state.
+        """
         # Create session if it doesn't exist
         self.memory.create_session(session_id)
 
@@ -286,19 +848,269 @@ class Agent:
             if last_state:
                 previous_messages = last_state["messages"]
 
-        initial_state: AgentState = {
+        window = None
+        if self.context_budget is not None and previous_messages:
+            window = window_messages(
+                previous_messages,
+                self.context_budget,
+                summarize=self._summarize_history if self.summarize_history else None,
+                model=self.model_name,
+                reserved_tokens=message_tokens(UserMessage(content=query), self.model_name),
+            )
+            previous_messages = window.messages
+
+        state = {
             "user_query": query,
             "instructions": self.instructions,
             "messages": previous_messages,
             "current_tool_calls": None,
             "comparison": None,
             "session_id": session_id,
+            "total_tokens": 0,
+            "tool_call_count": 0,
+            "started_at": time.time(),
+            "budget_exceeded": None,
+            "selected_tools": self._select_tools(query),
+        }
+        return state, window
+
+    def _speculate(self, query: str) -> Optional[_SpeculativeSearch]:
+        """Start the web search for ``query`` when speculative search is enabled"""
+        if not self.speculative_web_search or "web_search" not in self._tools_by_name:
+            return None
+        return _SpeculativeSearch(_shared_search_pool(), self._tools_by_name["web_search"], query)
+
+    @staticmethod
+    def _run_resource(speculation: Optional[_SpeculativeSearch], **resource_vars) -> Optional[Resource]:
+        """Resource handed to the steps of one run, None when there is nothing to share"""
+        if speculation is not None:
+            resource_vars["web_search"] = speculation
+        return Resource(vars=resource_vars) if resource_vars else None
+
+    @staticmethod
+    def _record_speculation(run_object: Run, speculation: Optional[_SpeculativeSearch]):
+        """Expose how much latency the speculative web search hid in the Run metadata"""
+        if speculation is not None:
+            run_object.annotations["speculative_web_search"] = speculation.report()
+
+    def _record_tool_selection(self, run_object: Run):
+        """Expose which tools the run advertised, and the schema tokens that saved, in the Run metadata"""
+        state = run_object.get_final_state() if self.tool_selector is not None else None
+        if not state:
+            return
+        selected = state.get("selected_tools")
+        schemas = {tool.name: count_tokens(json.dumps(tool.dict()), self.model_name) for tool in self.tools}
+        run_object.annotations["tool_selection"] = {
+            "available": len(self.tools),
+            "selected": selected,
+            "expanded": selected is not None and self._tool_names(state) is None,
+            "schema_tokens_all": sum(schemas.values()),
+            "schema_tokens_selected": sum(schemas[name] for name in (selected or schemas)),
+        }
+
+    def _record_budget(self, run_object: Run):
+        """Expose the run's usage and the budget limit it hit, if any, in the Run metadata"""
+        state = run_object.get_final_state() if self.budget is not None else None
+        if not state:
+            return
+        run_object.annotations["budget"] = {
+            "limits": asdict(self.budget),
+            "exceeded": state.get("budget_exceeded"),
+            "tokens": state.get("total_tokens") or 0,
+            "seconds": time.time() - (state.get("started_at") or time.time()),
+            "tool_calls": state.get("tool_call_count") or 0,
+        }
+
+    def _record_tool_dedup(self, run_object: Run):
+        """Expose how many tool calls of the run were answered from earlier results"""
+        state = run_object.get_final_state() if self.dedupe_tool_calls else None
+        if not state:
+            return
+        tool_messages = [m for m in self._run_messages(state) if isinstance(m, ToolMessage)]
+        by_id = {m.tool_call_id: m for m in tool_messages}
+        duplicates = [m for m in tool_messages if _is_duplicate(m)]
+        saved_tokens = 0
+        for message in duplicates:
+            original_id = message.content[len(DUPLICATE_TOOL_CALL_PREFIX):].split(" ", 1)[0]
+            if original_id in by_id:
+                saved_tokens += (message_tokens(by_id[original_id], self.model_name)
+                                 - message_tokens(message, self.model_name))
+        run_object.annotations["tool_dedup"] = {
+            "tool_calls": len(tool_messages),
+            "deduplicated": len(duplicates),
+            "hit_rate": len(duplicates) / len(tool_messages) if tool_messages else 0.0,
+            "saved_tokens": max(saved_tokens, 0),
         }
 
-        run_object = self.workflow.run(initial_state)
+    @staticmethod
+    def _record_window(run_object: Run, window: Optional[ContextWindow]):
+        """Expose the context window's trimming counters in the Run metadata"""
+        if window is not None:
+            run_object.annotations["context_window"] = window.report()
+
+    def invoke(self, query: str, session_id: Optional[str] = None,
+               run_id: Optional[str] = None) -> Run:
+        """
+        Run the agent on a query
+        
+        Args:
+            query: The user's query to process
+            session_id: Optional session identifier (uses "default" if None)
+            run_id: Optional id for the run, needed to resume() it after a crash
+            
+        Returns:
+            The final run object after processing
+        """
+        session_id = session_id or "default"
+        speculation = self._speculate(query)
+        try:
+            initial_state, window = self._initial_state(query, session_id)
+            run_object = self.workflow.run(initial_state, resource=self._run_resource(speculation), run_id=run_id)
+        finally:
+            if speculation is not None:
+                speculation.discard()
+        self._record_window(run_object, window)
+        self._record_tool_dedup(run_object)
+        self._record_budget(run_object)
+        self._record_tool_selection(run_object)
+        self._record_speculation(run_object, speculation)
+        
+        # Store the run's final state (not its snapshot history) in memory
+        self.memory.add(run_object.final_only(), session_id)
+        
+        return run_object
+
+    def stream(self, query: str, session_id: Optional[str] = None,
+               run_id: Optional[str] = None) -> Iterator[AgentEvent]:
+        """
+        Run the agent on a query, yielding events while it works
+        
+        The state machine runs on a background thread; LLM text arrives as
+        "text" events token by token, tool executions as "tool_call_start"
+        and "tool_call_end" events, and the finished Run as the last "run"
+        event. Tool calls start as soon as their arguments are complete,
+        while the model may still be streaming further calls. Closing the
+        generator early cancels the run.
+        
+        Args:
+            query: The user's query to process
+            session_id: Optional session identifier (uses "default" if None)
+            run_id: Optional id for the run, needed to resume() it after a crash
+            
+        Yields:
+            AgentEvent objects, ending with the "run" event
+        """
+        session_id = session_id or "default"
+        speculation = self._speculate(query)
+        try:
+            initial_state, window = self._initial_state(query, session_id)
+        except BaseException:
+            if speculation is not None:
+                speculation.discard()
+            raise
+        stream = _StreamContext(self.max_tool_workers)
+        cancellation = CancellationToken()
+
+        def drive():
+            try:
+                run_object = self.workflow.run(
+                    initial_state, resource=self._run_resource(speculation, stream=stream),
+                    run_id=run_id, cancellation=cancellation,
+                )
+                stream.emit(AgentEvent("run", run=run_object))
+            except BaseException as error:
+                stream.events.put(error)
+
+        threading.Thread(target=drive, name="agent-stream", daemon=True).start()
+        run_object = None
+        try:
+            while run_object is None:
+                event = stream.events.get()
+                if isinstance(event, BaseException):
+                    raise event
+                if event.type == "run":
+                    run_object = event.run
+                else:
+                    yield event
+        finally:
+            if run_object is None:
+                cancellation.cancel("stream closed")
+            if speculation is not None:
+                speculation.discard()
+            stream.pool.shutdown(wait=False)
+
+        self._record_window(run_object, window)
+        self._record_tool_dedup(run_object)
+        self._record_budget(run_object)
+        self._record_tool_selection(run_object)
+        self._record_speculation(run_object, speculation)
+
+        # Store the run's final state (not its snapshot history) in memory
+        self.memory.add(run_object.final_only(), session_id)
+
+        yield AgentEvent("run", run=run_object)
+
+    async def ainvoke(self, query: str, session_id: Optional[str] = None,
+                      run_id: Optional[str] = None) -> Run:
+        """
+        Async counterpart of invoke(), driven by StateMachine.arun
+        
+        LLM calls are awaited on the event loop (LLM.ainvoke) and tools run
+        in worker threads, so many concurrent runs do not need a thread each.
+        
+        Args:
+            query: The user's query to process
+            session_id: Optional session identifier (uses "default" if None)
+            run_id: Optional id for the run, needed to resume() it after a crash
+            
+        Returns:
+            The final run object after processing
+        """
+        session_id = session_id or "default"
+        speculation = self._speculate(query)
+        try:
+            # Windowing may call the LLM to summarize, so keep it off the event loop
+            initial_state, window = await asyncio.to_thread(self._initial_state, query, session_id)
+            run_object = await self.async_workflow.arun(initial_state, resource=self._run_resource(speculation),
+                                                  run_id=run_id)
+        finally:
+            if speculation is not None:
+                speculation.discard()
+        self._record_window(run_object, window)
+        self._record_tool_dedup(run_object)
+        self._record_budget(run_object)
+        self._record_tool_selection(run_object)
+        self._record_speculation(run_object, speculation)
+        
+        # Store the run's final state (not its snapshot history) in memory
+        self.memory.add(run_object.final_only(), session_id)
+        
+        return run_object
+
+    def resume(self, run_id: str, session_id: Optional[str] = None) -> Run:
+        """
+        Continue an interrupted run from its last checkpointed step
+        
+        Steps completed before the interruption (including their LLM calls)
+        are restored from the checkpointer instead of being executed again.
+        
+        Args:
+            run_id: Id the run was started with
+            session_id: Session to store the finished run in (uses "default" if None)
+            
+        Returns:
+            The final run object after processing
+        """
+        session_id = session_id or "default"
+        self.memory.create_session(session_id)
+
+        run_object = self.workflow.resume(run_id)
+        self._record_tool_dedup(run_object)
+        self._record_budget(run_object)
+        self._record_tool_selection(run_object)
         
-        # Store the complete run object in memory
-        self.memory.add(run_object, session_id)
+        # Store the run's final state (not its snapshot history) in memory
+        self.memory.add(run_object.final_only(), session_id)
         
         return run_object
 
@@ -309,7 +1121,8 @@ class Agent:
             session_id: Optional session ID (uses "default" if None)
             
         Returns:
-            List of Run objects in the session
+            List of Run objects in the session, each reduced to its final
+            snapshot (see Run.final_only)
         """
         return self.memory.get_all_objects(session_id)
 
@@ -0,0 +1,247 @@
+"""Key/value caches used to skip repeated work.
+
+A cache maps a string key (usually produced by `stable_hash`) to a value and
+counts its hits and misses. Three implementations are provided:
+
+- `LRUCache`: in-process, bounded, evicts the least recently used entry.
+- `SqliteCache`: a SQLite file, so entries survive restarts and can be shared
+  by several processes. Values are encoded with `lib.serialization`.
+- `TieredCache`: chains caches (typically an LRUCache in front of a
+  SqliteCache), promoting entries found in a slower tier to the faster ones.
+
+The backends accept an optional ``ttl`` (seconds an entry stays valid);
+expired entries count as misses and are dropped when met.
+
+`stable_hash` turns any value supported by `lib.serialization` into a
+SHA-256 hex digest that is identical across processes and runs.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Tuple
+
+from lib.serialization import to_jsonable, from_jsonable
+
+
+def stable_hash(value: Any) -> str:
+    """SHA-256 hex digest of ``value``'s canonical JSON encoding"""
+    payload = json.dumps(to_jsonable(value), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters of a cache"""
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class Cache(ABC):
+    """String-keyed cache with hit/miss accounting"""
+
+    def __init__(self):
+        self.stats = CacheStats()
+        self._stats_lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return ``(True, value)`` on a hit and ``(False, None)`` on a miss"""
+        hit, value = self._get(key)
+        with self._stats_lock:
+            if hit:
+                self.stats.hits += 1
+            else:
+                self.stats.misses += 1
+        return hit, value
+
+    def set(self, key: str, value: Any):
+        """Store ``value`` under ``key``, replacing any previous entry"""
+        self._set(key, value)
+
+    @abstractmethod
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def _set(self, key: str, value: Any):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def clear(self):
+        """Drop every entry (the counters are kept)"""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError()
+
+
+class LRUCache(Cache):
+    """In-memory cache holding at most ``max_size`` entries, each valid for ``ttl`` seconds (None: forever)"""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (expiry time or None, value)
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"LRUCache(size={len(self)}, max_size={self.max_size})"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires, value = entry
+            if expires is not None and expires <= self._clock():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def _set(self, key: str, value: Any):
+        expires = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteCache(Cache):
+    """Cache entries stored in a table of a SQLite file.
+
+    Args:
+        ttl: Seconds an entry stays valid (None: forever)
+        max_size: Entries kept; the least recently read or written are
+            evicted beyond it (None: unbounded)
+        clock: Wall-clock time source; entries are shared across processes
+    """
+
+    def __init__(self, path: str, table: str = "cache", ttl: Optional[float] = None,
+                 max_size: Optional[int] = None, clock: Callable[[], float] = time.time):
+        super().__init__()
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table}")
+        if max_size is not None and max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires REAL, accessed REAL NOT NULL DEFAULT 0)"
+            )
+
+    def __repr__(self) -> str:
+        return f"SqliteCache('{self.path}', table='{self.table}')"
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        now = self._clock()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return False, None
+            if row[1] is not None and row[1] <= now:
+                self._connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return False, None
+            if self.max_size is not None:
+                self._connection.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+        return True, from_jsonable(json.loads(row[0]))
+
+    def _set(self, key: str, value: Any):
+        payload = json.dumps(to_jsonable(value), separators=(",", ":"))
+        now = self._clock()
+        expires = now + self.ttl if self.ttl is not None else None
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, payload, expires, now),
+            )
+            if self.max_size is not None:
+                self._connection.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_size,),
+                )
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM {self.table}")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class TieredCache(Cache):
+    """Caches consulted in order, fastest first.
+
+    A hit in a later tier is copied into the earlier ones; writes go to every
+    tier. Each tier keeps its own counters, so ``tiers[0].stats`` shows how
+    often the fast tier alone answered.
+    """
+
+    def __init__(self, *tiers: Cache):
+        super().__init__()
+        if not tiers:
+            raise ValueError("TieredCache needs at least one tier")
+        self.tiers = tiers
+
+    def __repr__(self) -> str:
+        return f"TieredCache({', '.join(map(repr, self.tiers))})"
+
+    def __len__(self) -> int:
+        return len(self.tiers[-1])
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        for i, tier in enumerate(self.tiers):
+            hit, value = tier.get(key)
+            if hit:
+                for faster in self.tiers[:i]:
+                    faster.set(key, value)
+                return True, value
+        return False, None
+
+    def _set(self, key: str, value: Any):
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
@@ -0,0 +1,116 @@
+"""Durable checkpoints for StateMachine runs.
+
+A checkpointer receives one JSON record per unit of progress of a run: a
+``start`` record with the initial state, one ``step`` record per executed
+frontier (the new snapshot-store deltas, the snapshots that reference them
+and the steps to run next) and a ``complete`` record. Records are appended
+as they are produced, so `StateMachine.resume(run_id)` can rebuild the run
+and continue after the last completed step without paying for it again.
+
+Two backends are provided:
+- `SqliteCheckpointer`: a single SQLite file, safe to share between threads.
+- `JsonlCheckpointer`: an append-only JSON Lines log.
+
+Record values are encoded with `lib.serialization`.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+
+
+class Checkpointer(ABC):
+    """Persists and reloads the ordered checkpoint records of runs"""
+
+    @abstractmethod
+    def save(self, run_id: str, seq: int, record: Dict[str, Any]):
+        """Persist record number ``seq`` of ``run_id``"""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def load(self, run_id: str) -> List[Dict[str, Any]]:
+        """Return every record of ``run_id`` in ``seq`` order (empty if unknown)"""
+        raise NotImplementedError()
+
+    def close(self):
+        """Release any handle held by the backend"""
+        pass
+
+
+class SqliteCheckpointer(Checkpointer):
+    """Checkpoint records stored in a SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                " run_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " record TEXT NOT NULL,"
+                " PRIMARY KEY (run_id, seq))"
+            )
+
+    def __repr__(self) -> str:
+        return f"SqliteCheckpointer('{self.path}')"
+
+    def save(self, run_id: str, seq: int, record: Dict[str, Any]):
+        payload = json.dumps(record, separators=(",", ":"))
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (run_id, seq, record) VALUES (?, ?, ?)",
+                (run_id, seq, payload),
+            )
+
+    def load(self, run_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT record FROM checkpoints WHERE run_id = ? ORDER BY seq", (run_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class JsonlCheckpointer(Checkpointer):
+    """Checkpoint records appended to a JSON Lines file.
+
+    Every record is flushed and fsynced before save() returns. A torn last
+    line (crash during a write) is ignored on load.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"JsonlCheckpointer('{self.path}')"
+
+    def save(self, run_id: str, seq: int, record: Dict[str, Any]):
+        line = json.dumps({"run_id": run_id, "seq": seq, "record": record}, separators=(",", ":"))
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load(self, run_id: str) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        records: Dict[int, Dict[str, Any]] = {}
+        with self._lock, open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry["run_id"] == run_id:
+                    records[entry["seq"]] = entry["record"]
+        return [records[seq] for seq in sorted(records)]
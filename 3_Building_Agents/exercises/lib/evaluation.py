@@ -254,7 +254,8 @@ class AgentEvaluator:
             snapshot for snapshot in run.snapshots 
             if snapshot.step_id not in ["__entry__", "__termination__"]
         ]
-        steps_taken = len(actual_steps)
+        # Snapshots discarded by the run's retention policy still count as steps
+        steps_taken = len(actual_steps) + run.dropped_steps
         messages = final_state.get("messages", [])
         total_tokens = final_state.get("total_tokens", 0)
         
@@ -10,19 +10,343 @@ Notes for readers:
   0.0) for reproducible exercise outputs.
 - Tools are passed to the model as a compact function schema via
   `Tool.dict()`; the runtime selects `tool_choice: auto` when tools exist.
+- `LLM.stream` yields `StreamEvent`s (text deltas, tool calls as soon as
+  their arguments are complete, then the assembled `AIMessage`).
+- `OpenAI` clients are pooled per process (see `shared_client`), so every
+  `LLM` with the same key and endpoint reuses one HTTP connection pool.
+- `LLM.ainvoke` runs on a pooled `AsyncOpenAI` client; a process-wide
+  limit (see `set_max_concurrency`) caps the requests in flight.
+- An opt-in `ResponseCache` answers byte-identical requests (same model,
+  temperature, messages, tools and response format) without a network call.
+- An opt-in `RateLimiter` (see `lib.rate_limiting`), shared by several
+  adapters, keeps requests under requests/min and tokens/min limits and
+  retries 429s and transient errors with backoff.
 """
 
+import asyncio
+import itertools
+import json
 import os
-from typing import List, Optional, Dict, Any
+import threading
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Deque, Dict, Iterator, List, Optional, Tuple
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import APIConnectionError, AsyncOpenAI, OpenAI
 from lib.messages import (
     AnyMessage,
     AIMessage,
     BaseMessage,
+    TokenUsage,
     UserMessage,
 )
-from lib.tooling import Tool
+from lib.caching import Cache, CacheStats, LRUCache, SqliteCache, TieredCache, stable_hash
+from lib.rate_limiting import RateLimiter, TokenCharge, is_retryable
+from lib.serialization import class_path
+from lib.tooling import Tool, ToolCall
+from lib.windowing import count_tokens
+
+VOCAREUM_BASE_URL = "https://openai.vocareum.com/v1"
+# Completion tokens assumed for a request before its usage is known
+COMPLETION_TOKENS_ESTIMATE = 256
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], OpenAI] = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> OpenAI:
+    """Process-wide `OpenAI` client for ``api_key`` and ``base_url``.
+
+    The client (and its keep-alive connection pool) is created on first use
+    and returned to every later caller with the same key and endpoint. OpenAI
+    clients are thread-safe, so steps, runs and threads can share it.
+    """
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = OpenAI(api_key=api_key, base_url=base_url)
+                _clients[key] = client
+    return client
+
+
+# Default cap on LLM.ainvoke requests in flight (see set_max_concurrency)
+MAX_CONCURRENT_REQUESTS = 64
+_max_concurrency = MAX_CONCURRENT_REQUESTS
+# httpx's async pool scans every connection it holds on each request, which
+# degrades sharply past a few dozen; ainvoke requests are spread round-robin
+# over enough clients to keep each near this many in flight.
+REQUESTS_PER_ASYNC_CLIENT = 10
+
+
+@dataclass
+class _LoopPool:
+    clients: Dict[Tuple[Optional[str], Optional[str]], List[AsyncOpenAI]] = field(default_factory=dict)
+    turns: Iterator[int] = field(default_factory=itertools.count)
+
+
+_loop_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopPool]" = weakref.WeakKeyDictionary()
+
+
+def _loop_pool() -> _LoopPool:
+    loop = asyncio.get_running_loop()
+    pool = _loop_pools.get(loop)
+    if pool is None:
+        with _clients_lock:
+            pool = _loop_pools.setdefault(loop, _LoopPool())
+    return pool
+
+
+def shared_async_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> AsyncOpenAI:
+    """`AsyncOpenAI` client for ``api_key`` and ``base_url`` on the running event loop.
+
+    Async HTTP connections belong to the event loop that opened them, so the
+    pool is kept per loop (and dropped with it). Within a loop, callers with
+    the same key and endpoint share a few clients, handed out round-robin so
+    that each holds about `REQUESTS_PER_ASYNC_CLIENT` of the requests
+    allowed in flight.
+    """
+    pool = _loop_pool()
+    clients = pool.clients.setdefault((api_key, base_url), [])
+    index = next(pool.turns) % -(-_max_concurrency // REQUESTS_PER_ASYNC_CLIENT)
+    if index >= len(clients):
+        clients.append(AsyncOpenAI(api_key=api_key, base_url=base_url))
+        index = len(clients) - 1
+    return clients[index]
+
+
+class _RequestSlots:
+    """Process-wide cap on the `LLM.ainvoke` requests in flight.
+
+    An asyncio.Semaphore belongs to one event loop, but the cap must hold
+    across every loop of the process (``asyncio.run`` in several threads,
+    `run_many` workers). The count is
+    kept under a thread lock; requests over the cap wait in FIFO order on a
+    future of their own loop, which a released slot is handed to.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    async def __aenter__(self) -> "_RequestSlots":
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < _max_concurrency and not self._waiters:
+                self.in_flight += 1
+                return self
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            if not queued and waiter[1].done() and not waiter[1].cancelled():
+                # The slot arrived just before the cancellation
+                self.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self.dispatch()
+
+    def dispatch(self):
+        """Hand free slots to the requests waiting longest"""
+        with self._lock:
+            granted = []
+            while self._waiters and self.in_flight < _max_concurrency:
+                granted.append(self._waiters.popleft())
+                self.in_flight += 1
+        for loop, future in granted:
+            try:
+                loop.call_soon_threadsafe(self._grant, future)
+            except RuntimeError:
+                # The waiter's loop is closed
+                self.release()
+
+    def _grant(self, future: asyncio.Future):
+        if future.done():
+            # Cancelled while the slot was on its way: pass it on
+            self.release()
+        else:
+            future.set_result(None)
+
+
+_request_slots = _RequestSlots()
+
+
+def set_max_concurrency(limit: int):
+    """Cap the `LLM.ainvoke` requests in flight at once, across all adapters,
+    threads and event loops of the process.
+
+    The default is `MAX_CONCURRENT_REQUESTS`. The new limit applies at once:
+    raising it wakes waiting requests, lowering it lets the requests in
+    flight finish.
+    """
+    global _max_concurrency
+    if limit < 1:
+        raise ValueError(f"max concurrency must be at least 1, got {limit}")
+    with _clients_lock:
+        _max_concurrency = limit
+    _request_slots.dispatch()
+
+
+def _request_slot() -> _RequestSlots:
+    """Async context manager holding one of the process's request slots"""
+    return _request_slots
+
+
+def _is_retryable(error: BaseException) -> bool:
+    return isinstance(error, APIConnectionError) or is_retryable(error)
+
+
+def _token_usage(usage: Any) -> Optional[TokenUsage]:
+    """`TokenUsage` of an API ``usage`` object (None when not reported)"""
+    if not usage:
+        return None
+    return TokenUsage(
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        total_tokens=usage.total_tokens
+    )
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Tokens a request is expected to use: its messages and tool schemas
+    (as sent, JSON included) plus `COMPLETION_TOKENS_ESTIMATE`.
+    """
+    prompt = json.dumps([payload.get("messages"), payload.get("tools")], default=str)
+    return count_tokens(prompt, payload.get("model", "gpt-4o-mini")) + COMPLETION_TOKENS_ESTIMATE
+
+
+@dataclass
+class StreamEvent:
+    """One item yielded by `LLM.stream`.
+
+    Attributes:
+        type: ``"text"`` (a content delta in ``content``), ``"tool_call"``
+            (a fully assembled call in ``tool_call``) or ``"message"`` (the
+            final `AIMessage` in ``message``, always the last event).
+    """
+
+    type: str
+    content: Optional[str] = None
+    tool_call: Optional[ToolCall] = None
+    message: Optional[AIMessage] = None
+
+
+def _assemble_tool_call(parts: Dict[str, Any]) -> ToolCall:
+    """Build a `ToolCall` from the id, name and argument fragments of a stream"""
+    return ToolCall(
+        id=parts["id"],
+        type="function",
+        function={"name": parts["name"], "arguments": "".join(parts["arguments"])},
+    )
+
+
+def _arguments_complete(parts: Dict[str, Any]) -> bool:
+    """Whether the argument fragments received so far form a whole JSON object"""
+    if not parts["arguments"] or not parts["arguments"][-1].rstrip().endswith("}"):
+        return False
+    try:
+        json.loads("".join(parts["arguments"]))
+    except ValueError:
+        return False
+    return True
+
+
+@dataclass
+class ResponseCacheStats(CacheStats):
+    """Counters of a `ResponseCache`.
+
+    Attributes:
+        bytes_saved: Request and response JSON not sent over the network.
+        tokens_saved: Tokens of the cached responses served again (when
+            the API reported usage for them).
+        skipped: Requests not cached because they sample (temperature > 0).
+    """
+    bytes_saved: int = 0
+    tokens_saved: int = 0
+    skipped: int = 0
+
+
+class ResponseCache:
+    """Opt-in two-tier cache of LLM responses.
+
+    Requests are keyed on a canonical hash of the payload (model,
+    temperature, messages, tool schemas and tool choice) and the response
+    format's schema, so only byte-identical requests share an answer. The
+    first tier is an in-process LRU; with a ``path``, a SQLite file behind
+    it keeps entries across restarts and shares them between processes.
+
+    Sampled requests (temperature > 0, or a model whose temperature is not
+    set explicitly) are expected to vary between calls, so they are only
+    cached when ``cache_sampled`` is True.
+
+    Args:
+        max_size: Entries kept in memory.
+        path: Optional SQLite file for the second tier.
+        disk_max_size: Entries kept in the SQLite file (None: unbounded).
+        ttl: Seconds an entry stays valid in both tiers (None: forever).
+        cache_sampled: Also cache requests with temperature > 0.
+    """
+
+    def __init__(self, max_size: int = 1024, path: Optional[str] = None,
+                 disk_max_size: Optional[int] = None, ttl: Optional[float] = None,
+                 cache_sampled: bool = False):
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.cache: Cache = self.memory
+        if path is not None:
+            disk = SqliteCache(path, table="llm_responses", ttl=ttl, max_size=disk_max_size)
+            self.cache = TieredCache(self.memory, disk)
+        self.cache_sampled = cache_sampled
+        self.stats = ResponseCacheStats()
+        self._lock = threading.Lock()
+
+    def key(self, payload: Dict[str, Any], response_format: Optional[type] = None) -> Optional[str]:
+        """Cache key of a request, or None when the request must not be cached"""
+        if payload.get("temperature", 1.0) > 0 and not self.cache_sampled:
+            with self._lock:
+                self.stats.skipped += 1
+            return None
+        response_schema = None
+        if response_format is not None:
+            response_schema = [class_path(response_format), response_format.model_json_schema()]
+        return stable_hash([payload, response_schema])
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        """The cached response for ``key`` (a copy), or None on a miss"""
+        hit, entry = self.cache.get(key)
+        with self._lock:
+            if not hit:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            self.stats.bytes_saved += entry["bytes"]
+            usage = getattr(entry["message"], "token_usage", None)
+            self.stats.tokens_saved += usage.total_tokens if usage else 0
+        return entry["message"].model_copy(deep=True)
+
+    def set(self, key: str, payload: Dict[str, Any], message: AIMessage):
+        """Store ``message`` as the response to ``payload``"""
+        size = len(json.dumps(payload, default=str)) + len(json.dumps(message.dict(), default=str))
+        self.cache.set(key, {"message": message, "bytes": size})
+
+    def clear(self):
+        """Drop every cached response (the counters are kept)"""
+        self.cache.clear()
 
 
 class LLM:
@@ -40,7 +364,12 @@ class LLM:
         model: str = "gpt-4o-mini",
         temperature: float = 0.0,
         tools: Optional[List[Tool]] = None,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        client: Optional[OpenAI] = None,
+        async_client: Optional[AsyncOpenAI] = None,
+        cache: Optional[ResponseCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
     ):
         """Create an `LLM` adapter instance.
 
@@ -52,33 +381,51 @@ class LLM:
             api_key: Optional API key; when omitted the `OPENAI_API_KEY`
                 environment variable is used. Keys prefixed with `voc-`
                 switch the client to a Vocarum-compatible base URL.
-
-        The initializer configures the OpenAI client and prepares an
+            base_url: Optional endpoint overriding the resolved base URL
+                (e.g. a local OpenAI-compatible server).
+            client: Optional pre-built `OpenAI` client; when omitted the
+                process-wide client from `shared_client` is reused.
+            async_client: Optional pre-built `AsyncOpenAI` client for
+                `ainvoke`; when omitted one with the same key and endpoint
+                as ``client`` is taken from `shared_async_client`.
+            cache: Optional `ResponseCache` answering repeated requests
+                (it can be shared by several adapters).
+            rate_limiter: Optional `RateLimiter` pacing and retrying the
+                requests; share one instance between all adapters using the
+                same key. With it, the client's own retries are turned off.
+
+        The initializer resolves the OpenAI client and prepares an
         index of registered `Tool`s keyed by name for payload construction.
         """
 
         self.model = model
         self.temperature = temperature
 
-        # Resolve key: explicit param or env var
-        resolved_key = api_key or os.environ.get("OPENAI_API_KEY", "")
+        if client is None:
+            # Resolve key: explicit param or env var
+            resolved_key = api_key or os.environ.get("OPENAI_API_KEY", "")
+
+            # Configure Vocarum endpoint if using Vocarum API key
+            if base_url is None and resolved_key.startswith('voc-'):
+                base_url = VOCAREUM_BASE_URL
 
-        # Configure Vocarum endpoint if using Vocarum API key
-        if resolved_key.startswith('voc-'):
-            self.client = OpenAI(
-                api_key=resolved_key,
-                base_url="https://openai.vocareum.com/v1"
-            )
-        else:
             # When no key is available, OpenAI client accepts None and will
             # error later when a request is attempted — that's fine for
             # exercises that expect an API-backed run.
-            self.client = OpenAI(api_key=resolved_key if resolved_key else None)
+            client = shared_client(resolved_key or None, base_url)
+        self.client = client
+        self.async_client = async_client
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self._unretried_client: Optional[OpenAI] = None
 
         # Tools indexed by name for convenient registration/lookup.
         self.tools: Dict[str, Tool] = {
             tool.name: tool for tool in (tools or [])
         }
+        # Tool schemas are serialized once per tool set and reused, so every
+        # request carries an identical (prefix-cache friendly) tools payload.
+        self._tools_payload: Optional[List[Dict[str, Any]]] = None
 
     def register_tool(self, tool: Tool):
         """Register a `Tool` for inclusion in subsequent requests.
@@ -89,18 +436,43 @@ class LLM:
 
         Side effects:
             Adds `tool` to the adapter's `self.tools` mapping keyed by
-            `tool.name`, so `_build_payload` will include its schema.
+            `tool.name`, so `_build_payload` will include its schema, and
+            invalidates the cached tools payload.
         """
 
         self.tools[tool.name] = tool
+        self._tools_payload = None
+
+    def _tools_schema(self, tool_names: Optional[Collection[str]] = None) -> List[Dict[str, Any]]:
+        """Return the schemas of the registered tools, built on first use.
+
+        The same list is reused by every request until `register_tool`
+        changes the tool set, so the serialized `tools` entry stays
+        byte-for-byte identical across requests.
+
+        Args:
+            tool_names: Optional subset of registered tool names; only
+                their schemas are returned, in registration order.
+        """
+
+        payload = self._tools_payload
+        if payload is None:
+            payload = [tool.dict() for tool in self.tools.values()]
+            self._tools_payload = payload
+        if tool_names is not None:
+            payload = [schema for name, schema in zip(self.tools, payload) if name in tool_names]
+        return payload
 
-    def _build_payload(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+    def _build_payload(self, messages: List[BaseMessage],
+                       tool_names: Optional[Collection[str]] = None) -> Dict[str, Any]:
         """Build the request payload sent to the OpenAI-style client.
 
         Args:
             messages: List of `BaseMessage` instances to include in the
                 chat exchange. Each message is converted to a JSON-safe
                 dict via its `.dict()` helper.
+            tool_names: Optional subset of the registered tools to
+                advertise (all of them when omitted).
 
         Returns:
             A dict containing `model`, `temperature`, and `messages`. If
@@ -120,8 +492,9 @@ class LLM:
         if not self.model.startswith("gpt-5"):
             payload["temperature"] = self.temperature
 
-        if self.tools:
-            payload["tools"] = [tool.dict() for tool in self.tools.values()]
+        tools = self._tools_schema(tool_names) if self.tools else None
+        if tools:
+            payload["tools"] = tools
             payload["tool_choice"] = "auto"
 
         return payload
@@ -149,7 +522,8 @@ class LLM:
 
     def invoke(self, 
                input: str | BaseMessage | List[BaseMessage], 
-               response_format: BaseModel = None,) -> AIMessage:
+               response_format: BaseModel = None,
+               tool_names: Optional[Collection[str]] = None) -> AIMessage:
         """Invoke the model and return an `AIMessage` containing the result.
 
         Args:
@@ -158,6 +532,8 @@ class LLM:
             response_format (Optional[BaseModel]): If provided, a Pydantic
                 model used to parse structured model responses via the
                 beta parsing endpoint.
+            tool_names (Optional[Collection[str]]): Send only these
+                registered tools' schemas (see `lib.tool_selection`).
 
         Returns:
             AIMessage: object with `content` (str) and optional
@@ -171,17 +547,188 @@ class LLM:
             inspect and (optionally) execute.
         """
 
+        payload, key, cached = self._prepare_request(input, response_format, tool_names)
+        if cached is not None:
+            return cached
+        if response_format:
+            send = lambda client: client.beta.chat.completions.parse(**payload)
+        else:
+            send = lambda client: client.chat.completions.create(**payload)
+        charge = self._charge(payload)
+        response = self._request(send, charge)
+        self._settle(charge, response.usage)
+        return self._response_message(response, payload, key)
+
+    async def ainvoke(self,
+                      input: str | BaseMessage | List[BaseMessage],
+                      response_format: BaseModel = None,
+                      tool_names: Optional[Collection[str]] = None) -> AIMessage:
+        """Asynchronous `invoke` on an `AsyncOpenAI` client.
+
+        Takes the same arguments and returns the same `AIMessage`
+        (structured output through the beta `.parse()` endpoint, the response
+        cache included). At most `set_max_concurrency` requests of the process
+        are in flight at once; further calls wait for a free slot, so
+        ``asyncio.gather`` over many calls is safe.
+        """
+        payload, key, cached = self._prepare_request(input, response_format, tool_names)
+        if cached is not None:
+            return cached
+        client = self._get_async_client()
+        if self.rate_limiter is not None:
+            client = client.with_options(max_retries=0)
+        if response_format:
+            send = lambda: client.beta.chat.completions.parse(**payload)
+        else:
+            send = lambda: client.chat.completions.create(**payload)
+        charge = self._charge(payload)
+        async with _request_slot():
+            if self.rate_limiter is None:
+                response = await send()
+            else:
+                response = await self.rate_limiter.acall(send, charge.charged, retryable=_is_retryable)
+        self._settle(charge, response.usage)
+        return self._response_message(response, payload, key)
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        if self.async_client is not None:
+            return self.async_client
+        return shared_async_client(self.client.api_key, str(self.client.base_url))
+
+    def _request(self, send: Callable[[OpenAI], Any], charge: Optional[TokenCharge]) -> Any:
+        """``send(client)``, paced and retried by the rate limiter when there is one"""
+        if self.rate_limiter is None:
+            return send(self.client)
+        if self._unretried_client is None:
+            # The limiter owns retries (and their backoff), so the client must not retry too
+            self._unretried_client = self.client.with_options(max_retries=0)
+        client = self._unretried_client
+        return self.rate_limiter.call(lambda: send(client), charge.charged, retryable=_is_retryable)
+
+    def _charge(self, payload: Dict[str, Any]) -> Optional[TokenCharge]:
+        if self.rate_limiter is None:
+            return None
+        return self.rate_limiter.charge(estimate_tokens(payload))
+
+    def _settle(self, charge: Optional[TokenCharge], usage: Any):
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(charge, usage.total_tokens if usage else None)
+
+    def _prepare_request(self, input: Any, response_format: Optional[type],
+                         tool_names: Optional[Collection[str]]
+                         ) -> Tuple[Dict[str, Any], Optional[str], Optional[AIMessage]]:
+        """Payload, cache key and cached response (if any) of a request"""
         messages = self._convert_input(input)
-        payload = self._build_payload(messages)
+        payload = self._build_payload(messages, tool_names)
+        key = self.cache.key(payload, response_format) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return payload, key, cached
         if response_format:
             payload.update({"response_format": response_format})
-            response = self.client.beta.chat.completions.parse(**payload)
-        else:
-            response = self.client.chat.completions.create(**payload)
+        return payload, key, None
+
+    def _response_message(self, response: Any, payload: Dict[str, Any], key: Optional[str]) -> AIMessage:
+        """`AIMessage` of a chat completion, stored in the cache under ``key``"""
         choice = response.choices[0]
         message = choice.message
 
-        return AIMessage(
+        result = AIMessage(
             content=message.content,
-            tool_calls=message.tool_calls
-        )
\ No newline at end of file
+            tool_calls=message.tool_calls,
+            token_usage=_token_usage(response.usage)
+        )
+        if key is not None:
+            self.cache.set(key, payload, result)
+        return result
+
+    def stream(self, input: str | BaseMessage | List[BaseMessage],
+               tool_names: Optional[Collection[str]] = None) -> Iterator[StreamEvent]:
+        """Invoke the model with ``stream=True`` and yield events as they arrive.
+
+        Args:
+            input (str | BaseMessage | List[BaseMessage]): User input or
+                pre-built message(s) to send to the model.
+            tool_names (Optional[Collection[str]]): Send only these
+                registered tools' schemas.
+
+        Yields:
+            StreamEvent: ``text`` events for each content delta, one
+                ``tool_call`` event per requested call as soon as its
+                arguments are complete, then a single ``message`` event
+                holding the same `AIMessage` `invoke` would return.
+
+        Notes:
+            The API streams tool calls one after another, each split into
+            argument fragments. A call is complete as soon as its fragments
+            form a whole JSON object (or, failing that, when the next call
+            starts or the stream ends), so callers can start executing it
+            while the model is still generating the following calls.
+        """
+
+        messages = self._convert_input(input)
+        payload = self._build_payload(messages, tool_names)
+        key = self.cache.key(payload) if self.cache is not None else None
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            # Replay the cached response as one text event and its tool calls
+            if cached.content:
+                yield StreamEvent("text", content=cached.content)
+            for call in cached.tool_calls or []:
+                yield StreamEvent("tool_call", tool_call=call)
+            yield StreamEvent("message", message=cached)
+            return
+        # The final chunk then carries the usage of the whole response
+        request = dict(payload, stream_options={"include_usage": True})
+        text: List[str] = []
+        tool_calls: List[ToolCall] = []
+        current: Optional[Dict[str, Any]] = None
+        token_usage = None
+
+        charge = self._charge(payload)
+        # Rate limits and retries apply to opening the stream; once chunks flow it is not resent
+        chunks = self._request(lambda client: client.chat.completions.create(stream=True, **request), charge)
+        try:
+            for chunk in chunks:
+                if chunk.usage:
+                    token_usage = _token_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    text.append(delta.content)
+                    yield StreamEvent("text", content=delta.content)
+                for fragment in delta.tool_calls or []:
+                    if current is None or fragment.index != current["index"]:
+                        if current is not None and not current["done"]:
+                            tool_calls.append(_assemble_tool_call(current))
+                            yield StreamEvent("tool_call", tool_call=tool_calls[-1])
+                        current = {"index": fragment.index, "id": fragment.id, "name": "",
+                                   "arguments": [], "done": False}
+                    if fragment.function and not current["done"]:
+                        current["name"] += fragment.function.name or ""
+                        current["arguments"].append(fragment.function.arguments or "")
+                        # Release the call as soon as its arguments parse as a whole object
+                        if _arguments_complete(current):
+                            current["done"] = True
+                            tool_calls.append(_assemble_tool_call(current))
+                            yield StreamEvent("tool_call", tool_call=tool_calls[-1])
+
+            if current is not None and not current["done"]:
+                tool_calls.append(_assemble_tool_call(current))
+                yield StreamEvent("tool_call", tool_call=tool_calls[-1])
+        finally:
+            # Also when the consumer stops early: settle with the usage seen so far
+            # and release the connection
+            chunks.close()
+            self._settle(charge, token_usage)
+
+        result = AIMessage(
+            content="".join(text) if text else None,
+            tool_calls=tool_calls or None,
+            token_usage=token_usage
+        )
+        if key is not None:
+            self.cache.set(key, payload, result)
+        yield StreamEvent("message", message=result)
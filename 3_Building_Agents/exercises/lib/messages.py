@@ -75,6 +75,20 @@ class ToolMessage(BaseMessage):
     name: Optional[str] = None
 
 
+class TokenUsage(BaseModel):
+    """Token counts the API reported for one completion.
+
+    Attributes:
+        prompt_tokens: int -- tokens of the request (messages and tools).
+        completion_tokens: int -- tokens the model generated.
+        total_tokens: int -- sum of both.
+    """
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+
+
 class AIMessage(BaseMessage):
     """Assistant/agent message with optional tool-call metadata.
 
@@ -83,17 +97,21 @@ class AIMessage(BaseMessage):
     returned by the model. The library serializes only a compact subset of
     each tool call (id, type, function.name, function.arguments) for logging
     and for decision-making about invoking actual tool implementations.
+    `token_usage` holds the usage the API reported for the response, when
+    known; it is bookkeeping and is not part of `dict()`.
     """
 
     role: Literal["assistant"] = "assistant"
     tool_calls: Optional[List[Any]] = None
+    token_usage: Optional[TokenUsage] = None
 
     def dict(self) -> Dict:
         """Return a JSON-safe dict for the AI message, including normalized
         `tool_calls` when present.
 
         The default Pydantic dump excludes the `tool_calls` field so the
-        method can control serialization shape. When `tool_calls` exists each
+        method can control serialization shape, and `token_usage`, which is
+        not part of the message sent to a model. When `tool_calls` exists each
         entry is mapped to a minimal dict with the keys `id`, `type` and
         a `function` object containing `name` and `arguments`.
 
@@ -102,7 +120,7 @@ class AIMessage(BaseMessage):
                 any normalized tool call metadata.
         """
 
-        base = self.model_dump(mode="json", exclude_none=True, exclude={"tool_calls"})
+        base = self.model_dump(mode="json", exclude_none=True, exclude={"tool_calls", "token_usage"})
         if self.tool_calls:
             # Normalize tool call objects to a compact dict form.
             base["tool_calls"] = [
@@ -0,0 +1,382 @@
+"""Client-side rate limiting and retries for LLM requests.
+
+Providers cap each key at a number of requests and tokens per minute and
+answer 429 once either is exceeded. A `RateLimiter` shared by every `LLM`
+of a process keeps a batch of calls under those caps instead of letting a
+burst fail:
+
+- two token buckets, refilled continuously, hold the requests/min and
+  tokens/min allowances; each call waits until both buckets cover one
+  request and its estimated tokens, then takes them. An attempt that fails
+  gives its tokens back;
+- the estimate is corrected with the usage the API reports, so a rough
+  guess does not drift the budget, and later estimates are scaled by the
+  observed ratio of used to estimated tokens (`TokenCharge` keeps the
+  amount actually taken, so the correction matches it);
+- retryable failures (429, 408/409, 5xx, connection errors) are retried
+  with jittered exponential backoff. A ``Retry-After`` header replaces the
+  computed delay and pauses every caller of the limiter, not only the one
+  that got the 429.
+
+`RateLimiterStats` separates the time spent waiting in the limiter (queue
+and backoff) from the time spent in requests (server latency).
+"""
+
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Mapping, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429})
+# Weight of the latest call in the running used/estimated token ratio
+USAGE_RATIO_WEIGHT = 0.2
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from ``retry-after-ms`` / ``Retry-After`` headers, if any.
+
+    ``Retry-After`` may hold seconds or an HTTP date; ``now`` (epoch seconds)
+    is only needed for the latter and defaults to the current time.
+    """
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - (time.time() if now is None else now))
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of an API error (``status_code`` attribute), if any"""
+    status = getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a request failing with ``error`` may succeed when sent again"""
+    status = status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def error_retry_after(error: BaseException) -> Optional[float]:
+    """Retry-After of the HTTP response attached to ``error``, if any"""
+    return parse_retry_after(getattr(getattr(error, "response", None), "headers", None))
+
+
+class TokenBucket:
+    """Continuously refilled allowance of ``rate_per_minute`` units.
+
+    The bucket holds at most ``capacity`` units (default: a minute's worth).
+    Callers ask `wait_time` how long until it covers their amount, sleep
+    that long if needed and ask again, then `take` the units; a refund in
+    the meantime shortens the wait. Amounts above the capacity only wait
+    for a full bucket and leave it in debt, so they cannot wait forever.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if rate_per_minute <= 0:
+            raise ValueError(f"rate must be positive, got {rate_per_minute}")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self.clock = clock
+        self.level = self.capacity
+        self.updated = clock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: Optional[float] = None) -> float:
+        """Seconds until the bucket covers ``amount`` units (0 when it does)"""
+        self._refill(self.clock() if now is None else now)
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float):
+        """Remove ``amount`` units (the level may go below zero)"""
+        self.level -= amount
+
+    def refund(self, amount: float):
+        """Give back ``amount`` units (negative to charge more)"""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class TokenCharge(NamedTuple):
+    """Tokens estimated for a call and the amount the limiter takes for them"""
+    estimated: int
+    charged: float
+
+
+@dataclass
+class RateLimiterStats:
+    """Counters of a `RateLimiter`.
+
+    Attributes:
+        requests: Calls made through the limiter.
+        attempts: Requests sent, retries included.
+        throttled: Attempts answered with 429.
+        retries: Attempts repeated after a retryable failure.
+        failures: Calls that still failed after the last retry.
+        queue_seconds: Time waiting for the buckets before sending.
+        backoff_seconds: Time waiting between attempts.
+        server_seconds: Time inside requests (until the response, or the
+            first chunk of a stream).
+        estimated_tokens: Tokens estimated for the calls before sending.
+        used_tokens: Tokens the API reported for the calls.
+    """
+    requests: int = 0
+    attempts: int = 0
+    throttled: int = 0
+    retries: int = 0
+    failures: int = 0
+    queue_seconds: float = 0.0
+    backoff_seconds: float = 0.0
+    server_seconds: float = 0.0
+    estimated_tokens: int = 0
+    used_tokens: int = 0
+
+    def report(self) -> Dict[str, Any]:
+        """Mean waiting (queue + backoff) and server time per call, with the counters"""
+        calls = self.requests or 1
+        return {
+            "requests": self.requests,
+            "attempts": self.attempts,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "failures": self.failures,
+            "mean_wait_seconds": (self.queue_seconds + self.backoff_seconds) / calls,
+            "mean_server_seconds": self.server_seconds / calls,
+            "estimated_tokens": self.estimated_tokens,
+            "used_tokens": self.used_tokens,
+        }
+
+
+class RateLimiter:
+    """Shared requests/min and tokens/min limiter with retries.
+
+    One instance is meant to be shared by every LLM (and thread, or task)
+    calling the same API key, e.g. ``LLM(..., rate_limiter=limiter)`` or
+    ``Agent(..., rate_limiter=limiter)``.
+
+    Args:
+        requests_per_minute: Request allowance (None: unlimited).
+        tokens_per_minute: Token allowance, prompt and completion
+            (None: unlimited).
+        burst_seconds: Allowance the buckets hold when idle, in seconds of
+            rate. Providers enforce per-minute limits over shorter intervals
+            too, so a full minute's burst would be answered with 429s.
+        max_retries: Attempts repeated after a retryable failure.
+        base_delay: Backoff before the first retry, doubled for each
+            further one.
+        max_delay: Upper bound of a computed backoff (a ``Retry-After``
+            sent by the server is honoured as is).
+        jitter: Fraction of each delay drawn at random, so callers throttled
+            together do not retry together.
+        clock: Monotonic clock in seconds (injectable for tests).
+        sleep: Blocking sleep used by `call` (injectable for tests).
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, burst_seconds: float = 1.0,
+                 max_retries: int = 5, base_delay: float = 0.5, max_delay: float = 30.0,
+                 jitter: float = 0.5, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.requests = self._bucket(requests_per_minute, burst_seconds, clock)
+        self.tokens = self._bucket(tokens_per_minute, burst_seconds, clock)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = RateLimiterStats()
+        # Running used/estimated token ratio, applied to later reservations
+        self.usage_ratio = 1.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bucket(per_minute: Optional[float], burst_seconds: float,
+                clock: Callable[[], float]) -> Optional[TokenBucket]:
+        if not per_minute:
+            return None
+        return TokenBucket(per_minute, max(1.0, per_minute * burst_seconds / 60), clock)
+
+    def charge(self, estimated: int) -> TokenCharge:
+        """What to take for a call estimated at ``estimated`` tokens.
+
+        The estimate is scaled by the usage ratio observed so far; pass the
+        result's ``charged`` to `call` and the result itself to `settle`.
+        """
+        with self._lock:
+            return TokenCharge(estimated, estimated * self.usage_ratio)
+
+    def try_acquire(self, tokens: float) -> float:
+        """Take one request and ``tokens`` if the limits allow it now.
+
+        Returns 0 when taken, otherwise the seconds to wait before trying
+        again (nothing is taken then).
+        """
+        with self._lock:
+            now = self.clock()
+            delay = max(0.0, self._paused_until - now)
+            if self.requests is not None:
+                delay = max(delay, self.requests.wait_time(1, now))
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.wait_time(tokens, now))
+            if delay > 0:
+                return delay
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            return 0.0
+
+    def settle(self, charge: TokenCharge, used: Optional[int]):
+        """Correct the token bucket once the real usage of a call is known.
+
+        The difference is taken against ``charge.charged``, the amount the
+        call actually took, not against the current usage ratio.
+        """
+        estimated = charge.estimated
+        with self._lock:
+            self.stats.estimated_tokens += estimated
+            if used is None or estimated <= 0:
+                return
+            self.stats.used_tokens += used
+            if self.tokens is not None:
+                self.tokens.refund(charge.charged - used)
+            self.usage_ratio += USAGE_RATIO_WEIGHT * (used / estimated - self.usage_ratio)
+
+    def _release(self, tokens: float):
+        # A failed attempt used no tokens: give back what it took
+        if self.tokens is not None and tokens:
+            with self._lock:
+                self.tokens.refund(tokens)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number ``attempt`` (0-based).
+
+        Exponential from ``base_delay`` up to ``max_delay``, the last
+        ``jitter`` fraction of it random. A server's ``retry_after`` is
+        never shortened: up to ``jitter * base_delay`` is added to it instead.
+        """
+        if retry_after is not None:
+            return retry_after + self.jitter * self.base_delay * random.random()
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay * (1 - self.jitter * random.random())
+
+    def _pause(self, seconds: float):
+        # A Retry-After applies to the key, so every caller waits it out
+        with self._lock:
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+
+    def _on_error(self, error: BaseException, attempt: int,
+                  retryable: Callable[[BaseException], bool]) -> Optional[float]:
+        """Record a failed attempt; returns the backoff, or None when it is final"""
+        status = status_code(error)
+        with self._lock:
+            self.stats.throttled += status == 429
+            final = attempt >= self.max_retries or not retryable(error)
+            if final:
+                self.stats.failures += 1
+            else:
+                self.stats.retries += 1
+        if final:
+            return None
+        retry_after = error_retry_after(error)
+        delay = self.backoff(attempt, retry_after)
+        if retry_after is not None or status == 429:
+            self._pause(delay)
+        return delay
+
+    def _record(self, queue: float = 0.0, backoff: float = 0.0, server: float = 0.0, attempts: int = 0):
+        with self._lock:
+            self.stats.queue_seconds += queue
+            self.stats.backoff_seconds += backoff
+            self.stats.server_seconds += server
+            self.stats.attempts += attempts
+
+    def call(self, send: Callable[[], T], tokens: float = 0,
+             retryable: Callable[[BaseException], bool] = is_retryable) -> T:
+        """Run ``send()`` within the limits, retrying retryable failures.
+
+        ``tokens`` (see `charge`) is taken before each attempt and given
+        back when the attempt fails; report the actual usage of the call
+        with `settle` once the response is known.
+        """
+        with self._lock:
+            self.stats.requests += 1
+        for attempt in range(self.max_retries + 1):
+            wait = 0.0
+            delay = self.try_acquire(tokens)
+            while delay > 0:
+                self.sleep(delay)
+                wait += delay
+                delay = self.try_acquire(tokens)
+            self._record(queue=wait, attempts=1)
+            start = self.clock()
+            try:
+                result = send()
+            except Exception as error:
+                self._record(server=self.clock() - start)
+                self._release(tokens)
+                delay = self._on_error(error, attempt, retryable)
+                if delay is None:
+                    raise
+                self.sleep(delay)
+                self._record(backoff=delay)
+                continue
+            self._record(server=self.clock() - start)
+            return result
+        raise AssertionError("unreachable")  # the last attempt returns or raises
+
+    async def acall(self, send: Callable[[], Awaitable[T]], tokens: float = 0,
+                    retryable: Callable[[BaseException], bool] = is_retryable) -> T:
+        """Asynchronous `call`: ``send`` returns an awaitable, waits use asyncio.sleep"""
+        with self._lock:
+            self.stats.requests += 1
+        for attempt in range(self.max_retries + 1):
+            wait = 0.0
+            delay = self.try_acquire(tokens)
+            while delay > 0:
+                await asyncio.sleep(delay)
+                wait += delay
+                delay = self.try_acquire(tokens)
+            self._record(queue=wait, attempts=1)
+            start = self.clock()
+            try:
+                result = await send()
+            except Exception as error:
+                self._record(server=self.clock() - start)
+                self._release(tokens)
+                delay = self._on_error(error, attempt, retryable)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                self._record(backoff=delay)
+                continue
+            self._record(server=self.clock() - start)
+            return result
+        raise AssertionError("unreachable")
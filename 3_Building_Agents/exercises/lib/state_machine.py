@@ -1,23 +1,337 @@
-from typing import Any, Callable, Dict, List, Optional, Union, TypeVar, Generic, cast, Type, TypedDict, get_type_hints
+from typing import AbstractSet, Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, Union, TypeVar, Generic, cast, Type, TypedDict, get_type_hints
 from dataclasses import dataclass, field
 from datetime import datetime
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+import asyncio
+import logging
+import sys
+import time
 import uuid
-import copy
 import inspect
+import threading
+
+from lib.caching import Cache, CacheStats, LRUCache, stable_hash
+from lib.checkpoint import Checkpointer
+from lib.serialization import to_jsonable, from_jsonable
 
 
 StateSchema = TypeVar("StateSchema")
 
+# Merges the values produced by parallel branches for one field.
+# Receives the field value before the fan-out and the branch values (in branch order).
+Reducer = Callable[[Any, List[Any]], Any]
+
+DEFAULT_MAX_WORKERS = 4
+
+# Step ids of the EntryPoint/Termination markers; they don't count as steps taken
+MARKER_STEP_IDS = {"__entry__", "__termination__"}
+
+# Progress messages ("Starting", "Executing step", "Terminating") are logged at
+# INFO and printed to stdout by default. Silence them with
+# logging.getLogger("lib.state_machine").setLevel(logging.WARNING).
+logger = logging.getLogger(__name__)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time, like print() did"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+if not logger.handlers:
+    _handler = _StdoutHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+@lru_cache(maxsize=None)
+def schema_fields(state_schema: Type) -> FrozenSet[str]:
+    """Field names declared by a state schema (resolved once per schema)"""
+    return frozenset(get_type_hints(state_schema))
+
+
+def append(current: Optional[List[Any]], new: List[Any]) -> List[Any]:
+    """Field reducer: a step returns only the items to add to the list.
+
+    Declare it on a schema field with ``Annotated[List[...], append]``. The
+    engine then extends the running list in place and snapshots store only the
+    added items, so a growing conversation costs linear time and memory. With
+    StepHooks registered, the list is copied before it grows instead, since
+    hooks may keep the states they were shown.
+    """
+    return list(current or []) + list(new)
+
+
+@lru_cache(maxsize=None)
+def schema_reducers(state_schema: Type) -> Dict[str, Callable[[Any, Any], Any]]:
+    """Field reducers declared with ``Annotated[type, reducer]`` in a state schema.
+
+    A field reducer receives the current value and the value a step returned
+    and produces the new value; fields without one are simply replaced.
+    """
+    reducers = {}
+    for name, hint in get_type_hints(state_schema, include_extras=True).items():
+        for meta in getattr(hint, "__metadata__", ()):
+            if callable(meta):
+                reducers[name] = meta
+    return reducers
+
+
+def append_reducer(base: Any, values: List[Any]) -> List[Any]:
+    """Join list fields by appending what each branch added after the fan-out point"""
+    base = list(base or [])
+    offset = len(base)
+    for value in values:
+        base.extend(value[offset:])
+    return base
+
+
+def last_value_reducer(base: Any, values: List[Any]) -> Any:
+    """Join scalar fields by keeping the value written by the last branch"""
+    return values[-1]
+
 @dataclass
 class Resource:
     vars: Dict[str, Any]
 
+
+class StepHooks(Generic[StateSchema]):
+    """Callbacks around step execution. Override only the methods you need.
+
+    Branches of a fan-out run in parallel, so before_step/after_step/on_error
+    may be called concurrently from worker threads.
+    """
+
+    def before_step(self, step_id: str, state: StateSchema):
+        """Called right before a step's logic runs"""
+        pass
+
+    def after_step(self, step_id: str, state: StateSchema, update: Dict[str, Any], duration: float):
+        """Called with the fields a step wrote and its wall-clock duration in seconds"""
+        pass
+
+    def on_transition(self, source: str, targets: List[str], state: StateSchema):
+        """Called with the step ids a finished step's transitions resolved to"""
+        pass
+
+    def on_error(self, step_id: str, state: StateSchema, error: BaseException):
+        """Called when a step raises; the error is re-raised afterwards"""
+        pass
+
+# How often (seconds) a waiting engine re-checks its CancellationToken
+CANCELLATION_POLL_INTERVAL = 0.05
+
+
+class RunInterruptedError(Exception):
+    """A run stopped before reaching Termination; ``run`` holds what it recorded so far"""
+
+    def __init__(self, message: str, run: Optional['Run'] = None):
+        super().__init__(message)
+        self.run = run
+
+
+class StepTimeoutError(RunInterruptedError, TimeoutError):
+    """A step exceeded its own timeout"""
+    pass
+
+
+class RunTimeoutError(RunInterruptedError, TimeoutError):
+    """The run exceeded its wall-clock budget"""
+    pass
+
+
+class RunCancelledError(RunInterruptedError):
+    """The run's CancellationToken was cancelled"""
+    pass
+
+
+class CancellationToken:
+    """Cooperative cancellation for one or more runs.
+
+    The engine checks the token between steps and while waiting on a step, and
+    stops the run with RunCancelledError. Coroutine steps are cancelled;
+    synchronous step logic can't be interrupted, so it is abandoned and left
+    to finish in the background. Long-running step logic can poll
+    ``cancelled`` itself when the token is made available to it (e.g. through
+    the Resource).
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return f"CancellationToken(cancelled={self.cancelled})"
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+
+@dataclass(frozen=True)
+class HedgePolicy:
+    """When to launch a duplicate attempt of a slow step.
+
+    Once a step has ``min_samples`` recorded latencies, a second attempt starts
+    when the first one has been running longer than the ``percentile`` of the
+    last ``window`` latencies; whichever attempt finishes first wins. Before
+    that, ``delay`` (seconds) is used as the threshold, or no hedge is made
+    when it is None. Only hedge idempotent steps: both attempts may complete.
+    """
+    percentile: float = 0.95
+    min_samples: int = 20
+    window: int = 100
+    delay: Optional[float] = None
+
+    def __post_init__(self):
+        if not 0 < self.percentile <= 1:
+            raise ValueError("Hedge percentile must be in (0, 1]")
+        if self.min_samples < 1 or self.window < self.min_samples:
+            raise ValueError("Hedge window must hold at least min_samples latencies")
+
+
+def _spawn(fn: Callable[..., Any], *args: Any) -> Future:
+    """Run ``fn`` on a daemon thread so a hung call can be abandoned"""
+    future: Future = Future()
+    future.set_running_or_notify_cancel()
+
+    def target():
+        try:
+            future.set_result(fn(*args))
+        except BaseException as error:
+            future.set_exception(error)
+
+    threading.Thread(target=target, name="state-machine-attempt", daemon=True).start()
+    return future
+
+
+# Upper bound on the distinct read sets remembered per cached step
+MAX_READ_SETS = 8
+
+
+class _ReadTracker(dict):
+    """State passed to cached steps; records the fields the logic reads.
+
+    The value of each field is encoded when first read, so in-place edits made
+    by the step afterwards can't change its cache key. Iterating or copying
+    the whole state counts as reading every field.
+    """
+
+    ALL = None
+
+    def __init__(self, state: Dict[str, Any]):
+        super().__init__(state)
+        self.reads: Optional[Dict[str, Any]] = {}
+
+    def _read(self, key: Any):
+        if self.reads is not None and key not in self.reads:
+            self.reads[key] = _field_key(self, key)
+
+    def _read_all(self):
+        if self.reads is not None:
+            self.reads = _ReadTracker.ALL
+            self.encoded_state = _state_key(self)
+
+    def __getitem__(self, key):
+        self._read(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._read(key)
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        self._read(key)
+        return super().__contains__(key)
+
+    def __iter__(self):
+        self._read_all()
+        return super().__iter__()
+
+    def keys(self):
+        self._read_all()
+        return super().keys()
+
+    def values(self):
+        self._read_all()
+        return super().values()
+
+    def items(self):
+        self._read_all()
+        return super().items()
+
+    def copy(self):
+        self._read_all()
+        return dict(self)
+
+
+def _field_key(state: Dict[str, Any], field: str) -> Any:
+    """Cache-key material for one field: [present, encoded value]"""
+    if dict.__contains__(state, field):
+        return [True, stable_hash(dict.__getitem__(state, field))]
+    return [False, None]
+
+
+def _state_key(state: Dict[str, Any]) -> Any:
+    return sorted([field, _field_key(state, field)] for field in dict.keys(state))
+
+
 class Step(Generic[StateSchema]):
-    def __init__(self, step_id: str, logic: Callable[[StateSchema], Dict]):
+    def __init__(self, step_id: str, logic: Callable[[StateSchema], Dict],
+                 cache: Union[bool, Cache] = False,
+                 timeout: Optional[float] = None,
+                 hedge: Optional[HedgePolicy] = None):
+        """
+        Args:
+            step_id: Unique id of the step within its workflow
+            logic: Function receiving the state (and optionally a Resource)
+                and returning the fields it updates
+            cache: Memoize the step's result, keyed on the values of the state
+                fields its logic reads. Pass True for a private in-memory LRU
+                cache or a Cache instance (e.g. a shared SqliteCache). Only
+                use it for deterministic steps; the Resource is not part of
+                the key.
+            timeout: Seconds the step may run before the run fails with
+                StepTimeoutError
+            hedge: Optional HedgePolicy launching a duplicate attempt when the
+                step is slower than usual
+        """
+        if timeout is not None and timeout <= 0:
+            raise ValueError("Step timeout must be positive")
         self.step_id = step_id
         self.logic = logic
         # Store the number of parameters the logic function expects
         self.logic_params_count = self._calculate_params_count()
+        # Coroutine logic can only be awaited by StateMachine.arun
+        self.is_async = inspect.iscoroutinefunction(logic)
+        if cache is True:
+            cache = LRUCache()
+        self.cache: Optional[Cache] = cache if isinstance(cache, Cache) else None
+        self.cache_stats = CacheStats()
+        # Field sets read by past executions; each one is enough to key the
+        # execution path it came from, since the logic is deterministic
+        self._read_sets: List[Optional[Tuple[str, ...]]] = []
+        self._read_sets_loaded = False
+        self._cache_lock = threading.Lock()
+        self.timeout = timeout
+        self.hedge = hedge
+        self.latencies: deque = deque(maxlen=hedge.window if hedge else 1)
 
     def __str__(self) -> str:
         return f"Step('{self.step_id}')"
@@ -35,27 +349,132 @@ class Step(Generic[StateSchema]):
             return self.logic.__code__.co_argcount
 
     def run(self, state: StateSchema, state_schema: Type[StateSchema], resource: Resource=None) -> StateSchema:
+        updated = {**state}
+        reducers = schema_reducers(state_schema)
+        for field, value in self.execute(state, state_schema, resource).items():
+            updated[field] = reducers[field](state.get(field), value) if field in reducers else value
+        return cast(StateSchema, updated)
+
+    def execute(self, state: StateSchema, state_schema: Type[StateSchema], resource: Resource=None,
+                fields: Optional[AbstractSet[str]] = None) -> Dict[str, Any]:
+        """Run the logic function and return only the schema fields it wrote.
+
+        Args:
+            fields: Precomputed schema field names (see StateMachine.compile);
+                derived from ``state_schema`` when omitted
+        """
+        if self.is_async:
+            raise TypeError(
+                f"Step '{self.step_id}' has coroutine logic; run the workflow with StateMachine.arun()"
+            )
+        if self.cache is None:
+            return self._filter_fields(self._call_logic(state, resource), state_schema, fields)
+
+        hit, update = self._cache_lookup(state)
+        if hit:
+            return update
+        tracker = _ReadTracker(state)
+        update = self._filter_fields(self._call_logic(tracker, resource), state_schema, fields)
+        self._cache_store(tracker, update)
+        return update
+
+    async def aexecute(self, state: StateSchema, state_schema: Type[StateSchema], resource: Resource=None,
+                       fields: Optional[AbstractSet[str]] = None) -> Dict[str, Any]:
+        """Async counterpart of execute().
+
+        Coroutine logic is awaited on the running loop; synchronous logic is moved
+        to a worker thread so a blocking call doesn't stall other runs on the loop.
+        """
+        if not self.is_async:
+            return await asyncio.to_thread(self.execute, state, state_schema, resource, fields)
+        if self.cache is None:
+            result = await self._call_logic(state, resource)
+            return self._filter_fields(result, state_schema, fields)
+
+        hit, update = self._cache_lookup(state)
+        if hit:
+            return update
+        tracker = _ReadTracker(state)
+        update = self._filter_fields(await self._call_logic(tracker, resource), state_schema, fields)
+        self._cache_store(tracker, update)
+        return update
+
+    def _cache_key(self, reads: Optional[Tuple[str, ...]], material: Any) -> str:
+        return stable_hash([self.step_id, reads, material])
+
+    def _known_read_sets(self) -> List[Optional[Tuple[str, ...]]]:
+        with self._cache_lock:
+            if not self._read_sets_loaded:
+                # Read sets are kept in the cache too, so a persistent backend
+                # serves hits to a fresh process
+                found, stored = self.cache._get(self._cache_key("read_sets", None))
+                for reads in stored if found else []:
+                    if reads not in self._read_sets:
+                        self._read_sets.append(reads)
+                self._read_sets_loaded = True
+            return list(self._read_sets)
+
+    def _cache_lookup(self, state: StateSchema) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Try every known read set of this step against ``state``"""
+        read_sets = self._known_read_sets()
+        for reads in read_sets:
+            if reads is _ReadTracker.ALL:
+                material = _state_key(state)
+            else:
+                material = [_field_key(state, field) for field in reads]
+            hit, update = self.cache.get(self._cache_key(reads, material))
+            if hit:
+                with self._cache_lock:
+                    self.cache_stats.hits += 1
+                return True, {field: _copy_container(value) for field, value in update.items()}
+        with self._cache_lock:
+            self.cache_stats.misses += 1
+        return False, None
+
+    def _cache_store(self, tracker: _ReadTracker, update: Dict[str, Any]):
+        if tracker.reads is _ReadTracker.ALL:
+            reads, material = _ReadTracker.ALL, tracker.encoded_state
+        else:
+            reads = tuple(sorted(tracker.reads))
+            material = [tracker.reads[field] for field in reads]
+        with self._cache_lock:
+            if reads not in self._read_sets:
+                self._read_sets.append(reads)
+                del self._read_sets[:-MAX_READ_SETS]
+                self.cache._set(self._cache_key("read_sets", None), list(self._read_sets))
+        self.cache.set(self._cache_key(reads, material), update)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a duplicate attempt is launched (None: don't hedge)"""
+        if self.hedge is None:
+            return None
+        latencies = sorted(self.latencies)
+        if len(latencies) < self.hedge.min_samples:
+            return self.hedge.delay
+        return latencies[min(len(latencies) - 1, int(self.hedge.percentile * len(latencies)))]
+
+    def _call_logic(self, state: StateSchema, resource: Resource=None):
         # Call logic function with appropriate number of arguments
         if self.logic_params_count == 1:
-            result = self.logic(state)
+            return self.logic(state)
         elif self.logic_params_count == 2:
-            result = self.logic(state, resource)
+            return self.logic(state, resource)
         else:
             raise ValueError(
                 f"Step '{self.step_id}' logic function must accept either 1 argument (state) "
                 f"or 2 arguments (state, resource). Found {self.logic_params_count} arguments."
             ) 
+
+    def _filter_fields(self, result: Dict[str, Any], state_schema: Type[StateSchema],
+                       fields: Optional[AbstractSet[str]] = None) -> Dict[str, Any]:
         # Get expected fields from the TypedDict
-        expected_fields = get_type_hints(state_schema)
-        
-        # Create new state with all fields from state_schema
-        # Only copy fields that are defined in state_schema
-        updated = {**state}
-        for field, value in result.items():
-            if field in expected_fields:
-                updated[field] = value
+        expected_fields = fields if fields is not None else schema_fields(state_schema)
         
-        return cast(StateSchema, updated)
+        # Only keep fields that are defined in state_schema
+        return {
+            field: value for field, value in result.items()
+            if field in expected_fields
+        }
 
 
 class EntryPoint(Step[StateSchema]):
@@ -97,14 +516,176 @@ class Transition(Generic[StateSchema]):
         return self.targets
 
 
+def _copy_container(value: Any) -> Any:
+    """Shallow-copy lists and dicts so later in-place edits can't reach stored states"""
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class Appended:
+    """SnapshotStore change meaning "these items were appended to the list" """
+    __slots__ = ("items",)
+
+    def __init__(self, items: List[Any]):
+        self.items = list(items)
+
+    def __repr__(self) -> str:
+        return f"Appended({self.items!r})"
+
+
+def _apply_change(current: Any, change: Any) -> Any:
+    if isinstance(change, Appended):
+        return list(current or []) + change.items
+    return change
+
+
+def _compose(older: Dict[str, Any], newer: Dict[str, Any], reuse: bool = False) -> Dict[str, Any]:
+    """Single change set equivalent to applying ``older`` then ``newer``.
+
+    With ``reuse`` the lists held by ``older`` are extended in place; only pass
+    it when nothing else will read ``older`` again.
+    """
+    composed = dict(older)
+    for field, change in newer.items():
+        if isinstance(change, Appended) and field in composed:
+            previous = composed[field]
+            if isinstance(previous, Appended):
+                if reuse:
+                    previous.items.extend(change.items)
+                    change = previous
+                else:
+                    change = Appended(previous.items + change.items)
+            elif reuse and isinstance(previous, list):
+                previous.extend(change.items)
+                change = previous
+            else:
+                change = _apply_change(previous, change)
+        composed[field] = change
+    return composed
+
+
+class SnapshotStore:
+    """Copy-on-write storage for the states recorded during a run.
+
+    Each node keeps only the fields written by one step and the id of the node it
+    was derived from, so unchanged fields are shared instead of copied. The full
+    state of any node is rebuilt on demand by replaying its chain from the root.
+    Stored values are treated as immutable: containers are shallow-copied on the
+    way in and out, while the items they hold (e.g. messages) are shared. A
+    change may be an ``Appended`` marker holding only the items added to a list.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[int, Tuple[Optional[int], Dict[str, Any]]] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    @property
+    def next_id(self) -> int:
+        """Id the next added node will receive"""
+        return self._next_id
+
+    def node(self, node_id: int) -> Tuple[Optional[int], Dict[str, Any]]:
+        """The (parent id, changed fields) pair stored for ``node_id``"""
+        return self._nodes[node_id]
+
+    def nodes(self) -> Iterator[Tuple[int, Optional[int], Dict[str, Any]]]:
+        """Every stored ``(node id, parent id, changes)``, in id order"""
+        for node_id in sorted(self._nodes):
+            parent, changes = self._nodes[node_id]
+            yield node_id, parent, changes
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[Tuple[int, Optional[int], Dict[str, Any]]],
+                   next_id: int) -> 'SnapshotStore':
+        """Rebuild a store from the output of nodes()"""
+        store = cls()
+        for node_id, parent, changes in nodes:
+            store._nodes[node_id] = (parent, changes)
+        store._next_id = next_id
+        return store
+
+    def add(self, changes: Dict[str, Any], parent: Optional[int] = None) -> int:
+        """Store the fields changed on top of ``parent`` and return the new node id"""
+        node_id = self._next_id
+        self._next_id += 1
+        self._nodes[node_id] = (
+            parent,
+            {
+                field: value if isinstance(value, Appended) else _copy_container(value)
+                for field, value in changes.items()
+            },
+        )
+        return node_id
+
+    def compact(self, keep: Set[int]):
+        """Drop every node not in ``keep``, folding removed ancestors into their descendants"""
+        # How many kept nodes fold each removed node; one means it can be reused
+        folds: Dict[int, int] = {}
+        for node_id in keep:
+            parent = self._nodes[node_id][0]
+            while parent is not None and parent not in keep:
+                folds[parent] = folds.get(parent, 0) + 1
+                parent = self._nodes[parent][0]
+
+        for node_id in sorted(keep):
+            parent, changes = self._nodes[node_id]
+            while parent is not None and parent not in keep:
+                grandparent, parent_changes = self._nodes[parent]
+                changes = _compose(parent_changes, changes, reuse=folds[parent] == 1)
+                parent = grandparent
+            self._nodes[node_id] = (parent, changes)
+
+        for node_id in [n for n in self._nodes if n not in keep]:
+            del self._nodes[node_id]
+
+    def materialize(self, node_id: int) -> Dict[str, Any]:
+        """Rebuild the full state recorded at ``node_id``"""
+        chain = []
+        current = node_id
+        while current is not None:
+            parent, changes = self._nodes[current]
+            chain.append(changes)
+            current = parent
+
+        state: Dict[str, Any] = {}
+        appended: Set[str] = set()
+        for changes in reversed(chain):
+            for field, change in changes.items():
+                if isinstance(change, Appended):
+                    if field not in appended:
+                        # First append since the last replacement: copy once, then extend
+                        state[field] = list(state.get(field) or [])
+                        appended.add(field)
+                    state[field].extend(change.items)
+                else:
+                    state[field] = change
+                    appended.discard(field)
+        return {
+            field: value if field in appended else _copy_container(value)
+            for field, value in state.items()
+        }
+
+
 @dataclass
 class Snapshot(Generic[StateSchema]):
-    """Represents a single state snapshot in time"""
+    """Represents a single state snapshot in time.
+
+    The state itself lives in a SnapshotStore; ``state_data`` rebuilds it on access.
+    ``duration`` is the wall-clock time (seconds) the step's logic took, when known.
+    """
     snapshot_id: str
     timestamp: datetime
-    state_data: StateSchema
     state_schema: Type[StateSchema]
     step_id: str
+    store: SnapshotStore = field(repr=False, compare=False)
+    node_id: int = 0
+    duration: Optional[float] = None
 
     def __str__(self) -> str:
         return f"Snapshot('{self.snapshot_id}') @ [{self.timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')}]: {self.step_id}.State({self.state_data})"
@@ -112,18 +693,67 @@ class Snapshot(Generic[StateSchema]):
     def __repr__(self) -> str:
         return self.__str__()
 
+    @property
+    def state_data(self) -> StateSchema:
+        return cast(StateSchema, self.store.materialize(self.node_id))
+
     @classmethod
     def create(cls, state_data: StateSchema, state_schema: Type[StateSchema],
                step_id:str) -> 'Snapshot[StateSchema]':
+        store = SnapshotStore()
+        return cls.from_store(store, store.add(state_data), state_schema, step_id)
+
+    @classmethod
+    def from_store(cls, store: SnapshotStore, node_id: int,
+                   state_schema: Type[StateSchema], step_id: str,
+                   duration: Optional[float] = None) -> 'Snapshot[StateSchema]':
         return cls(
             snapshot_id=str(uuid.uuid4()),
             timestamp=datetime.now(),
-            state_data=state_data,
             state_schema=state_schema,
             step_id=step_id,
+            store=store,
+            node_id=node_id,
+            duration=duration,
         )
 
 
+@dataclass(frozen=True)
+class SnapshotRetention:
+    """Which snapshots a Run keeps. The latest snapshot is always kept.
+
+    Modes:
+        all: keep every snapshot (default)
+        final: keep only the latest snapshot
+        every: keep every ``size``-th snapshot (by recording order)
+        last: keep a ring of the last ``size`` snapshots
+    """
+    mode: str = "all"
+    size: int = 1
+
+    def __post_init__(self):
+        if self.mode not in ("all", "final", "every", "last"):
+            raise ValueError(f"Unknown snapshot retention mode: {self.mode}")
+        if self.size < 1:
+            raise ValueError("Snapshot retention size must be at least 1")
+
+    @classmethod
+    def keep_all(cls) -> 'SnapshotRetention':
+        return cls("all")
+
+    @classmethod
+    def final_only(cls) -> 'SnapshotRetention':
+        return cls("final")
+
+    @classmethod
+    def every(cls, k: int) -> 'SnapshotRetention':
+        return cls("every", k)
+
+    @classmethod
+    def last(cls, n: int) -> 'SnapshotRetention':
+        return cls("last", n)
+
+
 @dataclass
 class Run(Generic[StateSchema]):
     """Represents a single execution run of the state machine"""
@@ -131,6 +761,16 @@ class Run(Generic[StateSchema]):
     start_timestamp: datetime
     snapshots: List[Snapshot[StateSchema]] = field(default_factory=list)
     end_timestamp: Optional[datetime] = None
+    store: SnapshotStore = field(default_factory=SnapshotStore, repr=False, compare=False)
+    retention: SnapshotRetention = field(default_factory=SnapshotRetention)
+    dropped_snapshots: int = 0  # Snapshots discarded by the retention policy
+    dropped_steps: int = 0  # Same, excluding EntryPoint/Termination markers
+    recorded_snapshots: int = 0
+    # Timeouts, hedges and cancellations, as {"type": ..., "step_id": ..., ...}
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    # Extra metadata recorded by callers (e.g. context windowing counters)
+    annotations: Dict[str, Any] = field(default_factory=dict)
+    _pending_compaction: bool = field(default=False, repr=False, compare=False)
 
     def __str__(self) -> str:
         return f"Run('{self.run_id}')"
@@ -139,10 +779,12 @@ class Run(Generic[StateSchema]):
         return self.__str__()
 
     @classmethod
-    def create(cls) -> 'Run[StateSchema]':
+    def create(cls, retention: Optional[SnapshotRetention] = None,
+               run_id: Optional[str] = None) -> 'Run[StateSchema]':
         return cls(
-            run_id=str(uuid.uuid4()),
-            start_timestamp=datetime.now()
+            run_id=run_id or str(uuid.uuid4()),
+            start_timestamp=datetime.now(),
+            retention=retention or SnapshotRetention(),
         )
 
     @property
@@ -150,18 +792,114 @@ class Run(Generic[StateSchema]):
         return {
             "run_id": self.run_id,
             "start_timestamp": self.start_timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"),
-            "end_timestamp": self.end_timestamp.strftime("%Y-%m-%d %H:%M:%S.%f"),
-            "snapshot_counts": len(self.snapshots)
+            "end_timestamp": self.end_timestamp.strftime("%Y-%m-%d %H:%M:%S.%f") if self.end_timestamp else None,
+            "snapshot_counts": len(self.snapshots),
+            "retention": self.retention.mode,
+            "dropped_snapshots": self.dropped_snapshots,
+            "dropped_steps": self.dropped_steps,
+            "step_durations": self.step_durations(),
+            "timeouts": sum(1 for e in self.events if e["type"] in ("step_timeout", "run_timeout")),
+            "hedges": sum(1 for e in self.events if e["type"] == "hedge"),
+            "hedge_wins": sum(1 for e in self.events if e["type"] == "hedge" and e["winner"] == "hedge"),
+            "cancelled": any(e["type"] == "cancelled" for e in self.events),
+            **self.annotations,
         }
 
+    def record_event(self, event_type: str, step_id: Optional[str] = None, **details: Any):
+        """Record a timeout/hedge/cancellation event"""
+        self.events.append({
+            "type": event_type,
+            "step_id": step_id,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),
+            **details,
+        })
+
+    def step_durations(self) -> Dict[str, float]:
+        """Total wall-clock seconds spent in each step, over the kept snapshots"""
+        totals: Dict[str, float] = {}
+        for snapshot in self.snapshots:
+            if snapshot.duration is not None:
+                totals[snapshot.step_id] = totals.get(snapshot.step_id, 0.0) + snapshot.duration
+        return totals
+
     def add_snapshot(self, snapshot: Snapshot[StateSchema]):
-        """Add a new snapshot to this run"""
+        """Add a new snapshot to this run, discarding older ones per the retention policy"""
         self.snapshots.append(snapshot)
+        self.recorded_snapshots += 1
+
+        mode, size = self.retention.mode, self.retention.size
+        if mode == "final":
+            while len(self.snapshots) > 1:
+                self._drop_snapshot(0)
+        elif mode == "last":
+            while len(self.snapshots) > size:
+                self._drop_snapshot(0)
+        elif mode == "every" and len(self.snapshots) > 1:
+            # The previous snapshot was only kept for being the latest one
+            previous_index = self.recorded_snapshots - 2
+            if previous_index % size != 0:
+                self._drop_snapshot(len(self.snapshots) - 2)
+
+    def _drop_snapshot(self, index: int):
+        snapshot = self.snapshots.pop(index)
+        self.dropped_snapshots += 1
+        if snapshot.step_id not in MARKER_STEP_IDS:
+            self.dropped_steps += 1
+        self._pending_compaction = True
+
+    def compact(self, live_node_id: Optional[int] = None):
+        """Release store nodes only reachable from dropped snapshots.
+
+        Args:
+            live_node_id: Store node the engine is still building on, if any
+        """
+        if not self._pending_compaction:
+            return
+        keep = {s.node_id for s in self.snapshots if s.store is self.store}
+        if live_node_id is not None:
+            keep.add(live_node_id)
+        self.store.compact(keep)
+        self._pending_compaction = False
 
     def complete(self):
         """Mark this run as complete"""
         self.end_timestamp = datetime.now()
 
+    def final_only(self) -> 'Run[StateSchema]':
+        """Lightweight copy of this run keeping only its final snapshot.
+
+        The final state is materialized into a fresh store, so the copy holds
+        no intermediate deltas; ids, timestamps, counters, events and
+        annotations are kept.
+        """
+        run = Run(
+            run_id=self.run_id,
+            start_timestamp=self.start_timestamp,
+            end_timestamp=self.end_timestamp,
+            retention=SnapshotRetention.final_only(),
+            dropped_snapshots=self.dropped_snapshots,
+            dropped_steps=self.dropped_steps,
+            recorded_snapshots=self.recorded_snapshots,
+            events=list(self.events),
+            annotations=dict(self.annotations),
+        )
+        for snapshot in self.snapshots[:-1]:
+            run.dropped_snapshots += 1
+            if snapshot.step_id not in MARKER_STEP_IDS:
+                run.dropped_steps += 1
+        if self.snapshots:
+            final = self.snapshots[-1]
+            run.snapshots.append(Snapshot(
+                snapshot_id=final.snapshot_id,
+                timestamp=final.timestamp,
+                state_schema=final.state_schema,
+                step_id=final.step_id,
+                store=run.store,
+                node_id=run.store.add(final.state_data),
+                duration=final.duration,
+            ))
+        return run
+
     def get_final_state(self) -> Optional[StateSchema]:
         """Get the final state of this run"""
         if not self.snapshots:
@@ -169,11 +907,177 @@ class Run(Generic[StateSchema]):
         return self.snapshots[-1].state_data
 
 
+@dataclass
+class _RunControl:
+    """Deadline and cancellation state of one run, shared by its steps"""
+    run: Run
+    deadline: Optional[float] = None  # time.perf_counter() value
+    budget: Optional[float] = None
+    cancellation: Optional[CancellationToken] = None
+
+    @classmethod
+    def create(cls, run: Run, timeout: Optional[float],
+               cancellation: Optional[CancellationToken]) -> '_RunControl':
+        if timeout is not None and timeout <= 0:
+            raise ValueError("Run timeout must be positive")
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        return cls(run, deadline, timeout, cancellation)
+
+    def limits(self, step: Step) -> bool:
+        """Whether executing ``step`` needs deadline/cancellation/hedge supervision"""
+        return (self.deadline is not None or self.cancellation is not None
+                or step.timeout is not None or step.hedge is not None)
+
+    def check(self, step_id: Optional[str] = None):
+        """Raise if the run was cancelled or ran out of budget"""
+        if self.cancellation is not None and self.cancellation.cancelled:
+            self.run.record_event("cancelled", step_id, reason=self.cancellation.reason)
+            raise RunCancelledError(f"[StateMachine] Run cancelled: {self.cancellation.reason}", self.run)
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.run.record_event("run_timeout", step_id, budget=self.budget)
+            raise RunTimeoutError(
+                f"[StateMachine] Run exceeded its budget of {self.budget}s", self.run
+            )
+
+    def wait_timeout(self, now: float, *deadlines: Optional[float]) -> Optional[float]:
+        """How long to block before something needs checking again"""
+        limits = [d - now for d in (self.deadline, *deadlines) if d is not None]
+        if self.cancellation is not None:
+            limits.append(CANCELLATION_POLL_INTERVAL)
+        return max(0.0, min(limits)) if limits else None
+
+
+def _forward_reach(edges: List[List[int]], entry: int) -> List[FrozenSet[int]]:
+    """Steps reachable from each step without closing a loop.
+
+    Back edges (found by a depth-first walk from ``entry``, then from any
+    step it does not reach) are dropped first. Inside a loop every step
+    reaches every other one, which says nothing about which branch a join
+    is still waiting for; the loop's forward edges do.
+    """
+    forward: List[List[int]] = [[] for _ in edges]
+    status = [0] * len(edges)  # 0: unvisited, 1: on the walk's path, 2: done
+    for root in [entry] + list(range(len(edges))):
+        if status[root]:
+            continue
+        status[root] = 1
+        path = [(root, iter(edges[root]))]
+        while path:
+            node, targets = path[-1]
+            for target in targets:
+                if status[target] == 1:
+                    continue  # back edge
+                forward[node].append(target)
+                if status[target] == 0:
+                    status[target] = 1
+                    path.append((target, iter(edges[target])))
+                    break
+            else:
+                status[node] = 2
+                path.pop()
+
+    reaches = []
+    for i in range(len(edges)):
+        seen: Set[int] = set()
+        pending = list(forward[i])
+        while pending:
+            j = pending.pop()
+            if j not in seen:
+                seen.add(j)
+                pending.extend(forward[j])
+        reaches.append(frozenset(seen))
+    return reaches
+
+
+@dataclass
+class CompiledGraph(Generic[StateSchema]):
+    """Dispatch tables derived from a StateMachine by StateMachine.compile().
+
+    Steps are addressed by their position in ``steps``. Transitions without a
+    condition are pre-resolved to target indexes; conditional ones are kept and
+    resolved at run time through ``index``. ``reducers`` holds the field
+    reducers declared on the schema (see `append`). ``reaches`` holds, per
+    step, the steps reachable from it through declared transitions that do
+    not close a loop; it is what makes fan-in steps wait for their slower
+    branches, inside loops too.
+    """
+    fields: FrozenSet[str]
+    reducers: Dict[str, Callable[[Any, Any], Any]]
+    steps: List[Step[StateSchema]]
+    index: Dict[str, int]
+    entry: int
+    is_entry: List[bool]
+    is_termination: List[bool]
+    static_targets: List[Optional[List[int]]]
+    conditional: List[List[Transition[StateSchema]]]
+    reaches: List[FrozenSet[int]]
+
+    def split_ready(self, frontier: List[int]) -> Tuple[List[int], List[int]]:
+        """Split the frontier into steps to run now and joins still waiting.
+
+        A step waits while another pending step can still reach it (loops
+        aside, see `_forward_reach`): a branch that has not arrived yet.
+        Without back edges some pending step is always ready; running all
+        of them is only a safeguard.
+        """
+        if len(frontier) == 1:
+            return frontier, []
+        ready, waiting = [], []
+        for i in frontier:
+            if any(j != i and i in self.reaches[j] for j in frontier):
+                waiting.append(i)
+            else:
+                ready.append(i)
+        return (ready, waiting) if ready else (frontier, [])
+
+    def next_steps(self, step: int, state: StateSchema) -> List[int]:
+        """Target indexes of the transitions leaving ``step``"""
+        targets = self.static_targets[step]
+        if targets is not None:
+            return targets
+        resolved: List[int] = []
+        for transition in self.conditional[step]:
+            for target_id in transition.resolve(state):
+                try:
+                    resolved.append(self.index[target_id])
+                except KeyError:
+                    raise Exception(
+                        f"[StateMachine] Transition from '{self.steps[step].step_id}' "
+                        f"resolved to unknown step: {target_id}"
+                    ) from None
+        return resolved
+
+
 class StateMachine(Generic[StateSchema]):
-    def __init__(self, state_schema: Type[StateSchema]):
+    def __init__(self, state_schema: Type[StateSchema],
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 reducers: Optional[Dict[str, Reducer]] = None,
+                 retention: Optional[SnapshotRetention] = None,
+                 checkpointer: Optional[Checkpointer] = None,
+                 hooks: Optional[List[StepHooks[StateSchema]]] = None):
+        """
+        Args:
+            state_schema: TypedDict describing the workflow state
+            max_workers: Upper bound on branches executed concurrently after a fan-out
+            reducers: Optional per-field reducers used to join parallel branches.
+                Fields without a reducer are appended when they hold lists and
+                resolved last-writer-wins otherwise.
+            retention: Which snapshots each Run keeps (default: all of them)
+            checkpointer: Optional durable store; every executed step is persisted
+                so an interrupted run can be continued with resume()
+            hooks: StepHooks notified around every step, in registration order
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
         self.state_schema = state_schema
+        self.max_workers = max_workers
+        self.reducers: Dict[str, Reducer] = dict(reducers or {})
+        self.retention = retention or SnapshotRetention()
+        self.checkpointer = checkpointer
+        self.hooks: List[StepHooks[StateSchema]] = list(hooks or [])
         self.steps: Dict[str, Step[StateSchema]] = {}
         self.transitions: Dict[str, List[Transition[StateSchema]]] = {}
+        self._compiled: Optional[CompiledGraph[StateSchema]] = None
 
     def __str__(self) -> str:
         schema_keys = list(get_type_hints(self.state_schema).keys())
@@ -182,10 +1086,19 @@ class StateMachine(Generic[StateSchema]):
     def __repr__(self) -> str:
         return self.__str__()
 
+    def add_hooks(self, hooks: List[StepHooks[StateSchema]]):
+        """Register step hooks"""
+        self.hooks.extend(hooks)
+
+    def cache_stats(self) -> Dict[str, CacheStats]:
+        """Hit/miss counters of every step created with a cache"""
+        return {step_id: step.cache_stats for step_id, step in self.steps.items() if step.cache is not None}
+
     def add_steps(self, steps: List[Step[StateSchema]]):
         """Add steps to the workflow"""
         for step in steps:
             self.steps[step.step_id] = step
+        self._compiled = None
 
     def connect(
         self,
@@ -200,58 +1113,674 @@ class StateMachine(Generic[StateSchema]):
         if src_id not in self.transitions:
             self.transitions[src_id] = []
         self.transitions[src_id].append(transition)
+        self._compiled = None
 
-    def run(self, state: StateSchema, resource: Resource = None):
-        # Validate that state has at least one field from the schema
-        expected_fields = get_type_hints(self.state_schema)
-        state_fields = set(state.keys())
-        common_fields = state_fields.intersection(expected_fields)
-        
-        if not common_fields:
-            raise ValueError(f"Initial state must have at least one field from the schema. Expected fields: {list(expected_fields.keys())}")
+    def compile(self) -> 'StateMachine[StateSchema]':
+        """Validate the graph once and build the dispatch tables used by run()/arun().
+
+        Called automatically by run()/arun() after the graph changes; call it
+        up-front to surface graph errors early. Returns the machine for chaining.
+        """
+        fields = schema_fields(self.state_schema)
+        steps = list(self.steps.values())
+        index = {step.step_id: i for i, step in enumerate(steps)}
 
-        entry_points = [s for s in self.steps.values() if isinstance(s, EntryPoint)]
+        entry_points = [i for i, step in enumerate(steps) if isinstance(step, EntryPoint)]
         if not entry_points:
             raise Exception("No EntryPoint step found in workflow")
         if len(entry_points) > 1:
             raise Exception("Multiple EntryPoint steps found in workflow")
-        
-        # Create a new run for this execution
-        current_run = Run.create()
-        
-        current_step_id = entry_points[0].step_id        
-
-        while current_step_id:
-            step = self.steps[current_step_id]
-            if isinstance(step, Termination):
-                print(f"[StateMachine] Terminating: {current_step_id}")
-                break
-            
-            # Replace state entirely
-            state = step.run(state, self.state_schema, resource)  
-
-            if isinstance(step, EntryPoint):
-                print(f"[StateMachine] Starting: {current_step_id}")
+
+        for step in steps:
+            if step.logic_params_count not in (1, 2):
+                raise ValueError(
+                    f"Step '{step.step_id}' logic function must accept either 1 argument (state) "
+                    f"or 2 arguments (state, resource). Found {step.logic_params_count} arguments."
+                )
+
+        static_targets: List[Optional[List[int]]] = []
+        conditional: List[List[Transition[StateSchema]]] = []
+        for step in steps:
+            transitions = self.transitions.get(step.step_id, [])
+            for transition in transitions:
+                unknown = [t for t in transition.targets if t not in index]
+                if unknown:
+                    raise Exception(f"[StateMachine] Transition {transition} targets unknown steps: {unknown}")
+            if transitions and all(t.condition is None for t in transitions):
+                static_targets.append([index[t] for transition in transitions for t in transition.targets])
+            else:
+                static_targets.append(None)
+            conditional.append(transitions)
+
+        unknown_sources = [source for source in self.transitions if source not in index]
+        if unknown_sources:
+            raise Exception(f"[StateMachine] Transitions declared from unknown steps: {unknown_sources}")
+
+        edges = [list(dict.fromkeys(index[t] for transition in transitions for t in transition.targets))
+                 for transitions in conditional]
+        reaches = _forward_reach(edges, entry_points[0])
+
+        self._compiled = CompiledGraph(
+            fields=fields,
+            reducers=schema_reducers(self.state_schema),
+            steps=steps,
+            index=index,
+            entry=entry_points[0],
+            is_entry=[isinstance(step, EntryPoint) for step in steps],
+            is_termination=[isinstance(step, Termination) for step in steps],
+            static_targets=static_targets,
+            conditional=conditional,
+            reaches=reaches,
+        )
+        return self
+
+    @property
+    def graph(self) -> CompiledGraph[StateSchema]:
+        """The compiled dispatch tables, compiling on first use"""
+        if self._compiled is None:
+            self.compile()
+        return self._compiled
+
+    def _reducer_for(self, field: str, values: List[Any]) -> Reducer:
+        if field in self.reducers:
+            return self.reducers[field]
+        if all(isinstance(value, list) for value in values):
+            return append_reducer
+        return last_value_reducer
+
+    def _reduce_field(self, graph: CompiledGraph[StateSchema], state: Dict[str, Any],
+                      field: str, value: Any):
+        """Write one step's value for ``field`` into ``state`` through the schema reducer"""
+        reducer = graph.reducers.get(field)
+        if reducer is None:
+            state[field] = value
+        elif reducer is append:
+            current = state.get(field)
+            if current is None:
+                state[field] = list(value)
+            elif self.hooks:
+                # Hooks may keep the states they are shown: leave their lists as they were
+                state[field] = current + list(value)
+            else:
+                # The engine owns the running list (copied at the start of the run
+                # and for every branch), so extending it in place is safe
+                current.extend(value)
+        else:
+            state[field] = reducer(state.get(field), value)
+
+    def _changes(self, graph: CompiledGraph[StateSchema], state: StateSchema,
+                 update: Dict[str, Any]) -> Dict[str, Any]:
+        """SnapshotStore changes for ``update`` applied on top of ``state``"""
+        if not graph.reducers:
+            return update
+        changes = {}
+        for field, value in update.items():
+            reducer = graph.reducers.get(field)
+            if reducer is None:
+                changes[field] = value
+            elif reducer is append:
+                changes[field] = Appended(value)
+            else:
+                changes[field] = reducer(state.get(field), value)
+        return changes
+
+    def _merge(self, graph: CompiledGraph[StateSchema], state: StateSchema,
+               updates: List[Dict[str, Any]]) -> StateSchema:
+        """Fan-in: join the updates of parallel branches into a single state"""
+        merged = {**state}
+        written: Dict[str, List[Any]] = {}
+        for update in updates:
+            for field, value in update.items():
+                written.setdefault(field, []).append(value)
+        for field, values in written.items():
+            if field in graph.reducers and field not in self.reducers:
+                # Schema reducers see each branch's value in branch order
+                for value in values:
+                    self._reduce_field(graph, merged, field, value)
+            elif len(values) == 1:
+                merged[field] = values[0]
             else:
-                print(f"[StateMachine] Executing step: {current_step_id}")
+                merged[field] = self._reducer_for(field, values)(state.get(field), values)
+        return cast(StateSchema, merged)
+
+    def _fork(self, state: StateSchema) -> StateSchema:
+        """Give a branch its own state so in-place list edits don't leak into siblings"""
+        return cast(StateSchema, {
+            field: list(value) if isinstance(value, list) else value
+            for field, value in state.items()
+        })
+
+    def _execute_step(self, graph: CompiledGraph[StateSchema], i: int, state: StateSchema,
+                      resource: Resource = None,
+                      control: Optional[_RunControl] = None) -> Tuple[Dict[str, Any], float]:
+        """Run one step, timing it and notifying the hooks; return (update, duration)"""
+        step = graph.steps[i]
+        for hook in self.hooks:
+            hook.before_step(step.step_id, state)
+        started = time.perf_counter()
+        try:
+            if control is not None and control.limits(step):
+                update = self._execute_supervised(graph, step, state, resource, control)
+            else:
+                update = step.execute(state, self.state_schema, resource, graph.fields)
+        except Exception as error:
+            for hook in self.hooks:
+                hook.on_error(step.step_id, state, error)
+            raise
+        duration = time.perf_counter() - started
+        for hook in self.hooks:
+            hook.after_step(step.step_id, state, update, duration)
+        return update, duration
+
+    async def _aexecute_step(self, graph: CompiledGraph[StateSchema], i: int, state: StateSchema,
+                             resource: Resource = None,
+                             control: Optional[_RunControl] = None) -> Tuple[Dict[str, Any], float]:
+        """Async counterpart of _execute_step"""
+        step = graph.steps[i]
+        for hook in self.hooks:
+            hook.before_step(step.step_id, state)
+        started = time.perf_counter()
+        try:
+            if control is not None and control.limits(step):
+                update = await self._aexecute_supervised(graph, step, state, resource, control)
+            else:
+                update = await step.aexecute(state, self.state_schema, resource, graph.fields)
+        except Exception as error:
+            for hook in self.hooks:
+                hook.on_error(step.step_id, state, error)
+            raise
+        duration = time.perf_counter() - started
+        for hook in self.hooks:
+            hook.after_step(step.step_id, state, update, duration)
+        return update, duration
+
+    def _execute_supervised(self, graph: CompiledGraph[StateSchema], step: Step[StateSchema],
+                            state: StateSchema, resource: Resource,
+                            control: _RunControl) -> Dict[str, Any]:
+        """Run a step in abandonable attempts, enforcing deadlines, cancellation and hedging"""
+        started = time.perf_counter()
+        step_deadline = started + step.timeout if step.timeout is not None else None
+        hedge_delay = step.hedge_delay()
+        hedge_at = started + hedge_delay if hedge_delay is not None else None
+
+        attempts = {
+            _spawn(step.execute, state, self.state_schema, resource, graph.fields): ("primary", started)
+        }
+        errors: List[BaseException] = []
+        hedged = False
+        while True:
+            now = time.perf_counter()
+            timeout = control.wait_timeout(now, step_deadline, None if hedged else hedge_at)
+            done, _ = wait(list(attempts), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                role, attempt_started = attempts.pop(future)
+                if future.exception() is not None:
+                    errors.append(future.exception())
+                    continue
+                self._record_latency(control.run, step, role, hedged, hedge_delay,
+                                     time.perf_counter() - attempt_started)
+                return future.result()
+            if not attempts:
+                raise errors[0]
+
+            now = time.perf_counter()
+            control.check(step.step_id)
+            if step_deadline is not None and now >= step_deadline:
+                control.run.record_event("step_timeout", step.step_id, timeout=step.timeout)
+                raise StepTimeoutError(
+                    f"[StateMachine] Step '{step.step_id}' exceeded its timeout of {step.timeout}s",
+                    control.run,
+                )
+            if not hedged and hedge_at is not None and now >= hedge_at:
+                hedged = True
+                hedge = _spawn(step.execute, self._fork(state), self.state_schema, resource, graph.fields)
+                attempts[hedge] = ("hedge", now)
+
+    async def _aexecute_supervised(self, graph: CompiledGraph[StateSchema], step: Step[StateSchema],
+                                   state: StateSchema, resource: Resource,
+                                   control: _RunControl) -> Dict[str, Any]:
+        """Async counterpart of _execute_supervised; losing attempts are cancelled"""
+        started = time.perf_counter()
+        step_deadline = started + step.timeout if step.timeout is not None else None
+        hedge_delay = step.hedge_delay()
+        hedge_at = started + hedge_delay if hedge_delay is not None else None
+
+        attempts = {
+            asyncio.ensure_future(step.aexecute(state, self.state_schema, resource, graph.fields)):
+                ("primary", started)
+        }
+        errors: List[BaseException] = []
+        hedged = False
+        try:
+            while True:
+                now = time.perf_counter()
+                timeout = control.wait_timeout(now, step_deadline, None if hedged else hedge_at)
+                done, _ = await asyncio.wait(list(attempts), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    role, attempt_started = attempts.pop(task)
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                        continue
+                    self._record_latency(control.run, step, role, hedged, hedge_delay,
+                                         time.perf_counter() - attempt_started)
+                    return task.result()
+                if not attempts:
+                    raise errors[0]
+
+                now = time.perf_counter()
+                control.check(step.step_id)
+                if step_deadline is not None and now >= step_deadline:
+                    control.run.record_event("step_timeout", step.step_id, timeout=step.timeout)
+                    raise StepTimeoutError(
+                        f"[StateMachine] Step '{step.step_id}' exceeded its timeout of {step.timeout}s",
+                        control.run,
+                    )
+                if not hedged and hedge_at is not None and now >= hedge_at:
+                    hedged = True
+                    hedge = asyncio.ensure_future(
+                        step.aexecute(self._fork(state), self.state_schema, resource, graph.fields)
+                    )
+                    attempts[hedge] = ("hedge", now)
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def _record_latency(self, current_run: Run, step: Step[StateSchema], winner: str,
+                        hedged: bool, hedge_delay: Optional[float], latency: float):
+        if step.hedge is None:
+            return
+        step.latencies.append(latency)
+        if hedged:
+            current_run.record_event("hedge", step.step_id, winner=winner,
+                                     delay=hedge_delay, latency=latency)
+
+    def _execute_branches(self, graph: CompiledGraph[StateSchema], frontier: List[int],
+                          state: StateSchema, resource: Resource = None,
+                          control: Optional[_RunControl] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Run every step of the frontier against the same input state"""
+        if len(frontier) == 1:
+            return [self._execute_step(graph, frontier[0], state, resource, control)]
+
+        workers = min(self.max_workers, len(frontier))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="state-machine") as pool:
+            futures = [
+                pool.submit(self._execute_step, graph, i, self._fork(state), resource, control)
+                for i in frontier
+            ]
+            return [future.result() for future in futures]
+
+    async def _aexecute_branches(self, graph: CompiledGraph[StateSchema], frontier: List[int],
+                                 state: StateSchema, resource: Resource = None,
+                                 control: Optional[_RunControl] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Async counterpart of _execute_branches, bounded by a semaphore instead of a pool"""
+        if len(frontier) == 1:
+            return [await self._aexecute_step(graph, frontier[0], state, resource, control)]
+
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def execute_branch(i: int) -> Tuple[Dict[str, Any], float]:
+            async with semaphore:
+                return await self._aexecute_step(graph, i, self._fork(state), resource, control)
+
+        return list(await asyncio.gather(*(execute_branch(i) for i in frontier)))
+
+    def _next_steps(self, graph: CompiledGraph[StateSchema], frontier: List[int],
+                    state: StateSchema, waiting: List[int]) -> List[int]:
+        """Resolve the transitions of every executed step, deduplicating shared targets.
+
+        Joins still ``waiting`` for a branch stay in the frontier, so a step
+        reached by several branches appears (and runs) once.
+        """
+        if len(frontier) == 1 and not waiting:
+            resolved = self._resolve_transitions(graph, frontier[0], state)
+            return resolved if len(resolved) == 1 else list(dict.fromkeys(resolved))
+
+        next_steps: Dict[int, None] = dict.fromkeys(waiting)
+        for i in frontier:
+            next_steps.update(dict.fromkeys(self._resolve_transitions(graph, i, state)))
+        return list(next_steps)
+
+    def _resolve_transitions(self, graph: CompiledGraph[StateSchema], i: int,
+                             state: StateSchema) -> List[int]:
+        resolved = graph.next_steps(i, state)
+        if not resolved:
+            raise Exception(f"[StateMachine] No transitions found from step: {graph.steps[i].step_id}")
+        if self.hooks:
+            targets = [graph.steps[t].step_id for t in resolved]
+            for hook in self.hooks:
+                hook.on_transition(graph.steps[i].step_id, targets, state)
+        return resolved
+
+    def _start(self, state: StateSchema) -> Tuple[CompiledGraph[StateSchema], List[int]]:
+        """Validate the initial state; return the graph and the frontier holding the EntryPoint"""
+        graph = self.graph
 
-            # Create and add snapshot to the current run
-            snapshot = Snapshot.create(copy.deepcopy(state), self.state_schema, current_step_id)
+        # Validate that state has at least one field from the schema
+        if graph.fields.isdisjoint(state.keys()):
+            raise ValueError(f"Initial state must have at least one field from the schema. Expected fields: {list(get_type_hints(self.state_schema).keys())}")
+
+        return graph, [graph.entry]
+
+    def _runnable(self, graph: CompiledGraph[StateSchema], frontier: List[int],
+                  current_run: Run, node_id: int, fanned_in: bool) -> List[int]:
+        """Drop Termination steps from the frontier; an empty result ends the run"""
+        terminations = [i for i in frontier if graph.is_termination[i]]
+        if not terminations:
+            return frontier
+        if logger.isEnabledFor(logging.INFO):
+            for i in terminations:
+                logger.info("[StateMachine] Terminating: %s", graph.steps[i].step_id)
+        runnable = [i for i in frontier if not graph.is_termination[i]]
+        if not runnable and fanned_in:
+            # Branches went straight to termination: keep the joined state as final
+            current_run.add_snapshot(
+                Snapshot.from_store(current_run.store, node_id, self.state_schema,
+                                    graph.steps[terminations[0]].step_id)
+            )
+        return runnable
+
+    def _advance(self, graph: CompiledGraph[StateSchema], frontier: List[int], state: StateSchema,
+                 node_id: int, results: List[Tuple[Dict[str, Any], float]],
+                 current_run: Run) -> Tuple[StateSchema, int, List[Snapshot[StateSchema]]]:
+        """Snapshot every branch and return the joined state, its store node and the new snapshots"""
+        snapshots = []
+        updates = []
+        log_progress = logger.isEnabledFor(logging.INFO)
+        for i, (update, duration) in zip(frontier, results):
+            step_id = graph.steps[i].step_id
+            if log_progress:
+                if graph.is_entry[i]:
+                    logger.info("[StateMachine] Starting: %s", step_id)
+                else:
+                    logger.info("[StateMachine] Executing step: %s", step_id)
+
+            # Create and add snapshot to the current run (one per branch),
+            # storing only the fields the step wrote
+            branch_node = current_run.store.add(self._changes(graph, state, update), parent=node_id)
+            snapshot = Snapshot.from_store(current_run.store, branch_node, self.state_schema,
+                                           step_id, duration)
+            updates.append(update)
             current_run.add_snapshot(snapshot)
+            snapshots.append(snapshot)
 
-            transitions = self.transitions.get(current_step_id, [])
-            next_steps: List[str] = []
+        # Replace state entirely
+        if len(snapshots) == 1:
+            merged = {**state}
+            for field, value in updates[0].items():
+                self._reduce_field(graph, merged, field, value)
+            return cast(StateSchema, merged), snapshots[0].node_id, snapshots
+        written = {field for update in updates for field in update}
+        merged_changes = {}
+        for field in written:
+            if graph.reducers.get(field) is append and field not in self.reducers:
+                merged_changes[field] = Appended(
+                    [item for update in updates for item in update.get(field, [])]
+                )
+        merged = self._merge(graph, state, updates)
+        for field in written:
+            merged_changes.setdefault(field, merged[field])
+        merged_node = current_run.store.add(merged_changes, parent=node_id)
+        return merged, merged_node, snapshots
 
-            for t in transitions:
-                next_steps += t.resolve(state)
+    def _checkpoint(self, current_run: Run, seq: int, record: Dict[str, Any],
+                    first_node: int, snapshots: List[Snapshot[StateSchema]]) -> int:
+        """Persist the store nodes and snapshots created since ``first_node``; return the next seq"""
+        if self.checkpointer is None:
+            return seq
+        store = current_run.store
+        nodes = []
+        for n in range(first_node, store.next_id):
+            parent, changes = store.node(n)
+            values = {f: v for f, v in changes.items() if not isinstance(v, Appended)}
+            appended = {f: v.items for f, v in changes.items() if isinstance(v, Appended)}
+            nodes.append([parent, to_jsonable(values), to_jsonable(appended)])
+        record["nodes"] = nodes
+        record["snapshots"] = [
+            [s.snapshot_id, s.timestamp.isoformat(), s.step_id, s.node_id, s.duration]
+            for s in snapshots
+        ]
+        self.checkpointer.save(current_run.run_id, seq, record)
+        return seq + 1
 
-            if not next_steps:
-                raise Exception(f"[StateMachine] No transitions found from step: {current_step_id}")
+    def _begin(self, state: StateSchema, run_id: Optional[str]):
+        """Create the Run for a fresh execution and checkpoint its initial state"""
+        graph, frontier = self._start(state)
+        # The engine extends append-reduced lists in place; never the caller's
+        state = cast(StateSchema, {
+            field: list(value) if field in graph.reducers and isinstance(value, list) else value
+            for field, value in state.items()
+        })
 
-            if len(next_steps) > 1:
-                raise NotImplementedError("Parallel execution not implemented yet.")
+        # Create a new run for this execution
+        current_run = Run.create(self.retention, run_id)
+        node_id = current_run.store.add(state)
+        seq = self._checkpoint(current_run, 0, {
+            "type": "start",
+            "start_timestamp": current_run.start_timestamp.isoformat(),
+            "retention": [current_run.retention.mode, current_run.retention.size],
+            "node_id": node_id,
+            "frontier": [graph.steps[i].step_id for i in frontier],
+        }, node_id, [])
+        return graph, frontier, current_run, node_id, seq, state
+
+    def _restore(self, run_id: str):
+        """Rebuild a checkpointed run up to its last persisted step"""
+        if self.checkpointer is None:
+            raise ValueError("StateMachine has no checkpointer to resume from")
+        records = self.checkpointer.load(run_id)
+        if not records or records[0]["type"] != "start":
+            raise KeyError(f"No checkpoint found for run '{run_id}'")
+
+        graph = self.graph
+        start = records[0]
+        current_run = Run(
+            run_id=run_id,
+            start_timestamp=datetime.fromisoformat(start["start_timestamp"]),
+            retention=SnapshotRetention(*start["retention"]),
+        )
+        node_id, fanned_in, frontier_ids = start["node_id"], False, start["frontier"]
+        for record in records:
+            for parent, values, *appended in record.get("nodes", []):
+                changes = from_jsonable(values)
+                for field, items in (from_jsonable(appended[0]) if appended else {}).items():
+                    changes[field] = Appended(items)
+                current_run.store.add(changes, parent=parent)
+            for snapshot_id, timestamp, step_id, snapshot_node, *duration in record.get("snapshots", []):
+                current_run.add_snapshot(Snapshot(
+                    snapshot_id=snapshot_id,
+                    timestamp=datetime.fromisoformat(timestamp),
+                    state_schema=self.state_schema,
+                    step_id=step_id,
+                    store=current_run.store,
+                    node_id=snapshot_node,
+                    duration=duration[0] if duration else None,
+                ))
+            if record["type"] == "step":
+                node_id, fanned_in, frontier_ids = record["node_id"], record["fanned_in"], record["frontier"]
+            elif record["type"] == "complete":
+                current_run.compact()
+                current_run.end_timestamp = datetime.fromisoformat(record["end_timestamp"])
+                return graph, [], current_run, node_id, {}, fanned_in, len(records)
 
-            current_step_id = next_steps[0]
+        current_run.compact(node_id)
+        state = current_run.store.materialize(node_id)
+        frontier = [graph.index[step_id] for step_id in frontier_ids]
+        return graph, frontier, current_run, node_id, state, fanned_in, len(records)
 
+    def _finish(self, current_run: Run, seq: int, first_node: int, recorded: int) -> Run:
+        new_snapshots = current_run.snapshots[-1:] if current_run.recorded_snapshots > recorded else []
+        current_run.compact()
         current_run.complete()
+        self._checkpoint(current_run, seq, {
+            "type": "complete",
+            "end_timestamp": current_run.end_timestamp.isoformat(),
+        }, first_node, new_snapshots)
         return current_run
+
+    def _step_checkpoint(self, graph: CompiledGraph[StateSchema], current_run: Run, seq: int,
+                         first_node: int, snapshots: List[Snapshot[StateSchema]],
+                         node_id: int, frontier: List[int], fanned_in: bool) -> int:
+        return self._checkpoint(current_run, seq, {
+            "type": "step",
+            "node_id": node_id,
+            "fanned_in": fanned_in,
+            "frontier": [graph.steps[i].step_id for i in frontier],
+        }, first_node, snapshots)
+
+    def _loop(self, graph: CompiledGraph[StateSchema], frontier: List[int], state: StateSchema,
+              node_id: int, fanned_in: bool, current_run: Run, seq: int,
+              resource: Resource = None, timeout: Optional[float] = None,
+              cancellation: Optional[CancellationToken] = None) -> Run:
+        control = _RunControl.create(current_run, timeout, cancellation)
+        while True:
+            first_node, recorded = current_run.store.next_id, current_run.recorded_snapshots
+            frontier = self._runnable(graph, frontier, current_run, node_id, fanned_in)
+            if not frontier:
+                return self._finish(current_run, seq, first_node, recorded)
+
+            frontier, waiting = graph.split_ready(frontier)
+            control.check()
+            results = self._execute_branches(graph, frontier, state, resource, control)
+            state, node_id, snapshots = self._advance(graph, frontier, state, node_id, results, current_run)
+            fanned_in = len(results) > 1
+            frontier = self._next_steps(graph, frontier, state, waiting)
+
+            seq = self._step_checkpoint(graph, current_run, seq, first_node, snapshots,
+                                        node_id, frontier, fanned_in)
+            current_run.compact(node_id)
+
+    async def _aloop(self, graph: CompiledGraph[StateSchema], frontier: List[int], state: StateSchema,
+                     node_id: int, fanned_in: bool, current_run: Run, seq: int,
+                     resource: Resource = None, timeout: Optional[float] = None,
+                     cancellation: Optional[CancellationToken] = None) -> Run:
+        control = _RunControl.create(current_run, timeout, cancellation)
+        while True:
+            first_node, recorded = current_run.store.next_id, current_run.recorded_snapshots
+            frontier = self._runnable(graph, frontier, current_run, node_id, fanned_in)
+            if not frontier:
+                return self._finish(current_run, seq, first_node, recorded)
+
+            frontier, waiting = graph.split_ready(frontier)
+            control.check()
+            results = await self._aexecute_branches(graph, frontier, state, resource, control)
+            state, node_id, snapshots = self._advance(graph, frontier, state, node_id, results, current_run)
+            fanned_in = len(results) > 1
+            frontier = self._next_steps(graph, frontier, state, waiting)
+
+            seq = self._step_checkpoint(graph, current_run, seq, first_node, snapshots,
+                                        node_id, frontier, fanned_in)
+            current_run.compact(node_id)
+
+    def run(self, state: StateSchema, resource: Resource = None, run_id: Optional[str] = None,
+            timeout: Optional[float] = None, cancellation: Optional[CancellationToken] = None):
+        """Execute the workflow from its EntryPoint until a Termination step is reached.
+
+        When a transition resolves to several targets, the targets run concurrently
+        (bounded by ``max_workers``) on the same input state. Their updates are joined
+        with the field reducers and the merged state is what flows into the next
+        step(s); a step targeted by several branches runs once on the merged state.
+
+        Args:
+            state: Initial state
+            resource: Optional shared resources handed to 2-argument steps
+            run_id: Optional id for the Run; pass your own to be able to resume()
+                it after a crash when a checkpointer is configured
+            timeout: Optional wall-clock budget (seconds) for the whole run
+            cancellation: Optional token to stop the run from another thread
+
+        Raises:
+            StepTimeoutError: A step ran longer than its ``timeout``
+            RunTimeoutError: The run exceeded ``timeout``
+            RunCancelledError: ``cancellation`` was cancelled
+            All three carry the partial Run (``error.run``); timeouts and
+            hedges are also recorded in ``Run.events``.
+        """
+        graph, frontier, current_run, node_id, seq, state = self._begin(state, run_id)
+        return self._loop(graph, frontier, state, node_id, False, current_run, seq, resource,
+                          timeout, cancellation)
+
+    async def arun(self, state: StateSchema, resource: Resource = None, run_id: Optional[str] = None,
+                   timeout: Optional[float] = None, cancellation: Optional[CancellationToken] = None):
+        """Async counterpart of run().
+
+        Steps with coroutine logic are awaited and synchronous steps run in worker
+        threads, so many runs can make progress concurrently on one event loop.
+        Coroutine steps that time out, lose a hedge or are cancelled are cancelled.
+        """
+        graph, frontier, current_run, node_id, seq, state = self._begin(state, run_id)
+        return await self._aloop(graph, frontier, state, node_id, False, current_run, seq, resource,
+                                 timeout, cancellation)
+
+    def resume(self, run_id: str, resource: Resource = None, timeout: Optional[float] = None,
+               cancellation: Optional[CancellationToken] = None) -> Run:
+        """Continue a checkpointed run after its last completed step.
+
+        Steps already persisted are not executed again; their snapshots are
+        restored from the checkpointer. A run that already completed is
+        returned as-is.
+
+        Raises:
+            ValueError: If the machine has no checkpointer
+            KeyError: If the checkpointer holds no records for ``run_id``
+        """
+        graph, frontier, current_run, node_id, state, fanned_in, seq = self._restore(run_id)
+        if current_run.end_timestamp is not None:
+            return current_run
+        return self._loop(graph, frontier, state, node_id, fanned_in, current_run, seq, resource,
+                          timeout, cancellation)
+
+    async def aresume(self, run_id: str, resource: Resource = None, timeout: Optional[float] = None,
+                      cancellation: Optional[CancellationToken] = None) -> Run:
+        """Async counterpart of resume()"""
+        graph, frontier, current_run, node_id, state, fanned_in, seq = self._restore(run_id)
+        if current_run.end_timestamp is not None:
+            return current_run
+        return await self._aloop(graph, frontier, state, node_id, fanned_in, current_run, seq, resource,
+                                 timeout, cancellation)
+
+    def run_many_as_completed(self, states: Iterable[StateSchema], resource: Resource = None,
+                              max_concurrency: int = DEFAULT_MAX_WORKERS) -> Iterator[Tuple[int, Run]]:
+        """Run the workflow once per initial state, yielding ``(index, run)`` as runs finish.
+
+        All runs share this machine (compiled once) and ``resource``, so anything
+        in it must be safe to use from several threads. At most
+        ``max_concurrency`` runs execute at a time and ``states`` is consumed
+        lazily, so large or generated inputs are fine. If a run raises, runs not
+        yet started are cancelled and the error propagates.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.graph  # compile up-front instead of racing to do it in every worker
+
+        queued = enumerate(states)
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="state-machine-run") as pool:
+            pending: Dict[Any, int] = {}
+
+            def submit_next():
+                item = next(queued, None)
+                if item is not None:
+                    pending[pool.submit(self.run, item[1], resource)] = item[0]
+
+            for _ in range(max_concurrency):
+                submit_next()
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = pending.pop(future)
+                        run = future.result()
+                        # Keep the pool busy while the caller handles this run
+                        submit_next()
+                        yield index, run
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def run_many(self, states: Iterable[StateSchema], resource: Resource = None,
+                 max_concurrency: int = DEFAULT_MAX_WORKERS) -> List[Run]:
+        """Run the workflow once per initial state and return the runs in input order.
+
+        See run_many_as_completed() to process runs as soon as each one finishes.
+        """
+        runs: Dict[int, Run] = dict(self.run_many_as_completed(states, resource, max_concurrency))
+        return [runs[index] for index in range(len(runs))]
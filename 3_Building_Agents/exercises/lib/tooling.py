@@ -27,6 +27,7 @@ Notes:
 
 import inspect
 import datetime
+import threading
 from typing import (
     Any, Callable,
     Literal, Optional, Union, TypeAlias,
@@ -56,7 +57,8 @@ class Tool:
         self,
         func: Callable,
         name: Optional[str] = None,
-        description: Optional[str] = None
+        description: Optional[str] = None,
+        max_concurrency: Optional[int] = None
     ):
         """Initialize the `Tool` wrapper.
 
@@ -65,6 +67,9 @@ class Tool:
             name: Optional explicit name to use instead of the function name.
             description: Optional description; defaults to the wrapped function's
                 docstring when not provided.
+            max_concurrency: Optional cap on simultaneous calls of this tool
+                (use 1 for callables that are not thread-safe); None means
+                unlimited.
         """
 
         self.func = func
@@ -74,6 +79,11 @@ class Tool:
         self.signature = inspect.signature(func, eval_str=True)
         self.type_hints = get_type_hints(func)
 
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
         self.parameters = [
             self._build_param_schema(key, param)
             for key, param in self.signature.parameters.items()
@@ -191,9 +201,16 @@ class Tool:
 
         Returns:
             The value returned by the wrapped function.
+
+        Note:
+            When `max_concurrency` is set, callers beyond the limit block
+            until a running call of this tool finishes.
         """
 
-        return self.func(*args, **kwargs)
+        if self._semaphore is None:
+            return self.func(*args, **kwargs)
+        with self._semaphore:
+            return self.func(*args, **kwargs)
 
     def __repr__(self):
         """Return a concise representation for debugging.
@@ -219,7 +236,8 @@ class Tool:
 
 
 
-def tool(func=None, *, name: str = None, description: str = None):
+def tool(func=None, *, name: str = None, description: str = None,
+         max_concurrency: Optional[int] = None):
     """Decorator to expose a function as a `Tool` instance.
 
     Usage:
@@ -232,6 +250,11 @@ def tool(func=None, *, name: str = None, description: str = None):
         def my_tool(x: int) -> int:
             return x + 1
 
+        # at most one call at a time (for callables that are not thread-safe)
+        @tool(max_concurrency=1)
+        def query_db(sql: str) -> list:
+            ...
+
     The decorator returns a `Tool` instance which can be registered with an
     `LLM` or inspected to produce a function schema.
     """
@@ -254,7 +277,7 @@ def tool(func=None, *, name: str = None, description: str = None):
 
             return f(*args, **kwargs)
 
-        return Tool(f, name=name, description=description)
+        return Tool(f, name=name, description=description, max_concurrency=max_concurrency)
     
     # @tool ou @tool(name="foo")
     return wrapper(func) if func else wrapper
\ No newline at end of file
@@ -1,26 +1,133 @@
-from typing import TypedDict, List, Optional, Union, TypeVar
+from typing import Annotated, Callable, Dict, Iterator, TypedDict, List, Optional, Set, Tuple, Union, TypeVar
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+import asyncio
 import json
+import queue
+import threading
+import time
 
-from lib.state_machine import StateMachine, Step, EntryPoint, Termination, Run
-from lib.llm import LLM
+from lib.state_machine import (
+    StateMachine, Step, EntryPoint, Termination, Run, Resource, CancellationToken, append,
+)
+from lib.checkpoint import Checkpointer
+from lib.llm import LLM, ResponseCache
 from lib.messages import AIMessage, UserMessage, SystemMessage, ToolMessage
 from lib.tooling import Tool, ToolCall
-from lib.memory import ShortTermMemory
+from lib.memory import InMemorySessionStore, SessionStore, ShortTermMemory
+from lib.rate_limiting import RateLimiter
+from lib.tool_selection import TfidfToolSelector, ToolSelector
+from lib.windowing import ContextWindow, count_tokens, message_tokens, summary_prompt, window_messages
+
+DEFAULT_MAX_TOOL_WORKERS = 8
+
+# Content of the ToolMessage answering a repeat of an earlier identical call
+DUPLICATE_TOOL_CALL_PREFIX = "Duplicate of tool call "
+
+
+def _tool_call_key(call: ToolCall) -> Tuple[str, str]:
+    """(name, canonical arguments), equal for repeats of the same tool call"""
+    try:
+        arguments = json.dumps(json.loads(call.function.arguments or "{}"), sort_keys=True, separators=(",", ":"))
+    except json.JSONDecodeError:
+        arguments = call.function.arguments
+    return call.function.name, arguments
+
+
+def _is_duplicate(message: ToolMessage) -> bool:
+    return (message.content or "").startswith(DUPLICATE_TOOL_CALL_PREFIX)
+
+
+# Added to the prompt of the final LLM call once a run is out of budget
+BUDGET_EXCEEDED_NOTE = (
+    "The budget for this request is exhausted: no more tools can be called. "
+    "Give your final answer now, using only the information gathered so far."
+)
+SKIPPED_TOOL_CALL = "Not executed: the tool-call budget of this request is exhausted."
+
+
+@dataclass(frozen=True)
+class RunBudget:
+    """Per-run limits of the Agent's tool loop; None disables a limit.
+
+    Limits are checked between steps: the step crossing one completes, then
+    remaining tool calls are answered without running them and the model is
+    asked for a final answer from the context it already has (one more LLM
+    call, without tools).
+
+    Attributes:
+        max_tokens: LLM tokens (prompt and completion) spent by the run
+        max_seconds: Wall-clock seconds since the run started
+        max_tool_calls: Tool executions (repeats answered by deduplication
+            are free)
+    """
+    max_tokens: Optional[int] = None
+    max_seconds: Optional[float] = None
+    max_tool_calls: Optional[int] = None
+
+    def exceeded(self, tokens: int, seconds: float, tool_calls: int) -> Optional[str]:
+        """Name of the first limit reached ("tokens", "seconds", "tool_calls"), or None"""
+        if self.max_tokens is not None and tokens >= self.max_tokens:
+            return "tokens"
+        if self.max_seconds is not None and seconds >= self.max_seconds:
+            return "seconds"
+        if self.max_tool_calls is not None and tool_calls >= self.max_tool_calls:
+            return "tool_calls"
+        return None
+
+
+@dataclass
+class AgentEvent:
+    """Item of Agent.stream(): "text", "tool_call_start", "tool_call_end", or the final "run" """
+    type: str
+    content: Optional[str] = None
+    tool_call: Optional[ToolCall] = None
+    result: Optional[ToolMessage] = None
+    run: Optional[Run] = None
+
+
+class _StreamContext:
+    """Per-call plumbing of Agent.stream(), handed to steps as a Resource var"""
+
+    def __init__(self, max_workers: int):
+        self.events: queue.Queue = queue.Queue()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tools")
+        # Tool calls started while the LLM was still streaming, by tool_call_id
+        self.pending: Dict[str, Future] = {}
+
+    def emit(self, event: AgentEvent):
+        self.events.put(event)
+
 
 # Define the state schema
 class AgentState(TypedDict):
     user_query: str  # The current user query being processed
     instructions: str  # System instructions for the agent
-    messages: List[dict]  # List of conversation messages
+    messages: Annotated[List[dict], append]  # Conversation messages; steps return only new ones
     current_tool_calls: Optional[List[ToolCall]]  # Current pending tool calls
     total_tokens: int  # Track the cumulative total
+    tool_call_count: int  # Tools executed by this run
+    started_at: float  # time.time() when this run started
+    budget_exceeded: Optional[str]  # RunBudget limit that ended the tool loop
+    selected_tools: Optional[List[str]]  # Tools advertised in this run (None: all)
     
 class Agent:
     def __init__(self, 
                  model_name: str,
                  instructions: str, 
                  tools: List[Tool] = None,
-                 temperature: float = 0.7):
+                 temperature: float = 0.7,
+                 checkpointer: Optional[Checkpointer] = None,
+                 max_tool_workers: int = DEFAULT_MAX_TOOL_WORKERS,
+                 context_budget: Optional[int] = None,
+                 summarize_history: bool = True,
+                 session_store: Optional[SessionStore] = None,
+                 dedupe_tool_calls: bool = True,
+                 budget: Optional[RunBudget] = None,
+                 max_tools: Optional[int] = None,
+                 tool_selector: Optional[ToolSelector] = None,
+                 llm_cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
         """
         Initialize an Agent
         
@@ -29,23 +136,86 @@ class Agent:
             instructions: System instructions for the agent
             tools: Optional list of tools available to the agent
             temperature: Temperature parameter for LLM (default: 0.7)
+            checkpointer: Optional durable store for runs, enabling resume()
+            max_tool_workers: Maximum tool calls of one LLM response executed
+                concurrently (1 runs them sequentially)
+            context_budget: Optional token budget for the history sent at the
+                start of each run; older turns beyond it are trimmed
+            summarize_history: Fold trimmed turns into a rolling summary
+                message (one extra LLM call per trim) instead of dropping them
+            session_store: Where session memory lives (default: a bounded
+                in-memory LRU; see lib.memory for TTL and SQLite stores)
+            dedupe_tool_calls: Answer a tool call repeating an earlier call of
+                the same run (same tool, same arguments) with a reference to
+                that call's result instead of running the tool again
+            budget: Optional token, time and tool-call limits applied to each
+                run; see RunBudget
+            max_tools: Advertise only the ``max_tools`` tools most relevant to
+                each query instead of every tool's schema (None sends all);
+                if the model calls a tool left out, the run re-expands to
+                the full tool set
+            tool_selector: Ranking used with ``max_tools`` (default:
+                TfidfToolSelector; see lib.tool_selection for embeddings)
+            llm_cache: Optional ResponseCache shared by the Agent's LLM calls
+                (only temperature 0 calls are cached unless it allows more)
+            rate_limiter: Optional RateLimiter pacing the Agent's LLM calls
+                under requests/min and tokens/min limits and retrying 429s;
+                share one instance across agents using the same API key
         """
         self.instructions = instructions
         self.tools = tools if tools else []
+        # Name-keyed registry for O(1) dispatch of tool calls
+        self._tools_by_name = {tool.name: tool for tool in self.tools}
         self.model_name = model_name
         self.temperature = temperature
+        self.checkpointer = checkpointer
+        self.max_tool_workers = max_tool_workers
+        self.context_budget = context_budget
+        self.summarize_history = summarize_history
+        self.dedupe_tool_calls = dedupe_tool_calls
+        self.budget = budget
+        self.llm_cache = llm_cache
+        self.rate_limiter = rate_limiter
+        self.max_tools = max_tools
+        self.tool_selector = None
+        if max_tools is not None:
+            selector = tool_selector if tool_selector is not None else TfidfToolSelector()
+            self.tool_selector = selector.fit(self.tools)
+
+        # LLM adapters are built once and reused by every step, run and thread
+        self._llms = {}
+        self._llms_lock = threading.Lock()
         
         # Initialize memory and state machine
-        self.memory = ShortTermMemory()
+        self.memory = ShortTermMemory(session_store if session_store is not None else InMemorySessionStore())
         self.workflow = self._create_state_machine()
+        # Same graph with coroutine LLM and tool steps, run by ainvoke()
+        self.async_workflow = self._create_state_machine(asynchronous=True)
+
+    def _get_llm(self, with_tools: bool = True) -> LLM:
+        """Long-lived LLM adapter (with or without tools), built on first use"""
+        llm = self._llms.get(with_tools)
+        if llm is None:
+            with self._llms_lock:
+                llm = self._llms.get(with_tools)
+                if llm is None:
+                    llm = LLM(
+                        model=self.model_name,
+                        temperature=self.temperature,
+                        tools=self.tools if with_tools else [],
+                        cache=self.llm_cache,
+                        rate_limiter=self.rate_limiter,
+                    )
+                    self._llms[with_tools] = llm
+        return llm
 
     def _prepare_messages_step(self, state: AgentState) -> AgentState:
         """Step logic: Prepare messages for LLM consumption"""
-        messages = state.get("messages", [])
+        messages = []
         
         # If no messages exist, start with system message
-        if not messages:
-            messages = [SystemMessage(content=state["instructions"])]
+        if not state.get("messages"):
+            messages.append(SystemMessage(content=state["instructions"]))
             
         # Add the new user message
         messages.append(UserMessage(content=state["user_query"]))
@@ -55,72 +225,273 @@ class Agent:
             "session_id": state["session_id"]
         }
 
-    def _llm_step(self, state: AgentState) -> AgentState:
+    def _llm_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
         """Step logic: Process the current state through the LLM"""
-        # Initialize LLM
-        llm = LLM(
-            model=self.model_name,
-            temperature=self.temperature,
-            tools=self.tools
-        )
+        stream = resource.vars.get("stream") if resource else None
+        messages, exceeded, tool_names = self._llm_request(state)
+        if stream is None:
+            response = self._get_llm(with_tools=not exceeded).invoke(messages, tool_names=tool_names)
+        else:
+            response = self._stream_llm_response(state, stream, messages, with_tools=not exceeded,
+                                                 tool_names=tool_names)
+        return self._llm_update(state, messages, exceeded, response)
+
+    async def _allm_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
+        """Coroutine `_llm_step` used by ainvoke(): awaits LLM.ainvoke instead of holding a thread"""
+        messages, exceeded, tool_names = self._llm_request(state)
+        response = await self._get_llm(with_tools=not exceeded).ainvoke(messages, tool_names=tool_names)
+        return self._llm_update(state, messages, exceeded, response)
 
-        response = llm.invoke(state["messages"])
+    def _llm_request(self, state: AgentState) -> Tuple[List, Optional[str], Optional[List[str]]]:
+        """Messages, budget limit hit (if any) and tool names of the next LLM call"""
+        # Out of budget: no more tools, answer from the context gathered so far
+        exceeded = self._budget_exceeded(state)
+        messages = state["messages"]
+        if exceeded:
+            messages = messages + [SystemMessage(content=BUDGET_EXCEEDED_NOTE)]
+        tool_names = None if exceeded else self._tool_names(state)
+        return messages, exceeded, tool_names
+
+    def _llm_update(self, state: AgentState, messages: List, exceeded: Optional[str],
+                    response: AIMessage) -> AgentState:
+        """State update recording the LLM ``response`` to ``messages``"""
         tool_calls = response.tool_calls if response.tool_calls else None
 
-        current_total = state.get("total_tokens", 0)
-        if response.token_usage:
-            current_total += response.token_usage.total_tokens
+        current_total = state.get("total_tokens", 0) + self._call_tokens(messages, response)
 
         # Create AI message with content and tool calls
         ai_message = AIMessage(
             content=response.content, 
             tool_calls=tool_calls,
+            token_usage=response.token_usage,
         )
 
         return {
-            "messages": state["messages"] + [ai_message],
+            "messages": [ai_message],
             "current_tool_calls": tool_calls,
             "session_id": state["session_id"],
             "total_tokens": current_total,
+            "budget_exceeded": exceeded or state.get("budget_exceeded"),
         }
 
-    def _tool_step(self, state: AgentState) -> AgentState:
+    def _stream_llm_response(self, state: AgentState, stream: _StreamContext,
+                             messages: List, with_tools: bool = True,
+                             tool_names: Optional[List[str]] = None) -> AIMessage:
+        """Emit text deltas and start each new tool call within budget as soon as it is complete"""
+        answered = self._answered_tool_calls(state)
+        allowance = self._tool_allowance(state)
+        response = None
+        for event in self._get_llm(with_tools).stream(messages, tool_names=tool_names):
+            if event.type == "text":
+                stream.emit(AgentEvent("text", content=event.content))
+            elif event.type == "tool_call" and self._find_duplicate(answered, event.tool_call) is None:
+                if allowance is not None:
+                    if allowance <= 0:
+                        continue
+                    allowance -= 1
+                stream.pending[event.tool_call.id] = stream.pool.submit(
+                    self._execute_tool_call, event.tool_call, stream.emit
+                )
+            else:
+                response = event.message
+        return response
+
+    @staticmethod
+    def _run_messages(state: AgentState) -> List:
+        """Messages added by the current run: from its user query onwards"""
+        messages = state["messages"]
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], UserMessage) and messages[i].content == state["user_query"]:
+                return messages[i:]
+        return messages
+
+    def _answered_tool_calls(self, state: AgentState) -> Dict[Tuple[str, str], str]:
+        """Tool-call key -> id of the first call of this run answering it"""
+        if not self.dedupe_tool_calls:
+            return {}
+        keys = {}
+        answered = {}
+        for message in self._run_messages(state):
+            for call in getattr(message, "tool_calls", None) or []:
+                keys[call.id] = _tool_call_key(call)
+            if isinstance(message, ToolMessage) and message.tool_call_id in keys and not _is_duplicate(message):
+                answered.setdefault(keys[message.tool_call_id], message.tool_call_id)
+        return answered
+
+    def _find_duplicate(self, answered: Dict[Tuple[str, str], str], call: ToolCall) -> Optional[str]:
+        """Id of the earlier call ``call`` repeats, or None after registering ``call``"""
+        if not self.dedupe_tool_calls:
+            return None
+        key = _tool_call_key(call)
+        if key in answered:
+            return answered[key]
+        if call.function.name in self._tools_by_name:
+            answered[key] = call.id
+        return None
+
+    def _call_tokens(self, messages: List, response: AIMessage) -> int:
+        """Tokens of one LLM call: reported usage, or an estimate of prompt and reply"""
+        usage = getattr(response, "token_usage", None)
+        if usage is not None:
+            return usage.total_tokens
+        return sum(message_tokens(m, self.model_name) for m in messages) + message_tokens(response, self.model_name)
+
+    def _budget_exceeded(self, state: AgentState) -> Optional[str]:
+        """Name of the RunBudget limit the run has reached, or None"""
+        if self.budget is None:
+            return None
+        return self.budget.exceeded(
+            tokens=state.get("total_tokens") or 0,
+            seconds=time.time() - (state.get("started_at") or time.time()),
+            tool_calls=state.get("tool_call_count") or 0,
+        )
+
+    def _tool_allowance(self, state: AgentState) -> Optional[int]:
+        """How many more tools the run may execute (None: no limit)"""
+        if self.budget is None:
+            return None
+        if self._budget_exceeded(state):
+            return 0
+        if self.budget.max_tool_calls is None:
+            return None
+        return self.budget.max_tool_calls - (state.get("tool_call_count") or 0)
+
+    def _select_tools(self, query: str) -> Optional[List[str]]:
+        """Tools most relevant to ``query`` when tool selection would drop some, else None"""
+        if self.tool_selector is None or len(self.tools) <= self.max_tools:
+            return None
+        return self.tool_selector.select(query, self.max_tools)
+
+    def _tool_names(self, state: AgentState) -> Optional[List[str]]:
+        """Tools to advertise next (None: all); re-expands once the model calls a tool left out"""
+        selected = state.get("selected_tools")
+        if selected is None:
+            return None
+        called = {
+            call.function.name
+            for message in self._run_messages(state)
+            for call in getattr(message, "tool_calls", None) or []
+        }
+        if called - set(selected):
+            return None
+        return selected
+
+    def _execute_tool_call(self, call: ToolCall,
+                           emit: Optional[Callable[[AgentEvent], None]] = None) -> Optional[ToolMessage]:
+        """Run one tool call; None when no registered tool matches its name"""
+        # Access tool call data correctly
+        function_name = call.function.name
+        function_args = json.loads(call.function.arguments)
+        tool = self._tools_by_name.get(function_name)
+        if tool is None:
+            return None
+        if emit:
+            emit(AgentEvent("tool_call_start", tool_call=call))
+        result = str(tool(**function_args))
+        tool_message = ToolMessage(
+            content=json.dumps(result),
+            tool_call_id=call.id,
+            name=function_name,
+        )
+        if emit:
+            emit(AgentEvent("tool_call_end", tool_call=call, result=tool_message))
+        return tool_message
+
+    def _tool_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
         """Step logic: Execute any pending tool calls"""
+        new_calls, originals, skipped = self._plan_tool_calls(state)
+        stream = resource.vars.get("stream") if resource else None
+
+        # Independent calls run concurrently; results keep the tool_call_id order
+        if stream is not None:
+            # Calls started early by the streaming LLM step are only awaited
+            futures = [
+                stream.pending.pop(call.id, None)
+                or stream.pool.submit(self._execute_tool_call, call, stream.emit)
+                for call in new_calls
+            ]
+            results = [future.result() for future in futures]
+        elif len(new_calls) > 1 and self.max_tool_workers > 1:
+            workers = min(len(new_calls), self.max_tool_workers)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-tools") as pool:
+                results = list(pool.map(self._execute_tool_call, new_calls))
+        else:
+            results = [self._execute_tool_call(call) for call in new_calls]
+        return self._tool_update(state, new_calls, originals, skipped, results)
+
+    async def _atool_step(self, state: AgentState, resource: Optional[Resource] = None) -> AgentState:
+        """Coroutine `_tool_step` used by ainvoke(): up to ``max_tool_workers`` tools at once in worker threads"""
+        new_calls, originals, skipped = self._plan_tool_calls(state)
+        slots = asyncio.Semaphore(max(1, self.max_tool_workers))
+
+        async def execute(call: ToolCall) -> Optional[ToolMessage]:
+            async with slots:
+                return await asyncio.to_thread(self._execute_tool_call, call)
+
+        results = await asyncio.gather(*(execute(call) for call in new_calls))
+        return self._tool_update(state, new_calls, originals, skipped, results)
+
+    def _plan_tool_calls(self, state: AgentState) -> Tuple[List[ToolCall], Dict[str, str], Set[str]]:
+        """Calls to execute, repeats (id -> id of the earlier call) and ids over the budget"""
+        tool_calls = state["current_tool_calls"] or []
+
+        # Repeats of a call already made in this run reuse its result
+        answered = self._answered_tool_calls(state)
+        originals = {}
+        for call in tool_calls:
+            original = self._find_duplicate(answered, call)
+            if original is not None:
+                originals[call.id] = original
+        new_calls = [call for call in tool_calls if call.id not in originals]
+
+        # Calls beyond the run's budget are answered without running them
+        allowance = self._tool_allowance(state)
+        skipped = set()
+        if allowance is not None and len(new_calls) > allowance:
+            skipped = {call.id for call in new_calls[max(allowance, 0):]}
+            new_calls = new_calls[:max(allowance, 0)]
+        return new_calls, originals, skipped
+
+    def _tool_update(self, state: AgentState, new_calls: List[ToolCall], originals: Dict[str, str],
+                     skipped: Set[str], results: List[Optional[ToolMessage]]) -> AgentState:
+        """State update answering every pending call, in the order the model made them"""
         tool_calls = state["current_tool_calls"] or []
+        results_by_id = {message.tool_call_id: message for message in results if message is not None}
+
         tool_messages = []
-        
         for call in tool_calls:
-            # Access tool call data correctly
-            function_name = call.function.name
-            function_args = json.loads(call.function.arguments)
-            tool_call_id = call.id
-            # Find the matching tool
-            tool = next((t for t in self.tools if t.name == function_name), None)
-            if tool:
-                result = str(tool(**function_args))
-                tool_message = ToolMessage(
-                    content=json.dumps(result), 
-                    tool_call_id=tool_call_id, 
-                    name=function_name, 
-                )
-                tool_messages.append(tool_message)
+            if call.id in originals:
+                tool_messages.append(ToolMessage(
+                    content=f"{DUPLICATE_TOOL_CALL_PREFIX}{originals[call.id]} "
+                            "(same tool and arguments): reuse its result above.",
+                    tool_call_id=call.id,
+                    name=call.function.name,
+                ))
+            elif call.id in skipped:
+                tool_messages.append(ToolMessage(
+                    content=SKIPPED_TOOL_CALL, tool_call_id=call.id, name=call.function.name,
+                ))
+            elif call.id in results_by_id:
+                tool_messages.append(results_by_id[call.id])
         
         # Clear tool calls and add results to messages
         return {
-            "messages": state["messages"] + tool_messages,
+            "messages": tool_messages,
             "current_tool_calls": None,
-            "session_id": state["session_id"]
+            "session_id": state["session_id"],
+            "tool_call_count": (state.get("tool_call_count") or 0) + len(new_calls),
+            "budget_exceeded": "tool_calls" if skipped else state.get("budget_exceeded"),
         }
 
-    def _create_state_machine(self) -> StateMachine[AgentState]:
-        """Create the internal state machine for the agent"""
-        machine = StateMachine[AgentState](AgentState)
+    def _create_state_machine(self, asynchronous: bool = False) -> StateMachine[AgentState]:
+        """Create the internal state machine for the agent (coroutine LLM and tool steps for arun if ``asynchronous``)"""
+        machine = StateMachine[AgentState](AgentState, checkpointer=self.checkpointer)
         
         # Create steps
         entry = EntryPoint[AgentState]()
         message_prep = Step[AgentState]("message_prep", self._prepare_messages_step)
-        llm_processor = Step[AgentState]("llm_processor", self._llm_step)
-        tool_executor = Step[AgentState]("tool_executor", self._tool_step)
+        llm_processor = Step[AgentState]("llm_processor", self._allm_step if asynchronous else self._llm_step)
+        tool_executor = Step[AgentState]("tool_executor", self._atool_step if asynchronous else self._tool_step)
         termination = Termination[AgentState]()
         
         machine.add_steps([entry, message_prep, llm_processor, tool_executor, termination])
@@ -141,19 +512,17 @@ class Agent:
         
         return machine
 
-    def invoke(self, query: str, session_id: Optional[str] = None) -> Run:
-        """
-        Run the agent on a query
-        
-        Args:
-            query: The user's query to process
-            session_id: Optional session identifier (uses "default" if None)
-            
-        Returns:
-            The final run object after processing
-        """
-        session_id = session_id or "default"
+    def _summarize_history(self, previous_summary: Optional[str], messages: List) -> str:
+        """Fold trimmed messages into the rolling summary of the conversation"""
+        return self._get_llm(with_tools=False).invoke(summary_prompt(previous_summary, messages)).content or ""
 
+    def _initial_state(self, query: str, session_id: str) -> Tuple[AgentState, Optional[ContextWindow]]:
+        """Build the initial state, continuing the session's last conversation.
+
+        With a ``context_budget``, the previous messages are windowed to fit
+        it (leaving room for the new query); the ContextWindow describing
+        what was trimmed is returned alongside the state.
+        """
         # Create session if it doesn't exist
         self.memory.create_session(session_id)
 
@@ -165,18 +534,229 @@ class Agent:
             if last_state:
                 previous_messages = last_state["messages"]
 
-        initial_state: AgentState = {
+        window = None
+        if self.context_budget is not None and previous_messages:
+            window = window_messages(
+                previous_messages,
+                self.context_budget,
+                summarize=self._summarize_history if self.summarize_history else None,
+                model=self.model_name,
+                reserved_tokens=message_tokens(UserMessage(content=query), self.model_name),
+            )
+            previous_messages = window.messages
+
+        state = {
             "user_query": query,
             "instructions": self.instructions,
             "messages": previous_messages,
             "current_tool_calls": None,
             "session_id": session_id,
+            "total_tokens": 0,
+            "tool_call_count": 0,
+            "started_at": time.time(),
+            "budget_exceeded": None,
+            "selected_tools": self._select_tools(query),
+        }
+        return state, window
+
+    def _record_tool_selection(self, run_object: Run):
+        """Expose which tools the run advertised, and the schema tokens that saved, in the Run metadata"""
+        state = run_object.get_final_state() if self.tool_selector is not None else None
+        if not state:
+            return
+        selected = state.get("selected_tools")
+        schemas = {tool.name: count_tokens(json.dumps(tool.dict()), self.model_name) for tool in self.tools}
+        run_object.annotations["tool_selection"] = {
+            "available": len(self.tools),
+            "selected": selected,
+            "expanded": selected is not None and self._tool_names(state) is None,
+            "schema_tokens_all": sum(schemas.values()),
+            "schema_tokens_selected": sum(schemas[name] for name in (selected or schemas)),
+        }
+
+    def _record_budget(self, run_object: Run):
+        """Expose the run's usage and the budget limit it hit, if any, in the Run metadata"""
+        state = run_object.get_final_state() if self.budget is not None else None
+        if not state:
+            return
+        run_object.annotations["budget"] = {
+            "limits": asdict(self.budget),
+            "exceeded": state.get("budget_exceeded"),
+            "tokens": state.get("total_tokens") or 0,
+            "seconds": time.time() - (state.get("started_at") or time.time()),
+            "tool_calls": state.get("tool_call_count") or 0,
         }
 
-        run_object = self.workflow.run(initial_state)
+    def _record_tool_dedup(self, run_object: Run):
+        """Expose how many tool calls of the run were answered from earlier results"""
+        state = run_object.get_final_state() if self.dedupe_tool_calls else None
+        if not state:
+            return
+        tool_messages = [m for m in self._run_messages(state) if isinstance(m, ToolMessage)]
+        by_id = {m.tool_call_id: m for m in tool_messages}
+        duplicates = [m for m in tool_messages if _is_duplicate(m)]
+        saved_tokens = 0
+        for message in duplicates:
+            original_id = message.content[len(DUPLICATE_TOOL_CALL_PREFIX):].split(" ", 1)[0]
+            if original_id in by_id:
+                saved_tokens += (message_tokens(by_id[original_id], self.model_name)
+                                 - message_tokens(message, self.model_name))
+        run_object.annotations["tool_dedup"] = {
+            "tool_calls": len(tool_messages),
+            "deduplicated": len(duplicates),
+            "hit_rate": len(duplicates) / len(tool_messages) if tool_messages else 0.0,
+            "saved_tokens": max(saved_tokens, 0),
+        }
+
+    @staticmethod
+    def _record_window(run_object: Run, window: Optional[ContextWindow]):
+        """Expose the context window's trimming counters in the Run metadata"""
+        if window is not None:
+            run_object.annotations["context_window"] = window.report()
+
+    def invoke(self, query: str, session_id: Optional[str] = None,
+               run_id: Optional[str] = None) -> Run:
+        """
+        Run the agent on a query
+        
+        Args:
+            query: The user's query to process
+            session_id: Optional session identifier (uses "default" if None)
+            run_id: Optional id for the run, needed to resume() it after a crash
+            
+        Returns:
+            The final run object after processing
+        """
+        session_id = session_id or "default"
+        initial_state, window = self._initial_state(query, session_id)
+
+        run_object = self.workflow.run(initial_state, run_id=run_id)
+        self._record_window(run_object, window)
+        self._record_tool_dedup(run_object)
+        self._record_budget(run_object)
+        self._record_tool_selection(run_object)
+        
+        # Store the run's final state (not its snapshot history) in memory
+        self.memory.add(run_object.final_only(), session_id)
+        
+        return run_object
+
+    def stream(self, query: str, session_id: Optional[str] = None,
+               run_id: Optional[str] = None) -> Iterator[AgentEvent]:
+        """
+        Run the agent on a query, yielding events while it works
+        
+        The state machine runs on a background thread; LLM text arrives as
+        "text" events token by token, tool executions as "tool_call_start"
+        and "tool_call_end" events, and the finished Run as the last "run"
+        event. Tool calls start as soon as their arguments are complete,
+        while the model may still be streaming further calls. Closing the
+        generator early cancels the run.
+        
+        Args:
+            query: The user's query to process
+            session_id: Optional session identifier (uses "default" if None)
+            run_id: Optional id for the run, needed to resume() it after a crash
+            
+        Yields:
+            AgentEvent objects, ending with the "run" event
+        """
+        session_id = session_id or "default"
+        initial_state, window = self._initial_state(query, session_id)
+        stream = _StreamContext(self.max_tool_workers)
+        cancellation = CancellationToken()
+
+        def drive():
+            try:
+                run_object = self.workflow.run(
+                    initial_state, resource=Resource(vars={"stream": stream}),
+                    run_id=run_id, cancellation=cancellation,
+                )
+                stream.emit(AgentEvent("run", run=run_object))
+            except BaseException as error:
+                stream.events.put(error)
+
+        threading.Thread(target=drive, name="agent-stream", daemon=True).start()
+        run_object = None
+        try:
+            while run_object is None:
+                event = stream.events.get()
+                if isinstance(event, BaseException):
+                    raise event
+                if event.type == "run":
+                    run_object = event.run
+                else:
+                    yield event
+        finally:
+            if run_object is None:
+                cancellation.cancel("stream closed")
+            stream.pool.shutdown(wait=False)
+
+        self._record_window(run_object, window)
+        self._record_tool_dedup(run_object)
+        self._record_budget(run_object)
+        self._record_tool_selection(run_object)
+
+        # Store the run's final state (not its snapshot history) in memory
+        self.memory.add(run_object.final_only(), session_id)
+
+        yield AgentEvent("run", run=run_object)
+
+    async def ainvoke(self, query: str, session_id: Optional[str] = None,
+                      run_id: Optional[str] = None) -> Run:
+        """
+        Async counterpart of invoke(), driven by StateMachine.arun
+        
+        LLM calls are awaited on the event loop (LLM.ainvoke) and tools run
+        in worker threads, so many concurrent runs do not need a thread each.
+        
+        Args:
+            query: The user's query to process
+            session_id: Optional session identifier (uses "default" if None)
+            run_id: Optional id for the run, needed to resume() it after a crash
+            
+        Returns:
+            The final run object after processing
+        """
+        session_id = session_id or "default"
+        # Windowing may call the LLM to summarize, so keep it off the event loop
+        initial_state, window = await asyncio.to_thread(self._initial_state, query, session_id)
+
+        run_object = await self.async_workflow.arun(initial_state, run_id=run_id)
+        self._record_window(run_object, window)
+        self._record_tool_dedup(run_object)
+        self._record_budget(run_object)
+        self._record_tool_selection(run_object)
+        
+        # Store the run's final state (not its snapshot history) in memory
+        self.memory.add(run_object.final_only(), session_id)
+        
+        return run_object
+
+    def resume(self, run_id: str, session_id: Optional[str] = None) -> Run:
+        """
+        Continue an interrupted run from its last checkpointed step
+        
+        Steps completed before the interruption (including their LLM calls)
+        are restored from the checkpointer instead of being executed again.
+        
+        Args:
+            run_id: Id the run was started with
+            session_id: Session to store the finished run in (uses "default" if None)
+            
+        Returns:
+            The final run object after processing
+        """
+        session_id = session_id or "default"
+        self.memory.create_session(session_id)
+
+        run_object = self.workflow.resume(run_id)
+        self._record_tool_dedup(run_object)
+        self._record_budget(run_object)
+        self._record_tool_selection(run_object)
         
-        # Store the complete run object in memory
-        self.memory.add(run_object, session_id)
+        # Store the run's final state (not its snapshot history) in memory
+        self.memory.add(run_object.final_only(), session_id)
         
         return run_object
 
@@ -187,7 +767,8 @@ class Agent:
             session_id: Optional session ID (uses "default" if None)
             
         Returns:
-            List of Run objects in the session
+            List of Run objects in the session, each reduced to its final
+            snapshot (see Run.final_only)
         """
         return self.memory.get_all_objects(session_id)
 
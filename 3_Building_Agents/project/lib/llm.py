@@ -1,7 +1,14 @@
+import asyncio
+import itertools
+import json
 import os
-from typing import List, Optional, Dict, Any
+import threading
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Deque, Dict, Iterator, List, Optional, Tuple
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import APIConnectionError, AsyncOpenAI, OpenAI
 from lib.messages import (
     AnyMessage,
     TokenUsage,
@@ -9,9 +16,241 @@ from lib.messages import (
     BaseMessage,
     UserMessage,
 )
-from lib.tooling import Tool
+from lib.caching import Cache, CacheStats, LRUCache, SqliteCache, TieredCache, stable_hash
+from lib.rate_limiting import RateLimiter, TokenCharge, is_retryable
+from lib.serialization import class_path
+from lib.tooling import Tool, ToolCall
+from lib.windowing import count_tokens
 
 VOCAREUM_BASE_URL = "https://openai.vocareum.com/v1"
+# Completion tokens assumed for a request before its usage is known
+COMPLETION_TOKENS_ESTIMATE = 256
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], OpenAI] = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> OpenAI:
+    """Process-wide OpenAI client (and connection pool) per key and endpoint"""
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = OpenAI(api_key=api_key, base_url=base_url)
+                _clients[key] = client
+    return client
+
+
+# Default cap on LLM.ainvoke requests in flight (see set_max_concurrency)
+MAX_CONCURRENT_REQUESTS = 64
+_max_concurrency = MAX_CONCURRENT_REQUESTS
+# httpx's async pool scans every connection it holds on each request, which
+# degrades sharply past a few dozen; ainvoke requests are spread round-robin
+# over enough clients to keep each near this many in flight.
+REQUESTS_PER_ASYNC_CLIENT = 10
+
+
+@dataclass
+class _LoopPool:
+    clients: Dict[Tuple[Optional[str], Optional[str]], List[AsyncOpenAI]] = field(default_factory=dict)
+    turns: Iterator[int] = field(default_factory=itertools.count)
+
+
+_loop_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopPool]" = weakref.WeakKeyDictionary()
+
+
+def _loop_pool() -> _LoopPool:
+    loop = asyncio.get_running_loop()
+    pool = _loop_pools.get(loop)
+    if pool is None:
+        with _clients_lock:
+            pool = _loop_pools.setdefault(loop, _LoopPool())
+    return pool
+
+
+def shared_async_client(api_key: Optional[str] = None, base_url: Optional[str] = None) -> AsyncOpenAI:
+    """AsyncOpenAI client per key and endpoint, round-robin over a per-loop pool"""
+    pool = _loop_pool()
+    clients = pool.clients.setdefault((api_key, base_url), [])
+    index = next(pool.turns) % -(-_max_concurrency // REQUESTS_PER_ASYNC_CLIENT)
+    if index >= len(clients):
+        clients.append(AsyncOpenAI(api_key=api_key, base_url=base_url))
+        index = len(clients) - 1
+    return clients[index]
+
+
+class _RequestSlots:
+    """Process-wide cap on LLM.ainvoke requests in flight; waiters queue FIFO on futures of their own event loop"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    async def __aenter__(self) -> "_RequestSlots":
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < _max_concurrency and not self._waiters:
+                self.in_flight += 1
+                return self
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            if not queued and waiter[1].done() and not waiter[1].cancelled():
+                # The slot arrived just before the cancellation
+                self.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self.dispatch()
+
+    def dispatch(self):
+        """Hand free slots to the requests waiting longest"""
+        with self._lock:
+            granted = []
+            while self._waiters and self.in_flight < _max_concurrency:
+                granted.append(self._waiters.popleft())
+                self.in_flight += 1
+        for loop, future in granted:
+            try:
+                loop.call_soon_threadsafe(self._grant, future)
+            except RuntimeError:
+                # The waiter's loop is closed
+                self.release()
+
+    def _grant(self, future: asyncio.Future):
+        if future.done():
+            # Cancelled while the slot was on its way: pass it on
+            self.release()
+        else:
+            future.set_result(None)
+
+
+_request_slots = _RequestSlots()
+
+
+def set_max_concurrency(limit: int):
+    """Cap the LLM.ainvoke requests in flight at once, across all adapters, threads and event loops"""
+    global _max_concurrency
+    if limit < 1:
+        raise ValueError(f"max concurrency must be at least 1, got {limit}")
+    with _clients_lock:
+        _max_concurrency = limit
+    _request_slots.dispatch()
+
+
+def _request_slot() -> _RequestSlots:
+    return _request_slots
+
+
+def _is_retryable(error: BaseException) -> bool:
+    return isinstance(error, APIConnectionError) or is_retryable(error)
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Prompt tokens of a request (messages and tools as JSON) plus the completion estimate"""
+    prompt = json.dumps([payload.get("messages"), payload.get("tools")], default=str)
+    return count_tokens(prompt, payload.get("model", "gpt-4o-mini")) + COMPLETION_TOKENS_ESTIMATE
+
+
+@dataclass
+class StreamEvent:
+    """Item of LLM.stream(): "text" delta, assembled "tool_call", or final "message" """
+    type: str
+    content: Optional[str] = None
+    tool_call: Optional[ToolCall] = None
+    message: Optional[AIMessage] = None
+
+
+def _assemble_tool_call(parts: Dict[str, Any]) -> ToolCall:
+    return ToolCall(
+        id=parts["id"],
+        type="function",
+        function={"name": parts["name"], "arguments": "".join(parts["arguments"])},
+    )
+
+
+def _arguments_complete(parts: Dict[str, Any]) -> bool:
+    """Whether the argument fragments received so far form a whole JSON object"""
+    if not parts["arguments"] or not parts["arguments"][-1].rstrip().endswith("}"):
+        return False
+    try:
+        json.loads("".join(parts["arguments"]))
+    except ValueError:
+        return False
+    return True
+
+
+@dataclass
+class ResponseCacheStats(CacheStats):
+    """Hits/misses plus bytes and tokens not sent, and sampled requests not cached"""
+    bytes_saved: int = 0
+    tokens_saved: int = 0
+    skipped: int = 0
+
+
+class ResponseCache:
+    """Opt-in LLM response cache: in-memory LRU, optionally backed by a shared SQLite file.
+
+    Keys hash the whole payload and the response format schema; requests with
+    temperature > 0 are only cached when ``cache_sampled`` is True.
+    """
+
+    def __init__(self, max_size: int = 1024, path: Optional[str] = None,
+                 disk_max_size: Optional[int] = None, ttl: Optional[float] = None,
+                 cache_sampled: bool = False):
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.cache: Cache = self.memory
+        if path is not None:
+            disk = SqliteCache(path, table="llm_responses", ttl=ttl, max_size=disk_max_size)
+            self.cache = TieredCache(self.memory, disk)
+        self.cache_sampled = cache_sampled
+        self.stats = ResponseCacheStats()
+        self._lock = threading.Lock()
+
+    def key(self, payload: Dict[str, Any], response_format: Optional[type] = None) -> Optional[str]:
+        """Cache key of a request, or None when it samples and sampled requests are not cached"""
+        if payload.get("temperature", 1.0) > 0 and not self.cache_sampled:
+            with self._lock:
+                self.stats.skipped += 1
+            return None
+        response_schema = None
+        if response_format is not None:
+            response_schema = [class_path(response_format), response_format.model_json_schema()]
+        return stable_hash([payload, response_schema])
+
+    def get(self, key: str) -> Optional[AIMessage]:
+        hit, entry = self.cache.get(key)
+        with self._lock:
+            if not hit:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            self.stats.bytes_saved += entry["bytes"]
+            usage = getattr(entry["message"], "token_usage", None)
+            self.stats.tokens_saved += usage.total_tokens if usage else 0
+        return entry["message"].model_copy(deep=True)
+
+    def set(self, key: str, payload: Dict[str, Any], message: AIMessage):
+        size = len(json.dumps(payload, default=str)) + len(json.dumps(message.dict(), default=str))
+        self.cache.set(key, {"message": message, "bytes": size})
+
+    def clear(self):
+        self.cache.clear()
 
 
 class LLM:
@@ -20,34 +259,58 @@ class LLM:
         model: str = "gpt-4o-mini",
         temperature: float = 0.0,
         tools: Optional[List[Tool]] = None,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        client: Optional[OpenAI] = None,
+        async_client: Optional[AsyncOpenAI] = None,
+        cache: Optional[ResponseCache] = None,
+        rate_limiter: Optional[RateLimiter] = None,
     ):
         self.model = model
         self.temperature = temperature
 
-        resolved_key = api_key or os.environ.get("OPENAI_API_KEY", "")
+        if client is None:
+            resolved_key = api_key or os.environ.get("OPENAI_API_KEY", "")
+            # Use Vocareum proxy endpoint for Udacity workspace keys
+            if base_url is None and resolved_key.startswith("voc-"):
+                base_url = VOCAREUM_BASE_URL
+            client = shared_client(resolved_key or None, base_url)
+        self.client = client
+        self.async_client = async_client
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self._unretried_client: Optional[OpenAI] = None
 
-        # Use Vocareum proxy endpoint for Udacity workspace keys
-        if resolved_key.startswith("voc-"):
-            self.client = OpenAI(api_key=resolved_key, base_url=VOCAREUM_BASE_URL)
-        else:
-            self.client = OpenAI(api_key=resolved_key if resolved_key else None)
         self.tools: Dict[str, Tool] = {
             tool.name: tool for tool in (tools or [])
         }
+        self._tools_payload: Optional[List[Dict[str, Any]]] = None
 
     def register_tool(self, tool: Tool):
         self.tools[tool.name] = tool
+        self._tools_payload = None
 
-    def _build_payload(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+    def _tools_schema(self, tool_names: Optional[Collection[str]] = None) -> List[Dict[str, Any]]:
+        """Registered tool schemas (only ``tool_names`` if given), built once per tool set"""
+        payload = self._tools_payload
+        if payload is None:
+            payload = [tool.dict() for tool in self.tools.values()]
+            self._tools_payload = payload
+        if tool_names is not None:
+            payload = [schema for name, schema in zip(self.tools, payload) if name in tool_names]
+        return payload
+
+    def _build_payload(self, messages: List[BaseMessage],
+                       tool_names: Optional[Collection[str]] = None) -> Dict[str, Any]:
         payload = {
             "model": self.model,
             "temperature": self.temperature,
             "messages": [m.dict() for m in messages],
         }
 
-        if self.tools:
-            payload["tools"] = [tool.dict() for tool in self.tools.values()]
+        tools = self._tools_schema(tool_names) if self.tools else None
+        if tools:
+            payload["tools"] = tools
             payload["tool_choice"] = "auto"
 
         return payload
@@ -64,14 +327,85 @@ class LLM:
 
     def invoke(self, 
                input: str | BaseMessage | List[BaseMessage],
-               response_format: BaseModel = None,) -> AIMessage:
+               response_format: BaseModel = None,
+               tool_names: Optional[Collection[str]] = None) -> AIMessage:
+        payload, key, cached = self._prepare_request(input, response_format, tool_names)
+        if cached is not None:
+            return cached
+        if response_format:
+            send = lambda client: client.beta.chat.completions.parse(**payload)
+        else:
+            send = lambda client: client.chat.completions.create(**payload)
+        charge = self._charge(payload)
+        response = self._request(send, charge)
+        self._settle(charge, response.usage)
+        return self._response_message(response, payload, key)
+
+    async def ainvoke(self,
+                      input: str | BaseMessage | List[BaseMessage],
+                      response_format: BaseModel = None,
+                      tool_names: Optional[Collection[str]] = None) -> AIMessage:
+        """invoke() on AsyncOpenAI; requests in flight are capped by set_max_concurrency"""
+        payload, key, cached = self._prepare_request(input, response_format, tool_names)
+        if cached is not None:
+            return cached
+        client = self._get_async_client()
+        if self.rate_limiter is not None:
+            client = client.with_options(max_retries=0)
+        if response_format:
+            send = lambda: client.beta.chat.completions.parse(**payload)
+        else:
+            send = lambda: client.chat.completions.create(**payload)
+        charge = self._charge(payload)
+        async with _request_slot():
+            if self.rate_limiter is None:
+                response = await send()
+            else:
+                response = await self.rate_limiter.acall(send, charge.charged, retryable=_is_retryable)
+        self._settle(charge, response.usage)
+        return self._response_message(response, payload, key)
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        if self.async_client is not None:
+            return self.async_client
+        return shared_async_client(self.client.api_key, str(self.client.base_url))
+
+    def _request(self, send: Callable[[OpenAI], Any], charge: Optional[TokenCharge]) -> Any:
+        """``send(client)``, paced and retried by the rate limiter when there is one"""
+        if self.rate_limiter is None:
+            return send(self.client)
+        if self._unretried_client is None:
+            # The limiter owns retries (and their backoff), so the client must not retry too
+            self._unretried_client = self.client.with_options(max_retries=0)
+        client = self._unretried_client
+        return self.rate_limiter.call(lambda: send(client), charge.charged, retryable=_is_retryable)
+
+    def _charge(self, payload: Dict[str, Any]) -> Optional[TokenCharge]:
+        if self.rate_limiter is None:
+            return None
+        return self.rate_limiter.charge(estimate_tokens(payload))
+
+    def _settle(self, charge: Optional[TokenCharge], usage: Any):
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(charge, usage.total_tokens if usage else None)
+
+    def _prepare_request(self, input: Any, response_format: Optional[type],
+                         tool_names: Optional[Collection[str]]
+                         ) -> Tuple[Dict[str, Any], Optional[str], Optional[AIMessage]]:
+        """Payload, cache key and cached response (if any) of a request"""
         messages = self._convert_input(input)
-        payload = self._build_payload(messages)
+        payload = self._build_payload(messages, tool_names)
+        key = self.cache.key(payload, response_format) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return payload, key, cached
         if response_format:
             payload.update({"response_format": response_format})
-            response = self.client.beta.chat.completions.parse(**payload)
-        else:
-            response = self.client.chat.completions.create(**payload)
+        return payload, key, None
+
+    def _response_message(self, response: Any, payload: Dict[str, Any], key: Optional[str]) -> AIMessage:
+        """`AIMessage` of a chat completion, stored in the cache under ``key``"""
         choice = response.choices[0]
         message = choice.message
 
@@ -83,8 +417,85 @@ class LLM:
                 total_tokens=response.usage.total_tokens
             )
 
-        return AIMessage(
+        result = AIMessage(
             content=message.content,
             tool_calls=message.tool_calls,
             token_usage=token_usage
         )
+        if key is not None:
+            self.cache.set(key, payload, result)
+        return result
+
+    def stream(self, input: str | BaseMessage | List[BaseMessage],
+               tool_names: Optional[Collection[str]] = None) -> Iterator[StreamEvent]:
+        """Yield text deltas, each tool call once its arguments are complete, then the AIMessage"""
+        messages = self._convert_input(input)
+        payload = self._build_payload(messages, tool_names)
+        key = self.cache.key(payload) if self.cache is not None else None
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            # Replay the cached response as one text event and its tool calls
+            if cached.content:
+                yield StreamEvent("text", content=cached.content)
+            for call in cached.tool_calls or []:
+                yield StreamEvent("tool_call", tool_call=call)
+            yield StreamEvent("message", message=cached)
+            return
+        request = dict(payload, stream_options={"include_usage": True})
+        text: List[str] = []
+        tool_calls: List[ToolCall] = []
+        current: Optional[Dict[str, Any]] = None
+        token_usage = None
+
+        charge = self._charge(payload)
+        # Rate limits and retries apply to opening the stream; once chunks flow it is not resent
+        chunks = self._request(lambda client: client.chat.completions.create(stream=True, **request), charge)
+        try:
+            for chunk in chunks:
+                if chunk.usage:
+                    token_usage = TokenUsage(
+                        prompt_tokens=chunk.usage.prompt_tokens,
+                        completion_tokens=chunk.usage.completion_tokens,
+                        total_tokens=chunk.usage.total_tokens
+                    )
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    text.append(delta.content)
+                    yield StreamEvent("text", content=delta.content)
+                # Calls are streamed one after another: a call is complete once its arguments
+                # parse, or at the latest when the next index starts
+                for fragment in delta.tool_calls or []:
+                    if current is None or fragment.index != current["index"]:
+                        if current is not None and not current["done"]:
+                            tool_calls.append(_assemble_tool_call(current))
+                            yield StreamEvent("tool_call", tool_call=tool_calls[-1])
+                        current = {"index": fragment.index, "id": fragment.id, "name": "",
+                                   "arguments": [], "done": False}
+                    if fragment.function and not current["done"]:
+                        current["name"] += fragment.function.name or ""
+                        current["arguments"].append(fragment.function.arguments or "")
+                        # Release the call as soon as its arguments parse as a whole object
+                        if _arguments_complete(current):
+                            current["done"] = True
+                            tool_calls.append(_assemble_tool_call(current))
+                            yield StreamEvent("tool_call", tool_call=tool_calls[-1])
+
+            if current is not None and not current["done"]:
+                tool_calls.append(_assemble_tool_call(current))
+                yield StreamEvent("tool_call", tool_call=tool_calls[-1])
+        finally:
+            # Also when the consumer stops early: settle with the usage seen so far
+            # and release the connection
+            chunks.close()
+            self._settle(charge, token_usage)
+
+        result = AIMessage(
+            content="".join(text) if text else None,
+            tool_calls=tool_calls or None,
+            token_usage=token_usage
+        )
+        if key is not None:
+            self.cache.set(key, payload, result)
+        yield StreamEvent("message", message=result)
@@ -1,10 +1,23 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Mapping
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 import copy
+import json
+import sqlite3
+import threading
+import time
 
 from lib.documents import Document, Corpus
 from lib.vector_db import VectorStoreManager,QueryResult
+from lib.serialization import to_jsonable, from_jsonable
+from lib.archive import run_to_dict, run_from_dict
+from lib.state_machine import Run
+
+
+DEFAULT_MAX_SESSIONS = 10_000
 
 
 class SessionNotFoundError(Exception):
@@ -12,17 +25,379 @@ class SessionNotFoundError(Exception):
     pass
 
 
+class SessionStore(ABC):
+    """Storage backend of ShortTermMemory: an ordered list of objects per session.
+
+    Stores hand out objects the caller may modify freely: they never return
+    the instance they keep internally.
+    """
+
+    @abstractmethod
+    def create(self, session_id: str) -> bool:
+        """Create an empty session; False if it already exists"""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Delete a session; False if it didn't exist"""
+        raise NotImplementedError()
+
+    @abstractmethod
+    def __contains__(self, session_id: str) -> bool:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def session_ids(self) -> List[str]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def append(self, session_id: str, obj: Any):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def objects(self, session_id: str) -> List[Any]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def last(self, session_id: str) -> Optional[Any]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def pop(self, session_id: str) -> Optional[Any]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    def clear(self, session_id: str):
+        """Remove every object of a session, keeping the session"""
+        raise NotImplementedError()
+
+
+class InMemorySessionStore(SessionStore):
+    """Sessions kept in process memory, bounded in number and idle time.
+
+    Args:
+        max_sessions: Sessions kept at most; the least recently used one is
+            evicted beyond that (None: unbounded)
+        ttl: Seconds a session may stay unused before it expires (None: never)
+        max_objects: Objects kept per session, oldest dropped first (None: all)
+        clock: Time source, in seconds
+    """
+
+    def __init__(self, max_sessions: Optional[int] = DEFAULT_MAX_SESSIONS,
+                 ttl: Optional[float] = None, max_objects: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_objects = max_objects
+        self.clock = clock
+        self.evicted = 0
+        # Least recently used first; values are (last access time, objects)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __repr__(self) -> str:
+        return f"InMemorySessionStore(sessions={len(self._sessions)}, max_sessions={self.max_sessions}, ttl={self.ttl})"
+
+    def _expire(self):
+        # Least recently used sessions come first, so expired ones form a prefix
+        if self.ttl is None:
+            return
+        deadline = self.clock() - self.ttl
+        while self._sessions:
+            session_id, (touched, _) = next(iter(self._sessions.items()))
+            if touched > deadline:
+                break
+            del self._sessions[session_id]
+            self.evicted += 1
+
+    def _evict(self):
+        if self.max_sessions is None:
+            return
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def _touch(self, session_id: str) -> Optional[List[Any]]:
+        self._expire()
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        self._sessions[session_id] = (self.clock(), entry[1])
+        self._sessions.move_to_end(session_id)
+        return entry[1]
+
+    def create(self, session_id: str) -> bool:
+        with self._lock:
+            if self._touch(session_id) is not None:
+                return False
+            self._sessions[session_id] = (self.clock(), [])
+            self._evict()
+            return True
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            self._expire()
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            self._expire()
+            return list(self._sessions)
+
+    def append(self, session_id: str, obj: Any):
+        obj = copy.deepcopy(obj)
+        with self._lock:
+            objects = self._touch(session_id)
+            if objects is None:
+                raise SessionNotFoundError(f"Session '{session_id}' not found")
+            objects.append(obj)
+            if self.max_objects is not None:
+                del objects[:-self.max_objects]
+
+    def objects(self, session_id: str) -> List[Any]:
+        with self._lock:
+            objects = list(self._touch(session_id) or [])
+        return [copy.deepcopy(obj) for obj in objects]
+
+    def last(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            objects = self._touch(session_id)
+            obj = objects[-1] if objects else None
+        return copy.deepcopy(obj)
+
+    def pop(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            objects = self._touch(session_id)
+            return objects.pop() if objects else None
+
+    def clear(self, session_id: str):
+        with self._lock:
+            objects = self._touch(session_id)
+            if objects is not None:
+                objects.clear()
+
+
+class SqliteSessionStore(SessionStore):
+    """Sessions kept in a SQLite file, so they survive restarts and leave the heap.
+
+    Objects are encoded with `lib.serialization`; Runs are encoded with
+    `lib.archive`. Expiry and eviction work as in InMemorySessionStore, with
+    wall-clock time so they carry over between processes.
+    """
+
+    def __init__(self, path: str, max_sessions: Optional[int] = None,
+                 ttl: Optional[float] = None, max_objects: Optional[int] = None,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_objects = max_objects
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY, touched REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched);
+                CREATE TABLE IF NOT EXISTS session_objects (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS session_objects_session ON session_objects (session_id, id);
+            """)
+
+    def __repr__(self) -> str:
+        return f"SqliteSessionStore('{self.path}', max_sessions={self.max_sessions}, ttl={self.ttl})"
+
+    @staticmethod
+    def _encode(obj: Any) -> tuple:
+        if isinstance(obj, Run):
+            return "run", json.dumps(run_to_dict(obj), separators=(",", ":"))
+        return "value", json.dumps(to_jsonable(obj), separators=(",", ":"))
+
+    @staticmethod
+    def _decode(kind: str, value: str) -> Any:
+        if kind == "run":
+            return run_from_dict(json.loads(value))
+        return from_jsonable(json.loads(value))
+
+    def _expire(self):
+        if self.ttl is None:
+            return
+        expired = "SELECT session_id FROM sessions WHERE touched <= ?"
+        deadline = self.clock() - self.ttl
+        self._connection.execute(f"DELETE FROM session_objects WHERE session_id IN ({expired})", (deadline,))
+        self._connection.execute("DELETE FROM sessions WHERE touched <= ?", (deadline,))
+
+    def _evict(self):
+        if self.max_sessions is None:
+            return
+        oldest = "SELECT session_id FROM sessions ORDER BY touched DESC LIMIT -1 OFFSET ?"
+        self._connection.execute(f"DELETE FROM session_objects WHERE session_id IN ({oldest})", (self.max_sessions,))
+        self._connection.execute(f"DELETE FROM sessions WHERE session_id IN ({oldest})", (self.max_sessions,))
+
+    def _touch(self, session_id: str) -> bool:
+        self._expire()
+        cursor = self._connection.execute(
+            "UPDATE sessions SET touched = ? WHERE session_id = ?", (self.clock(), session_id)
+        )
+        return cursor.rowcount > 0
+
+    def create(self, session_id: str) -> bool:
+        with self._lock, self._connection:
+            if self._touch(session_id):
+                return False
+            self._connection.execute(
+                "INSERT INTO sessions (session_id, touched) VALUES (?, ?)", (session_id, self.clock())
+            )
+            self._evict()
+            return True
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM session_objects WHERE session_id = ?", (session_id,))
+            cursor = self._connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            return cursor.rowcount > 0
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock, self._connection:
+            self._expire()
+            row = self._connection.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            return row is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def session_ids(self) -> List[str]:
+        with self._lock, self._connection:
+            self._expire()
+            rows = self._connection.execute("SELECT session_id FROM sessions ORDER BY touched").fetchall()
+            return [row[0] for row in rows]
+
+    def append(self, session_id: str, obj: Any):
+        kind, value = self._encode(obj)
+        with self._lock, self._connection:
+            if not self._touch(session_id):
+                raise SessionNotFoundError(f"Session '{session_id}' not found")
+            self._connection.execute(
+                "INSERT INTO session_objects (session_id, kind, value) VALUES (?, ?, ?)",
+                (session_id, kind, value),
+            )
+            if self.max_objects is not None:
+                self._connection.execute(
+                    "DELETE FROM session_objects WHERE session_id = ? AND id NOT IN "
+                    "(SELECT id FROM session_objects WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                    (session_id, session_id, self.max_objects),
+                )
+
+    def objects(self, session_id: str) -> List[Any]:
+        with self._lock, self._connection:
+            self._touch(session_id)
+            rows = self._connection.execute(
+                "SELECT kind, value FROM session_objects WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+        return [self._decode(kind, value) for kind, value in rows]
+
+    def _last_row(self, session_id: str) -> Optional[tuple]:
+        return self._connection.execute(
+            "SELECT id, kind, value FROM session_objects WHERE session_id = ? ORDER BY id DESC LIMIT 1",
+            (session_id,),
+        ).fetchone()
+
+    def last(self, session_id: str) -> Optional[Any]:
+        with self._lock, self._connection:
+            self._touch(session_id)
+            row = self._last_row(session_id)
+        return self._decode(row[1], row[2]) if row else None
+
+    def pop(self, session_id: str) -> Optional[Any]:
+        with self._lock, self._connection:
+            self._touch(session_id)
+            row = self._last_row(session_id)
+            if row is None:
+                return None
+            self._connection.execute("DELETE FROM session_objects WHERE id = ?", (row[0],))
+        return self._decode(row[1], row[2])
+
+    def clear(self, session_id: str):
+        with self._lock, self._connection:
+            self._touch(session_id)
+            self._connection.execute("DELETE FROM session_objects WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class _SessionsView(Mapping):
+    """Read-only ``{session_id: objects}`` view of a SessionStore.
+
+    Only the sessions actually looked up are touched, so listing or counting
+    sessions does not keep idle ones from expiring.
+    """
+
+    def __init__(self, store: SessionStore):
+        self._store = store
+
+    def __getitem__(self, session_id: str) -> List[Any]:
+        if session_id not in self._store:
+            raise KeyError(session_id)
+        return self._store.objects(session_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.session_ids())
+
+    def __len__(self) -> int:
+        return len(self._store.session_ids())
+
+    def __contains__(self, session_id: object) -> bool:
+        return session_id in self._store
+
+    def __repr__(self) -> str:
+        return f"_SessionsView({self._store!r})"
+
+
 @dataclass
 class ShortTermMemory():
-    """Manage the history of objects across multiple sessions"""
-    sessions: Dict[str, List[Any]] = field(default_factory=lambda: {})
+    """Manage the history of objects across multiple sessions
+
+    Objects live in a SessionStore. The default InMemorySessionStore keeps at
+    most DEFAULT_MAX_SESSIONS sessions, evicting the least recently used one;
+    pass a store with a ``ttl`` to also expire idle sessions, or a
+    SqliteSessionStore to keep sessions on disk. The "default" session is
+    recreated on demand if it was evicted.
+    """
+    store: SessionStore = field(default_factory=InMemorySessionStore)
 
     def __post_init__(self):
         """Initialize the default session"""
         self.create_session("default")
 
+    @property
+    def sessions(self) -> Mapping:
+        """Read-only mapping of session ids to their objects.
+
+        Kept for code written against the dict this class used to hold; the
+        lists it returns are copies, so write through `add` and `reset`.
+        """
+        return _SessionsView(self.store)
+
     def __str__(self) -> str:
-        session_ids = list(self.sessions.keys())
+        session_ids = self.store.session_ids()
         return f"Memory(sessions={session_ids})"
 
     def __repr__(self) -> str:
@@ -37,10 +412,7 @@ class ShortTermMemory():
         Returns:
             bool: True if session was created, False if it already existed
         """
-        if session_id in self.sessions:
-            return False
-        self.sessions[session_id] = []
-        return True
+        return self.store.create(session_id)
 
     def delete_session(self, session_id: str) -> bool:
         """Delete a session
@@ -56,10 +428,7 @@ class ShortTermMemory():
         """
         if session_id == "default":
             raise ValueError("Cannot delete the default session")
-        if session_id not in self.sessions:
-            return False
-        del self.sessions[session_id]
-        return True
+        return self.store.delete(session_id)
 
     def _validate_session(self, session_id: str):
         """Validate that a session exists
@@ -70,7 +439,9 @@ class ShortTermMemory():
         Raises:
             SessionNotFoundError: If session doesn't exist
         """
-        if session_id not in self.sessions:
+        if session_id == "default":
+            self.store.create("default")
+        elif session_id not in self.store:
             raise SessionNotFoundError(f"Session '{session_id}' not found")
 
     def add(self, object: Any, session_id: Optional[str] = None):
@@ -85,7 +456,7 @@ class ShortTermMemory():
         """
         session_id = session_id or "default"
         self._validate_session(session_id)
-        self.sessions[session_id].append(copy.deepcopy(object))
+        self.store.append(session_id, object)
 
     def get_all_objects(self, session_id: Optional[str] = None) -> List[Any]:
         """Get all objects for a session
@@ -101,7 +472,7 @@ class ShortTermMemory():
         """
         session_id = session_id or "default"
         self._validate_session(session_id)
-        return [copy.deepcopy(obj) for obj in self.sessions[session_id]]
+        return self.store.objects(session_id)
 
     def get_last_object(self, session_id: Optional[str] = None) -> Optional[Any]:
         """Get the most recent object for a session
@@ -115,12 +486,13 @@ class ShortTermMemory():
         Raises:
             SessionNotFoundError: If specified session doesn't exist
         """
-        objects = self.get_all_objects(session_id)
-        return objects[-1] if objects else None
+        session_id = session_id or "default"
+        self._validate_session(session_id)
+        return self.store.last(session_id)
 
     def get_all_sessions(self) -> List[str]:
         """Get all session IDs"""
-        return list(self.sessions.keys())
+        return self.store.session_ids()
 
     def reset(self, session_id: Optional[str] = None):
         """Reset memory for a specific session or all sessions
@@ -133,11 +505,11 @@ class ShortTermMemory():
         """
         if session_id is None:
             # Reset all sessions to empty lists
-            for sid in self.sessions:
-                self.sessions[sid] = []
+            for sid in self.store.session_ids():
+                self.store.clear(sid)
         else:
             self._validate_session(session_id)
-            self.sessions[session_id] = []
+            self.store.clear(session_id)
 
     def pop(self, session_id: Optional[str] = None) -> Optional[Any]:
         """Remove and return the last object from a session
@@ -153,10 +525,7 @@ class ShortTermMemory():
         """
         session_id = session_id or "default"
         self._validate_session(session_id)
-        
-        if not self.sessions[session_id]:
-            return None
-        return self.sessions[session_id].pop()
+        return self.store.pop(session_id)
 
 @dataclass
 class MemoryFragment:
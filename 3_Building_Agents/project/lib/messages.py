@@ -39,6 +39,12 @@ class AIMessage(BaseMessage):
     tool_calls: Optional[List[ToolCall]] = None
     token_usage: Optional[TokenUsage] = None
 
+    def dict(self) -> Dict:
+        """Message as sent to the model; token_usage is bookkeeping only"""
+        message = dict(self)
+        del message["token_usage"]
+        return message
+
 
 AnyMessage = Union[
     SystemMessage,
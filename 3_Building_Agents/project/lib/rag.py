@@ -1,10 +1,11 @@
-from typing import TypedDict, List
+from typing import TypedDict, List, Union
 import logging
 
 from lib.state_machine import StateMachine, Step, EntryPoint, Termination, Run, Resource
 from lib.llm import LLM
 from lib.messages import BaseMessage, UserMessage, SystemMessage
 from lib.vector_db import VectorStore
+from lib.caching import Cache
 
 
 logging.getLogger('pdfminer').setLevel(logging.ERROR)
@@ -31,9 +32,17 @@ class RAG:
     
     The RAG pattern enhances LLM responses by providing relevant external knowledge,
     reducing hallucinations and improving factual accuracy.
+    
+    Pass ``step_cache`` (True for an in-memory LRU, or a Cache such as a
+    SqliteCache) to memoize the retrieve and augment steps, which only depend
+    on the question for a given vector store.
     """
-    def __init__(self, llm: LLM, vector_store: VectorStore):
+    def __init__(self, llm: LLM, vector_store: VectorStore,
+                 step_cache: Union[bool, Cache] = False):
+        self.step_cache = step_cache
         self.workflow = self._create_state_machine()
+        # Same pipeline whose generate step awaits LLM.ainvoke, run by ainvoke()
+        self.async_workflow = self._create_state_machine(asynchronous=True)
         self.resource = Resource(
             vars = {
                 "llm": llm,
@@ -79,14 +88,22 @@ class RAG:
             "messages": state["messages"] + [ai_message],
         }
 
-    def _create_state_machine(self) -> StateMachine[RAGState]:
+    async def _agenerate(self, state:RAGState, resource:Resource) -> RAGState:
+        llm:LLM = resource.vars.get("llm")
+        ai_message = await llm.ainvoke(state["messages"])
+        return {
+            "answer": ai_message.content, 
+            "messages": state["messages"] + [ai_message],
+        }
+
+    def _create_state_machine(self, asynchronous: bool = False) -> StateMachine[RAGState]:
         machine = StateMachine[RAGState](RAGState)
 
         # Create steps
         entry = EntryPoint[RAGState]()
-        retrieve = Step[RAGState]("retrieve", self._retrieve)
-        augment = Step[RAGState]("augment", self._augment)
-        generate = Step[RAGState]("generate", self._generate)
+        retrieve = Step[RAGState]("retrieve", self._retrieve, cache=self.step_cache)
+        augment = Step[RAGState]("augment", self._augment, cache=self.step_cache)
+        generate = Step[RAGState]("generate", self._agenerate if asynchronous else self._generate)
         termination = Termination[RAGState]()
 
         machine.add_steps([entry, retrieve, augment, generate, termination])
@@ -125,3 +142,56 @@ class RAG:
             resource = self.resource,
         )
         return run_object
+
+    def invoke_many(self, queries: List[str], max_concurrency: int = 4) -> List[Run]:
+        """
+        Execute the RAG pipeline for a list of queries concurrently.
+        
+        All queries share the same compiled workflow, LLM and vector store.
+        
+        Args:
+            queries (List[str]): The questions to answer
+            max_concurrency (int): Maximum number of pipelines running at once
+            
+        Returns:
+            List[Run]: One execution object per query, in the same order as ``queries``
+            
+        Example:
+            >>> runs = rag.invoke_many(["What is RAG?", "What is a vector store?"])
+            >>> answers = [run.get_final_state()["answer"] for run in runs]
+        """
+        
+        initial_states: List[RAGState] = [{"question": query} for query in queries]
+        return self.workflow.run_many(
+            states = initial_states,
+            resource = self.resource,
+            max_concurrency = max_concurrency,
+        )
+
+    async def ainvoke(self, query: str) -> Run:
+        """
+        Async counterpart of invoke(), driven by StateMachine.arun.
+        
+        The LLM call is awaited on the event loop (LLM.ainvoke), so many
+        concurrent queries do not each hold a worker thread while the model
+        answers; retrieval still runs in a worker thread.
+        
+        Args:
+            query (str): The user's question or search query
+            
+        Returns:
+            Run: Execution object containing the final state and pipeline results
+            
+        Example:
+            >>> result = await rag.ainvoke("What is machine learning?")
+            >>> answer = result.get_final_state()["answer"]
+        """
+        
+        initial_state: RAGState = {
+            "question": query,
+        }
+        run_object = await self.async_workflow.arun(
+            state = initial_state, 
+            resource = self.resource,
+        )
+        return run_object
@@ -0,0 +1,217 @@
+"""JSON-safe encoding of workflow state values.
+
+Checkpointers persist snapshot deltas as JSON, but workflow state holds more
+than plain JSON types: pydantic messages, OpenAI tool-call objects, datetimes.
+`to_jsonable` turns such values into tagged JSON structures and `from_jsonable`
+restores them:
+
+- JSON primitives, lists and string-keyed dicts pass through unchanged.
+- Pydantic models are stored as their import path plus encoded field values
+  and rebuilt with `model_construct`, so nested objects (e.g. the tool calls
+  inside an `AIMessage`) come back as objects rather than plain dicts.
+- datetimes/dates become ISO strings, tuples and sets keep their type.
+- Anything else falls back to base64-encoded pickle.
+
+Passing a `ModelTable` stores every distinct pydantic model once in the table
+and leaves only ``{"__type__": "ref", "id": n}`` references in the encoded
+value, so a message shared by many snapshots is written a single time.
+
+Only decode data you wrote yourself: model paths are imported and pickles
+are loaded as-is.
+"""
+
+import base64
+import datetime
+import importlib
+import pickle
+import json
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+
+
+TAG = "__type__"
+
+
+def class_path(cls: type) -> str:
+    """``module:QualName`` path of a class, as accepted by import_class()"""
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def import_class(path: str) -> type:
+    """Import the class named by a class_path() string"""
+    module_name, qualname = path.split(":", 1)
+    obj: Any = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+class ModelTable:
+    """Deduplicated encodings of the pydantic models met while encoding.
+
+    Models are matched by identity first and by encoded content second. Each
+    entry is ``[class index, fields]``; class paths are listed once in
+    ``classes`` and fields still holding their declared default are left out.
+    Entries only reference earlier entries, so ``decode()`` can rebuild them
+    in order.
+    """
+
+    def __init__(self, entries: Optional[List[Any]] = None, classes: Optional[List[str]] = None):
+        self.entries: List[Any] = list(entries or [])
+        self.classes: List[str] = list(classes or [])
+        self._class_index: Dict[type, int] = {}
+        self._by_identity: Dict[int, int] = {}
+        self._by_content: Dict[str, int] = {}
+        self._alive: List[Any] = []  # Keeps ids in _by_identity from being reused
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, model: BaseModel) -> int:
+        """Index of ``model`` in the table, encoding it on first sight"""
+        index = self._by_identity.get(id(model))
+        if index is not None:
+            return index
+        cls = type(model)
+        class_index = self._class_index.get(cls)
+        if class_index is None:
+            class_index = self._class_index[cls] = len(self.classes)
+            self.classes.append(class_path(cls))
+        fields = {
+            name: to_jsonable(value, self)
+            for name, value in _model_fields(model).items()
+            if name not in cls.model_fields or not _is_default(cls.model_fields[name], value)
+        }
+        encoded = [class_index, fields]
+        key = json.dumps(encoded, sort_keys=True, separators=(",", ":"))
+        index = self._by_content.get(key)
+        if index is None:
+            index = len(self.entries)
+            self.entries.append(encoded)
+            self._by_content[key] = index
+        self._by_identity[id(model)] = index
+        self._alive.append(model)
+        return index
+
+    def decode(self) -> List[Any]:
+        """Rebuild every model, to be passed as ``refs`` to from_jsonable()"""
+        classes = [import_class(path) for path in self.classes]
+        refs: List[Any] = []
+        for class_index, fields in self.entries:
+            refs.append(_construct(
+                classes[class_index],
+                {name: from_jsonable(value, refs) for name, value in fields.items()},
+            ))
+        return refs
+
+
+def _construct(cls: type, fields: Dict[str, Any]) -> BaseModel:
+    """Build a model from trusted field values without validation.
+
+    Equivalent to pydantic's ``model_construct`` but skips the per-field type
+    coercion some subclasses add to it (e.g. OpenAI response models).
+    """
+    if cls.__private_attributes__ or cls.__pydantic_root_model__:
+        return cls.model_construct(**fields)
+    values: Dict[str, Any] = {}
+    for name, field_info in cls.model_fields.items():
+        if name in fields:
+            values[name] = fields[name]
+        elif not field_info.is_required():
+            values[name] = field_info.get_default(call_default_factory=True)
+    extra = {name: value for name, value in fields.items() if name not in cls.model_fields}
+    model = cls.__new__(cls)
+    object.__setattr__(model, "__dict__", values)
+    object.__setattr__(model, "__pydantic_fields_set__", set(fields) - set(extra))
+    object.__setattr__(model, "__pydantic_extra__", extra if cls.model_config.get("extra") == "allow" else None)
+    object.__setattr__(model, "__pydantic_private__", None)
+    return model
+
+
+def _model_fields(value: BaseModel) -> Dict[str, Any]:
+    fields = dict(value.__dict__)
+    fields.update(value.__pydantic_extra__ or {})
+    return fields
+
+
+def _is_default(field_info: Any, value: Any) -> bool:
+    default = field_info.default
+    if default is PydanticUndefined or field_info.default_factory is not None:
+        return False
+    return type(value) is type(default) and value == default
+
+
+def _encode_model(value: BaseModel, table: Optional[ModelTable]) -> Dict[str, Any]:
+    return {
+        TAG: "model",
+        "class": class_path(type(value)),
+        "fields": {name: to_jsonable(item, table) for name, item in _model_fields(value).items()},
+    }
+
+
+def to_jsonable(value: Any, table: Optional[ModelTable] = None) -> Any:
+    """Encode ``value`` into a structure made only of JSON types.
+
+    Args:
+        table: Optional ModelTable receiving pydantic models, which are then
+            encoded as references into the table
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [to_jsonable(item, table) for item in value]
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value) and TAG not in value:
+            return {key: to_jsonable(item, table) for key, item in value.items()}
+        return {TAG: "dict", "items": [[to_jsonable(k, table), to_jsonable(v, table)] for k, v in value.items()]}
+    if isinstance(value, BaseModel):
+        if table is not None:
+            return {TAG: "ref", "id": table.add(value)}
+        return _encode_model(value, None)
+    if isinstance(value, datetime.datetime):
+        return {TAG: "datetime", "value": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {TAG: "date", "value": value.isoformat()}
+    if isinstance(value, tuple):
+        return {TAG: "tuple", "items": [to_jsonable(item, table) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {TAG: type(value).__name__, "items": [to_jsonable(item, table) for item in value]}
+    return {TAG: "pickle", "value": base64.b64encode(pickle.dumps(value)).decode("ascii")}
+
+
+def from_jsonable(data: Any, refs: Optional[List[Any]] = None) -> Any:
+    """Decode a structure produced by ``to_jsonable``.
+
+    Args:
+        refs: Decoded models of the ModelTable used for encoding, if any
+    """
+    if isinstance(data, list):
+        return [from_jsonable(item, refs) for item in data]
+    if not isinstance(data, dict):
+        return data
+    tag = data.get(TAG)
+    if tag is None:
+        return {key: from_jsonable(item, refs) for key, item in data.items()}
+    if tag == "ref":
+        return refs[data["id"]]
+    if tag == "dict":
+        return {from_jsonable(k, refs): from_jsonable(v, refs) for k, v in data["items"]}
+    if tag == "model":
+        cls = import_class(data["class"])
+        fields: Dict[str, Any] = {name: from_jsonable(item, refs) for name, item in data["fields"].items()}
+        return cls.model_construct(**fields)
+    if tag == "datetime":
+        return datetime.datetime.fromisoformat(data["value"])
+    if tag == "date":
+        return datetime.date.fromisoformat(data["value"])
+    if tag == "tuple":
+        return tuple(from_jsonable(item, refs) for item in data["items"])
+    if tag == "set":
+        return {from_jsonable(item, refs) for item in data["items"]}
+    if tag == "frozenset":
+        return frozenset(from_jsonable(item, refs) for item in data["items"])
+    if tag == "pickle":
+        return pickle.loads(base64.b64decode(data["value"]))
+    raise ValueError(f"Unknown serialization tag: {tag}")
@@ -0,0 +1,160 @@
+"""Relevance ranking of tools, to send only the schemas a request needs.
+
+Every tool registered with an LLM adds its JSON schema to each request; with
+large tool sets that is thousands of prompt tokens per iteration of the tool
+loop. A `ToolSelector` ranks the tools against the user query so the Agent
+can send only the top-k schemas:
+
+- `TfidfToolSelector` (default): TF-IDF cosine similarity over the tools'
+  names, descriptions and parameters. Pure Python, no dependencies.
+- `EmbeddingToolSelector`: cosine similarity of embeddings, from any
+  embedding function (e.g. a Chroma `EmbeddingFunction`); defaults to
+  Chroma's local MiniLM model when chromadb is installed.
+
+Selectors are fitted once per tool set; ranking a query is then local and
+cheap (TF-IDF) or one embedding call (embeddings).
+"""
+
+import math
+import re
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from lib.tooling import Tool
+
+# embed(texts) -> one vector per text
+EmbeddingFunction = Callable[[List[str]], Sequence[Sequence[float]]]
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do for from get how i in is it me my of on or "
+    "please show so than that the this to was what when where which who will with you your".split()
+)
+
+
+def tool_text(tool: Tool) -> str:
+    """Text describing ``tool`` for ranking: name, description and parameters"""
+    function = tool.dict()["function"]
+    parts = [function["name"].replace("_", " "), function.get("description") or ""]
+    for name, spec in function.get("parameters", {}).get("properties", {}).items():
+        parts.append(name.replace("_", " "))
+        parts.append(spec.get("description") or "")
+    return " ".join(parts)
+
+
+def stem(word: str) -> str:
+    """Crude suffix strip so word forms meet ("reminders", "reminded" -> "remind")"""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    for suffix in ("ing", "er", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if len(word) > 3 and word.endswith("e") else word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, stemmed word tokens without stopwords"""
+    return [stem(w) for w in _WORD.findall(text.lower()) if w not in STOPWORDS]
+
+
+def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return {k: v / norm for k, v in vector.items()} if norm else vector
+
+
+class ToolSelector(ABC):
+    """Ranks a fitted tool set against a query"""
+
+    def __init__(self):
+        self.names: List[str] = []
+
+    def fit(self, tools: List[Tool]) -> "ToolSelector":
+        """Index ``tools``; returns the selector"""
+        self.names = [tool.name for tool in tools]
+        self._index([tool_text(tool) for tool in tools])
+        return self
+
+    @abstractmethod
+    def _index(self, texts: List[str]):
+        """Prepare the per-tool representations of ``texts`` (one per tool)"""
+
+    @abstractmethod
+    def _scores(self, query: str) -> List[float]:
+        """Similarity of ``query`` to each fitted tool, in fit order"""
+
+    def rank(self, query: str) -> List[Tuple[str, float]]:
+        """(tool name, score) pairs, most relevant first; ties keep fit order"""
+        scores = self._scores(query)
+        order = sorted(range(len(self.names)), key=lambda i: -scores[i])
+        return [(self.names[i], scores[i]) for i in order]
+
+    def select(self, query: str, k: int) -> List[str]:
+        """Names of the ``k`` tools most relevant to ``query``, in fit order.
+
+        Tools scoring zero are left out even when fewer than ``k`` remain.
+        When no tool scores above zero, the query gives no ground to drop
+        any tool and every name is returned.
+        """
+        ranked = self.rank(query)
+        if not ranked or ranked[0][1] <= 0:
+            return list(self.names)
+        top = {name for name, score in ranked[:k] if score > 0}
+        return [name for name in self.names if name in top]
+
+
+class TfidfToolSelector(ToolSelector):
+    """TF-IDF cosine similarity between the query and each tool's text"""
+
+    def _index(self, texts: List[str]):
+        documents = [Counter(tokenize(text)) for text in texts]
+        df = Counter(word for document in documents for word in document)
+        n = len(documents)
+        self.idf = {word: math.log((1 + n) / (1 + count)) + 1 for word, count in df.items()}
+        self.vectors = [self._vector(document) for document in documents]
+
+    def _vector(self, counts: Counter) -> Dict[str, float]:
+        return _normalize({
+            word: (1 + math.log(count)) * self.idf[word]
+            for word, count in counts.items() if word in self.idf
+        })
+
+    def _scores(self, query: str) -> List[float]:
+        query_vector = self._vector(Counter(tokenize(query)))
+        return [
+            sum(weight * vector.get(word, 0.0) for word, weight in query_vector.items())
+            for vector in self.vectors
+        ]
+
+
+class EmbeddingToolSelector(ToolSelector):
+    """Cosine similarity between embeddings of the query and of each tool's text.
+
+    Args:
+        embedding_function: Called with a list of texts, returns one vector
+            per text. Defaults to Chroma's local embedding model (requires
+            chromadb; the model is downloaded on first use).
+    """
+
+    def __init__(self, embedding_function: Optional[EmbeddingFunction] = None):
+        super().__init__()
+        if embedding_function is None:
+            from chromadb.utils import embedding_functions
+            embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        self.embedding_function = embedding_function
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for vector in self.embedding_function(texts):
+            vector = [float(x) for x in vector]
+            norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+            vectors.append([x / norm for x in vector])
+        return vectors
+
+    def _index(self, texts: List[str]):
+        self.vectors = self._embed(texts) if texts else []
+
+    def _scores(self, query: str) -> List[float]:
+        query_vector = self._embed([query])[0]
+        return [sum(a * b for a, b in zip(query_vector, vector)) for vector in self.vectors]
@@ -1,5 +1,6 @@
 import inspect
 import datetime
+import threading
 from typing import (
     Any, Callable, 
     Literal, Optional, Union, TypeAlias,
@@ -17,7 +18,8 @@ class Tool:
         self,
         func: Callable,
         name: Optional[str] = None,
-        description: Optional[str] = None
+        description: Optional[str] = None,
+        max_concurrency: Optional[int] = None
     ):
         self.func = func
         self.name = name or func.__name__
@@ -25,6 +27,11 @@ class Tool:
         self.signature = inspect.signature(func, eval_str=True)
         self.type_hints = get_type_hints(func)
 
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
         self.parameters = [
             self._build_param_schema(key, param)
             for key, param in self.signature.parameters.items()
@@ -103,7 +110,10 @@ class Tool:
         }
 
     def __call__(self, *args, **kwargs):
-        return self.func(*args, **kwargs)
+        if self._semaphore is None:
+            return self.func(*args, **kwargs)
+        with self._semaphore:
+            return self.func(*args, **kwargs)
 
     def __repr__(self):
         return f"<Tool name={self.name} params={[p['name'] for p in self.parameters]}>"
@@ -114,12 +124,13 @@ class Tool:
 
 
 
-def tool(func=None, *, name: str = None, description: str = None):
+def tool(func=None, *, name: str = None, description: str = None,
+         max_concurrency: Optional[int] = None):
     def wrapper(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
             return f(*args, **kwargs)
-        return Tool(f, name=name, description=description)
+        return Tool(f, name=name, description=description, max_concurrency=max_concurrency)
     
     # @tool ou @tool(name="foo")
     return wrapper(func) if func else wrapper
\ No newline at end of file
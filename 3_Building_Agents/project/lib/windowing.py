@@ -0,0 +1,209 @@
+"""Token-budgeted windows over a growing conversation.
+
+`window_messages` fits a message history into a token budget:
+
+- leading system messages (the agent's instructions) are kept verbatim;
+- the most recent turns (a user message and the replies and tool calls it
+  led to) are kept verbatim, newest first, while they fit;
+- older turns are folded into a rolling summary, kept as a system
+  message right after the instructions, by a caller-supplied `summarize`
+  function (or simply dropped when none is given).
+
+Turns are kept or trimmed as a whole, so an assistant message carrying tool
+calls always travels with the tool messages answering it: the window never
+holds a tool result without its call (which the API rejects) or a call
+without its results.
+
+Tokens are counted with `tiktoken` when it is installed and estimated from
+the text length (about 4 characters per token) otherwise.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+from lib.messages import BaseMessage, SystemMessage, ToolMessage, UserMessage
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+SUMMARY_TOKENS = 200  # room reserved for the summary when history is trimmed
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators of the chat format
+CHARS_PER_TOKEN = 4
+
+# summarize(previous_summary, messages_to_fold) -> new summary text
+Summarizer = Callable[[Optional[str], List[BaseMessage]], str]
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: Optional[str], model: str = "gpt-4o-mini") -> int:
+    """Number of tokens of ``text`` for ``model`` (estimated without tiktoken)"""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(_encoding(model).encode(text))
+
+
+def message_tokens(message: BaseMessage, model: str = "gpt-4o-mini") -> int:
+    """Tokens ``message`` takes in a prompt, tool-call names and arguments included"""
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.content, model)
+    for call in getattr(message, "tool_calls", None) or []:
+        tokens += count_tokens(call.function.name, model) + count_tokens(call.function.arguments, model)
+    return tokens
+
+
+def is_summary(message: BaseMessage) -> bool:
+    """Whether ``message`` is a rolling summary written by `window_messages`"""
+    return isinstance(message, SystemMessage) and (message.content or "").startswith(SUMMARY_PREFIX)
+
+
+def group_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Split ``messages`` into turns, the units kept or trimmed as a whole.
+
+    A turn starts at a UserMessage and runs up to the next one, so an
+    AIMessage with tool calls always stays with the ToolMessages answering
+    it. Messages before the first UserMessage form a turn of their own.
+    """
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if not turns or isinstance(message, UserMessage):
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+@dataclass
+class ContextWindow:
+    """Outcome of `window_messages`: the kept messages and what was trimmed"""
+    messages: List[BaseMessage]
+    original_tokens: int
+    kept_tokens: int
+    trimmed_messages: int = 0
+    trimmed_tokens: int = 0
+    summarized: bool = False
+
+    def report(self) -> dict:
+        """Counters recorded in a Run's metadata"""
+        return {
+            "original_tokens": self.original_tokens,
+            "kept_tokens": self.kept_tokens,
+            "trimmed_messages": self.trimmed_messages,
+            "trimmed_tokens": self.trimmed_tokens,
+            "summarized": self.summarized,
+        }
+
+
+def window_messages(messages: List[BaseMessage], max_tokens: int,
+                    summarize: Optional[Summarizer] = None,
+                    model: str = "gpt-4o-mini",
+                    reserved_tokens: int = 0,
+                    summary_tokens: int = SUMMARY_TOKENS) -> ContextWindow:
+    """Fit ``messages`` into ``max_tokens``, summarizing what no longer fits.
+
+    Args:
+        messages: Conversation history, instructions first
+        max_tokens: Token budget of the returned window
+        summarize: Called with the previous summary (or None) and the
+            messages being trimmed; returns the new summary. Without it,
+            trimmed messages are dropped
+        model: Model whose tokenizer counts the tokens
+        reserved_tokens: Part of the budget kept free for messages the
+            caller adds afterwards (e.g. the next user query)
+        summary_tokens: Part of the budget kept for the summary when
+            messages are trimmed (ask ``summarize`` for about that length)
+
+    Returns:
+        A ContextWindow. The newest turn is always kept, even when it alone
+        exceeds the budget.
+    """
+    costs = {id(m): message_tokens(m, model) for m in messages}
+    original_tokens = sum(costs[id(m)] for m in messages)
+    budget = max_tokens - reserved_tokens
+    if original_tokens <= budget:
+        return ContextWindow(list(messages), original_tokens, original_tokens)
+
+    # Instructions and the previous summary are not part of the trimmable history
+    head = 0
+    while head < len(messages) and isinstance(messages[head], SystemMessage):
+        head += 1
+    instructions = [m for m in messages[:head] if not is_summary(m)]
+    previous = next((m for m in messages[:head] if is_summary(m)), None)
+    previous_summary = previous.content[len(SUMMARY_PREFIX):] if previous else None
+
+    turns = group_turns(messages[head:])
+    fixed = sum(costs[id(m)] for m in instructions)
+    if summarize is not None:
+        fixed += summary_tokens
+    elif previous is not None:
+        fixed += costs[id(previous)]
+
+    kept_turns = 0
+    kept_tokens = 0
+    for turn in reversed(turns):
+        turn_tokens = sum(costs[id(m)] for m in turn)
+        if kept_turns and fixed + kept_tokens + turn_tokens > budget:
+            break
+        kept_turns += 1
+        kept_tokens += turn_tokens
+    kept = [m for turn in turns[len(turns) - kept_turns:] for m in turn]
+    trimmed = [m for turn in turns[:len(turns) - kept_turns] for m in turn]
+
+    window = instructions
+    summarized = False
+    if trimmed and summarize is not None:
+        summary = summarize(previous_summary, trimmed)
+        window = window + [SystemMessage(content=SUMMARY_PREFIX + summary)]
+        summarized = True
+    elif previous is not None:
+        window = window + [previous]
+    window = window + kept
+
+    return ContextWindow(
+        messages=window,
+        original_tokens=original_tokens,
+        kept_tokens=sum(message_tokens(m, model) for m in window),
+        trimmed_messages=len(trimmed),
+        trimmed_tokens=sum(costs[id(m)] for m in trimmed),
+        summarized=summarized,
+    )
+
+
+def format_transcript(messages: List[BaseMessage]) -> str:
+    """Plain-text transcript of ``messages`` for a summarization prompt"""
+    lines = []
+    for message in messages:
+        if is_summary(message):
+            continue
+        for call in getattr(message, "tool_calls", None) or []:
+            lines.append(f"assistant called {call.function.name}({call.function.arguments})")
+        if message.content:
+            role = f"tool {message.name}" if isinstance(message, ToolMessage) else message.role
+            lines.append(f"{role}: {message.content}")
+    return "\n".join(lines)
+
+
+def summary_prompt(previous_summary: Optional[str], messages: List[BaseMessage],
+                   max_words: int = 120) -> List[BaseMessage]:
+    """Messages asking an LLM to fold ``messages`` into ``previous_summary``"""
+    return [
+        SystemMessage(content="You maintain a running summary of a conversation between a user and an AI agent."),
+        UserMessage(content=(
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"Messages to fold into it:\n{format_transcript(messages)}\n\n"
+            f"Return the updated summary in at most {max_words} words. Keep facts, "
+            "results of tool calls, decisions and open questions; drop pleasantries."
+        )),
+    ]
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# The tests exercise one copy of the course library: exercises/lib by
+# default, or the one named by LIB_TREE (e.g. LIB_TREE=project).
+# test_project_copy.py reruns the suite against project/lib.
+LIB_TREE = os.environ.get("LIB_TREE", "exercises")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", LIB_TREE))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "exercises_only: covers a feature project/lib does not have")
+
+
+def pytest_collection_modifyitems(config, items):
+    if LIB_TREE == "exercises":
+        return
+    skip = pytest.mark.skip(reason="feature of exercises/lib only")
+    for item in items:
+        if "exercises_only" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,301 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import lib.agents as agents
+from lib.messages import AIMessage, TokenUsage
+from lib.tooling import ToolCall, tool
+
+
+@tool
+def lookup(query: int) -> str:
+    """Look something up"""
+    return f"result {query}"
+
+
+class ScriptedLLM:
+    """Stands in for LLM: asks for a new lookup on every call while it has tools"""
+    usage = None
+    async_threads = set()
+
+    def __init__(self, *args, tools=None, **kwargs):
+        self.tools = tools
+        self.ids = itertools.count()
+
+    def invoke(self, messages, *args, **kwargs):
+        if not self.tools:
+            return AIMessage(content="final answer", token_usage=self.usage)
+        i = next(self.ids)
+        call = ToolCall(id=f"call-{i}", type="function",
+                        function={"name": "lookup", "arguments": json.dumps({"query": i})})
+        return AIMessage(content=None, tool_calls=[call], token_usage=self.usage)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        ScriptedLLM.async_threads.add(threading.current_thread())
+        return self.invoke(messages)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setattr(agents, "LLM", ScriptedLLM)
+    return ScriptedLLM
+
+
+def budget_of(run):
+    return run.metadata["budget"]
+
+
+def test_tool_call_budget_stops_the_loop(llm):
+    agent = agents.Agent("model", "instructions", tools=[lookup],
+                         budget=agents.RunBudget(max_tool_calls=3))
+    run = agent.invoke("question")
+
+    assert budget_of(run)["exceeded"] == "tool_calls"
+    assert budget_of(run)["tool_calls"] == 3
+    assert run.get_final_state()["messages"][-1].content == "final answer"
+
+
+def test_token_budget_counts_reported_usage(llm, monkeypatch):
+    monkeypatch.setattr(llm, "usage", TokenUsage(prompt_tokens=90, completion_tokens=10, total_tokens=100))
+    agent = agents.Agent("model", "instructions", tools=[lookup],
+                         budget=agents.RunBudget(max_tokens=250))
+    run = agent.invoke("question")
+
+    assert budget_of(run)["exceeded"] == "tokens"
+    # three tool-loop calls cross 250, then one final call without tools
+    assert budget_of(run)["tokens"] == 400
+
+
+def test_stored_ai_messages_keep_their_token_usage(llm, monkeypatch):
+    usage = TokenUsage(prompt_tokens=90, completion_tokens=10, total_tokens=100)
+    monkeypatch.setattr(llm, "usage", usage)
+    agent = agents.Agent("model", "instructions", tools=[lookup],
+                         budget=agents.RunBudget(max_tool_calls=1))
+    run = agent.invoke("question")
+
+    ai_messages = [m for m in run.get_final_state()["messages"] if m.role == "assistant"]
+    assert len(ai_messages) == 2
+    assert all(m.token_usage == usage for m in ai_messages)
+    assert all("token_usage" not in m.dict() for m in ai_messages)
+    stored = agent.memory.get_last_object().get_final_state()["messages"]
+    assert [m.token_usage for m in stored if m.role == "assistant"] == [usage, usage]
+
+
+def test_ainvoke_awaits_the_llm_on_the_event_loop(llm, monkeypatch):
+    monkeypatch.setattr(llm, "async_threads", set())
+    agent = agents.Agent("model", "instructions", tools=[lookup],
+                         budget=agents.RunBudget(max_tool_calls=2))
+
+    async def main():
+        runs = await asyncio.gather(*(agent.ainvoke("question", session_id=str(i)) for i in range(3)))
+        return runs, threading.current_thread()
+
+    runs, loop_thread = asyncio.run(main())
+    assert llm.async_threads == {loop_thread}
+    for run in runs:
+        assert budget_of(run)["tool_calls"] == 2
+        results = [m.content for m in run.get_final_state()["messages"] if m.role == "tool"]
+        assert len(results) == 2 and all(r.startswith('"result') for r in results)
+
+
+class RepeatingLLM:
+    """Asks for the same lookup twice in one response, then again with reformatted arguments"""
+
+    def __init__(self, *args, tools=None, **kwargs):
+        self.tools = tools
+
+    def invoke(self, messages, *args, **kwargs):
+        calls = sum(1 for m in messages if m.role == "tool")
+        if calls >= 3:
+            return AIMessage(content="final answer")
+        if calls == 0:
+            arguments = ['{"query": 1}', '{"query": 1}']
+        else:
+            arguments = ['{ "query" : 1 }']
+        tool_calls = [ToolCall(id=f"call-{calls + i}", type="function",
+                               function={"name": "lookup", "arguments": args})
+                      for i, args in enumerate(arguments)]
+        return AIMessage(content=None, tool_calls=tool_calls)
+
+
+def test_repeated_tool_calls_run_once(monkeypatch):
+    monkeypatch.setattr(agents, "LLM", RepeatingLLM)
+    executed = []
+
+    @tool
+    def lookup(query: int) -> str:
+        """Look something up"""
+        executed.append(query)
+        return f"result {query}"
+
+    run = agents.Agent("model", "instructions", tools=[lookup]).invoke("question")
+    tool_messages = [m for m in run.get_final_state()["messages"] if m.role == "tool"]
+
+    assert executed == [1]
+    assert tool_messages[0].content == '"result 1"'
+    assert [m.content.startswith(agents.DUPLICATE_TOOL_CALL_PREFIX + "call-0") for m in tool_messages] == [
+        False, True, True]
+    assert run.metadata["tool_dedup"]["deduplicated"] == 2
+
+
+def test_dedup_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(agents, "LLM", RepeatingLLM)
+    executed = []
+
+    @tool
+    def lookup(query: int) -> str:
+        """Look something up"""
+        executed.append(query)
+        return f"result {query}"
+
+    agents.Agent("model", "instructions", tools=[lookup], dedupe_tool_calls=False).invoke("question")
+    assert executed == [1, 1, 1]
+
+
+class FanOutLLM:
+    """Asks for ``queries`` lookups in one response, then answers"""
+    queries = [3, 2, 1, 0]
+
+    def __init__(self, *args, tools=None, **kwargs):
+        self.tools = tools
+
+    def invoke(self, messages, *args, **kwargs):
+        if any(m.role == "tool" for m in messages):
+            return AIMessage(content="final answer")
+        tool_calls = [ToolCall(id=f"call-{i}", type="function",
+                               function={"name": "lookup", "arguments": json.dumps({"query": query})})
+                      for i, query in enumerate(self.queries)]
+        return AIMessage(content=None, tool_calls=tool_calls)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        return self.invoke(messages)
+
+
+@pytest.fixture
+def fan_out(monkeypatch):
+    monkeypatch.setattr(agents, "LLM", FanOutLLM)
+    return FanOutLLM
+
+
+def sleepy_lookup(finished):
+    """Lookup sleeping ``query`` 25ths of a second, recording the finish order"""
+
+    @tool
+    def lookup(query: int) -> str:
+        """Look something up"""
+        time.sleep(query / 25)
+        finished.append(query)
+        return f"result {query}"
+
+    return lookup
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_concurrent_tool_results_keep_the_call_order(fan_out, asynchronous):
+    finished = []
+    agent = agents.Agent("model", "instructions", tools=[sleepy_lookup(finished)])
+    run = asyncio.run(agent.ainvoke("question")) if asynchronous else agent.invoke("question")
+
+    tool_messages = [m for m in run.get_final_state()["messages"] if m.role == "tool"]
+    assert finished == [0, 1, 2, 3]
+    assert [m.tool_call_id for m in tool_messages] == ["call-0", "call-1", "call-2", "call-3"]
+    assert [m.content for m in tool_messages] == ['"result 3"', '"result 2"', '"result 1"', '"result 0"']
+
+
+def test_tool_max_concurrency_bounds_parallel_calls(fan_out, monkeypatch):
+    monkeypatch.setattr(fan_out, "queries", [2] * 6)
+    lock, counts = threading.Lock(), {"now": 0, "peak": 0}
+
+    @tool(max_concurrency=2)
+    def lookup(query: int) -> str:
+        """Look something up"""
+        with lock:
+            counts["now"] += 1
+            counts["peak"] = max(counts["peak"], counts["now"])
+        time.sleep(query / 100)
+        with lock:
+            counts["now"] -= 1
+        return f"result {query}"
+
+    run = agents.Agent("model", "instructions", tools=[lookup], max_tool_workers=6,
+                       dedupe_tool_calls=False).invoke("question")
+
+    assert counts["peak"] == 2
+    assert sum(1 for m in run.get_final_state()["messages"] if m.role == "tool") == 6
+
+
+class SearchingLLM:
+    """Asks for a web search of ``search_query`` (if any), then answers"""
+    search_query = None
+
+    def __init__(self, *args, tools=None, **kwargs):
+        self.tools = tools
+
+    def invoke(self, messages, *args, **kwargs):
+        if not self.tools or self.search_query is None or any(m.role == "tool" for m in messages):
+            return AIMessage(content="final answer")
+        call = ToolCall(id="call-0", type="function",
+                        function={"name": "web_search", "arguments": json.dumps({"query": self.search_query})})
+        return AIMessage(content=None, tool_calls=[call])
+
+
+@pytest.fixture
+def searches(monkeypatch):
+    """Queries the web_search tool ran, in order"""
+    monkeypatch.setattr(agents, "LLM", SearchingLLM)
+    return []
+
+
+def searching_agent(searches):
+    @tool
+    def web_search(query: str) -> str:
+        """Search the web"""
+        searches.append(query)
+        return f"results for {query}"
+
+    return agents.Agent("model", "instructions", tools=[web_search], speculative_web_search=True)
+
+
+@pytest.mark.exercises_only
+def test_speculative_search_answers_the_same_query(searches, monkeypatch):
+    monkeypatch.setattr(SearchingLLM, "search_query", "question")
+    run = searching_agent(searches).invoke("question")
+
+    assert searches == ["question"]
+    messages = run.get_final_state()["messages"]
+    assert [m.content for m in messages if m.role == "tool"] == ['"results for question"']
+    assert messages[-1].content == "[Web Search Results]: results for question"
+    assert run.metadata["speculative_web_search"]["used"]
+
+
+@pytest.mark.exercises_only
+def test_speculative_search_is_not_used_for_another_query(searches, monkeypatch):
+    monkeypatch.setattr(SearchingLLM, "search_query", "something else")
+    run = searching_agent(searches).invoke("question")
+
+    assert sorted(searches) == ["question", "something else"]
+    messages = run.get_final_state()["messages"]
+    assert [m.content for m in messages if m.role == "tool"] == ['"results for something else"']
+
+
+@pytest.mark.exercises_only
+def test_speculative_search_is_discarded_when_the_run_fails(searches, monkeypatch):
+    pool, release = ThreadPoolExecutor(max_workers=1), threading.Event()
+    pool.submit(release.wait, 5)  # Keeps the speculative search queued
+    monkeypatch.setattr(agents, "_search_pool", pool)
+
+    def fail(self, messages, *args, **kwargs):
+        raise RuntimeError("LLM down")
+
+    monkeypatch.setattr(SearchingLLM, "invoke", fail)
+    with pytest.raises(RuntimeError):
+        searching_agent(searches).invoke("question")
+    release.set()
+    pool.shutdown(wait=True)
+
+    assert searches == []
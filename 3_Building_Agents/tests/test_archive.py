@@ -0,0 +1,77 @@
+import json
+from typing import Annotated, List, Optional, TypedDict
+
+import pytest
+
+from lib.archive import decode_run, encode_run, export_runs, load_runs
+from lib.messages import AIMessage, SystemMessage, TokenUsage, ToolMessage, UserMessage
+from lib.state_machine import EntryPoint, SnapshotRetention, StateMachine, Step, Termination, append
+from lib.tooling import ToolCall
+
+
+class Conversation(TypedDict):
+    messages: Annotated[List[object], append]
+    current_tool_calls: Optional[List[ToolCall]]
+    turn: int
+
+
+def conversation_run(turns, retention=None):
+    """LLM/tool loop for ``turns`` tool calls, then a final answer"""
+    machine = StateMachine[Conversation](Conversation, retention=retention)
+    entry, end = EntryPoint(), Termination()
+
+    def llm(state):
+        if state["turn"] >= turns:
+            return {"messages": [AIMessage(content="done")], "current_tool_calls": None}
+        call = ToolCall(id=f"call-{state['turn']}", type="function",
+                        function={"name": "lookup", "arguments": json.dumps({"turn": state["turn"]})})
+        usage = TokenUsage(prompt_tokens=10, completion_tokens=2, total_tokens=12)
+        return {"messages": [AIMessage(content=None, tool_calls=[call], token_usage=usage)],
+                "current_tool_calls": [call]}
+
+    def tool(state):
+        call = state["current_tool_calls"][0]
+        return {"messages": [ToolMessage(content="result", tool_call_id=call.id, name="lookup")],
+                "current_tool_calls": None, "turn": state["turn"] + 1}
+
+    llm_step, tool_step = Step("llm", llm), Step("tool", tool)
+    machine.add_steps([entry, llm_step, tool_step, end])
+    machine.connect(entry, llm_step)
+    machine.connect(llm_step, [tool_step, end], lambda state: tool_step if state["current_tool_calls"] else end)
+    machine.connect(tool_step, llm_step)
+    return machine.run({"messages": [SystemMessage(content="system"), UserMessage(content="question")],
+                        "current_tool_calls": None, "turn": 0})
+
+
+def assert_same_run(run, restored):
+    assert restored.run_id == run.run_id
+    assert restored.metadata == run.metadata
+    assert [(s.snapshot_id, s.step_id) for s in restored.snapshots] == [
+        (s.snapshot_id, s.step_id) for s in run.snapshots]
+    for original, copy in zip(run.snapshots, restored.snapshots):
+        assert [type(m) for m in copy.state_data["messages"]] == [type(m) for m in original.state_data["messages"]]
+        assert [m.model_dump() for m in copy.state_data["messages"]] == [
+            m.model_dump() for m in original.state_data["messages"]]
+        assert copy.state_data["turn"] == original.state_data["turn"]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_encode_decode_round_trip(compress):
+    run = conversation_run(3)
+    restored = decode_run(encode_run(run, compress=compress))
+
+    assert_same_run(run, restored)
+    first_call = restored.snapshots[1].state_data["current_tool_calls"][0]
+    assert isinstance(first_call, ToolCall) and first_call.function.name == "lookup"
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_export_and_load_many_runs(tmp_path, compress):
+    runs = [conversation_run(i) for i in range(4)] + [conversation_run(5, SnapshotRetention.every(3))]
+    path = str(tmp_path / "runs.archive")
+
+    assert export_runs(path, iter(runs), compress=compress) == len(runs)
+    restored = list(load_runs(path))
+    assert len(restored) == len(runs)
+    for run, copy in zip(runs, restored):
+        assert_same_run(run, copy)
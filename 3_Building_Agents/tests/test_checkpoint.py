@@ -0,0 +1,103 @@
+from typing import Annotated, List, TypedDict
+
+import pytest
+
+from lib.checkpoint import JsonlCheckpointer, SqliteCheckpointer
+from lib.state_machine import EntryPoint, SnapshotRetention, StateMachine, Step, Termination, append
+
+
+class Counter(TypedDict):
+    items: Annotated[List[int], append]
+    n: int
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture(params=["sqlite", "jsonl"])
+def checkpointer(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteCheckpointer(str(tmp_path / "runs.db"))
+    return JsonlCheckpointer(str(tmp_path / "runs.jsonl"))
+
+
+def counting_machine(checkpointer, executed, crash_at=None, retention=None):
+    """entry -> tick (looping until n == 10) -> end; tick raises once at ``crash_at``"""
+    machine = StateMachine[Counter](Counter, checkpointer=checkpointer, retention=retention)
+    entry, end = EntryPoint(), Termination()
+
+    def tick(state):
+        if state["n"] == crash_at:
+            raise Crash()
+        executed.append(state["n"])
+        return {"items": [state["n"]], "n": state["n"] + 1}
+
+    step = Step("tick", tick)
+    machine.add_steps([entry, step, end])
+    machine.connect(entry, step)
+    machine.connect(step, [step, end], lambda state: end if state["n"] >= 10 else step)
+    return machine
+
+
+@pytest.mark.parametrize("retention", [None, SnapshotRetention.last(3)])
+def test_resume_continues_after_the_last_completed_step(checkpointer, retention):
+    executed = []
+    with pytest.raises(Crash):
+        counting_machine(checkpointer, executed, crash_at=6, retention=retention).run(
+            {"items": [], "n": 0}, run_id="run-1")
+    assert executed == [0, 1, 2, 3, 4, 5]
+
+    executed.clear()
+    run = counting_machine(checkpointer, executed, retention=retention).resume("run-1")
+
+    assert executed == [6, 7, 8, 9]
+    assert run.run_id == "run-1"
+    assert run.get_final_state() == {"items": list(range(10)), "n": 10}
+    uninterrupted = counting_machine(None, [], retention=retention).run({"items": [], "n": 0})
+    assert [s.state_data for s in run.snapshots] == [s.state_data for s in uninterrupted.snapshots]
+
+
+def test_resuming_a_completed_run_executes_nothing(checkpointer):
+    executed = []
+    first = counting_machine(checkpointer, executed).run({"items": [], "n": 0}, run_id="done")
+    executed.clear()
+    again = counting_machine(checkpointer, executed).resume("done")
+
+    assert executed == []
+    assert again.get_final_state() == first.get_final_state()
+    assert len(again.snapshots) == len(first.snapshots)
+
+
+def test_resume_keeps_a_pending_join_waiting(checkpointer):
+    """entry -> [A, B]; A -> A2 -> J; B -> J, interrupted in A2"""
+    class Log(TypedDict):
+        messages: Annotated[List[str], append]
+
+    fail = {"A2": True}
+
+    def say(word):
+        def logic(state):
+            if fail.get(word):
+                raise Crash()
+            return {"messages": [word]}
+        return Step(word, logic)
+
+    def machine():
+        m = StateMachine[Log](Log, checkpointer=checkpointer)
+        entry, end = EntryPoint(), Termination()
+        a, a2, b, join = say("A"), say("A2"), say("B"), say("J")
+        m.add_steps([entry, a, a2, b, join, end])
+        m.connect(entry, [a, b])
+        m.connect(a, a2)
+        m.connect(a2, join)
+        m.connect(b, join)
+        m.connect(join, end)
+        return m
+
+    with pytest.raises(Crash):
+        machine().run({"messages": []}, run_id="join")
+    fail.clear()
+    run = machine().resume("join")
+
+    assert run.get_final_state()["messages"] == ["A", "B", "A2", "J"]
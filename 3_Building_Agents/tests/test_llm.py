@@ -0,0 +1,151 @@
+import asyncio
+import gc
+import threading
+from types import SimpleNamespace
+
+from lib import llm as llm_module
+from lib.llm import LLM
+from lib.messages import UserMessage
+from lib.rate_limiting import RateLimiter
+from lib.tooling import tool
+
+
+class FakeStream:
+    """Chunks of a streamed completion; the last one carries the usage"""
+
+    def __init__(self, words):
+        self.chunks = [self.chunk(content=word) for word in words]
+        self.chunks.append(SimpleNamespace(choices=[], usage=SimpleNamespace(
+            prompt_tokens=20, completion_tokens=len(words), total_tokens=20 + len(words))))
+        self.closed = False
+
+    @staticmethod
+    def chunk(content):
+        delta = SimpleNamespace(content=content, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+def streaming_llm(monkeypatch, stream):
+    llm = LLM("model", api_key="key", rate_limiter=RateLimiter(tokens_per_minute=60_000))
+    monkeypatch.setattr(llm, "_request", lambda send, charge: stream)
+    return llm
+
+
+def test_stream_settles_with_the_reported_usage(monkeypatch):
+    stream = FakeStream(["a", "b", "c"])
+    llm = streaming_llm(monkeypatch, stream)
+    events = list(llm.stream("hi"))
+
+    assert events[-1].message.content == "abc"
+    assert events[-1].message.token_usage.total_tokens == 23
+    assert llm.rate_limiter.stats.used_tokens == 23
+    assert stream.closed
+
+
+def test_stream_abandoned_early_still_settles_and_closes(monkeypatch):
+    stream = FakeStream(["a", "b", "c"])
+    llm = streaming_llm(monkeypatch, stream)
+    events = llm.stream("hi")
+    assert next(events).content == "a"
+    events.close()
+
+    assert stream.closed
+    assert llm.rate_limiter.stats.estimated_tokens > 0
+    assert llm.rate_limiter.stats.used_tokens == 0
+
+
+def test_request_cap_holds_across_event_loops():
+    lock = threading.Lock()
+    counts = {"now": 0, "peak": 0}
+
+    async def request():
+        async with llm_module._request_slot():
+            with lock:
+                counts["now"] += 1
+                counts["peak"] = max(counts["peak"], counts["now"])
+            await asyncio.sleep(0.005)
+            with lock:
+                counts["now"] -= 1
+
+    async def requests():
+        await asyncio.gather(*(request() for _ in range(10)))
+
+    llm_module.set_max_concurrency(3)
+    try:
+        threads = [threading.Thread(target=asyncio.run, args=(requests(),)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        llm_module.set_max_concurrency(llm_module.MAX_CONCURRENT_REQUESTS)
+
+    assert counts["peak"] == 3
+    assert llm_module._request_slots.in_flight == 0
+
+
+def schema_names(payload):
+    return [schema["function"]["name"] for schema in payload["tools"]]
+
+
+def test_tools_payload_is_reused_until_the_tools_change():
+    @tool
+    def first(query: str) -> str:
+        """First tool"""
+        return query
+
+    @tool
+    def second(query: str) -> str:
+        """Second tool"""
+        return query
+
+    llm = LLM("model", api_key="key", tools=[first])
+    messages = [UserMessage(content="hi")]
+    payload = llm._build_payload(messages)
+    assert llm._build_payload(messages)["tools"] is payload["tools"]
+
+    llm.register_tool(second)
+    assert schema_names(llm._build_payload(messages)) == ["first", "second"]
+    assert schema_names(llm._build_payload(messages, tool_names={"second"})) == ["second"]
+
+    @tool(name="first", description="Replacement of the first tool")
+    def replacement(query: str) -> str:
+        return query
+
+    llm.register_tool(replacement)
+    schemas = llm._build_payload(messages)["tools"]
+    assert [s["function"]["description"] for s in schemas] == ["Replacement of the first tool", "Second tool"]
+
+
+def test_shared_client_is_keyed_by_api_key_and_base_url():
+    client = llm_module.shared_client("key-a", None)
+
+    assert llm_module.shared_client("key-a", None) is client
+    assert llm_module.shared_client("key-b", None) is not client
+    assert llm_module.shared_client("key-a", "http://localhost:1/v1") is not client
+    assert LLM("model", api_key="key-a").client is client
+    assert LLM("other model", api_key="key-a", temperature=1).client is client
+
+
+def test_async_clients_are_spread_round_robin_and_dropped_with_their_loop():
+    async def clients(n):
+        return [llm_module.shared_async_client("key", None) for _ in range(n)]
+
+    before = len(llm_module._loop_pools)
+    llm_module.set_max_concurrency(3 * llm_module.REQUESTS_PER_ASYNC_CLIENT)
+    try:
+        first = asyncio.run(clients(6))
+        second = asyncio.run(clients(1))
+    finally:
+        llm_module.set_max_concurrency(llm_module.MAX_CONCURRENT_REQUESTS)
+
+    assert first[:3] == first[3:] and len({id(c) for c in first}) == 3
+    assert all(second[0] is not client for client in first)
+    gc.collect()
+    assert len(llm_module._loop_pools) == before
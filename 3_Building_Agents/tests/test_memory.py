@@ -0,0 +1,104 @@
+import pytest
+
+from lib.memory import InMemorySessionStore, SessionNotFoundError, ShortTermMemory, SqliteSessionStore
+from lib.state_machine import Run
+
+
+class FakeClock:
+    """Advances by one second on every reading, so accesses never tie"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return InMemorySessionStore(clock=FakeClock(), **kwargs)
+        return SqliteSessionStore(str(tmp_path / "sessions.db"), clock=FakeClock(), **kwargs)
+    return make
+
+
+def test_least_recently_used_session_is_evicted(make_store):
+    store = make_store(max_sessions=2)
+    store.create("a")
+    store.create("b")
+    store.append("a", "hello")  # "b" is now the least recently used
+    store.create("c")
+
+    assert store.session_ids() == ["a", "c"]
+    assert store.objects("a") == ["hello"]
+
+
+def test_idle_sessions_expire(make_store):
+    store = make_store(ttl=3)
+    store.create("idle")
+    store.create("busy")
+    store.append("busy", 1)
+    store.append("busy", 2)
+
+    assert "idle" not in store
+    assert store.objects("busy") == [1, 2]
+
+
+def test_max_objects_drops_the_oldest(make_store):
+    store = make_store(max_objects=2)
+    store.create("s")
+    for i in range(4):
+        store.append("s", i)
+
+    assert store.objects("s") == [2, 3]
+    assert store.pop("s") == 3
+    assert store.last("s") == 2
+
+
+def test_sqlite_sessions_survive_a_new_store(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SqliteSessionStore(path)
+    store.create("s")
+    store.append("s", {"answer": 42})
+    store.append("s", Run.create(run_id="run-1"))
+    store.close()
+
+    reopened = SqliteSessionStore(path)
+    first, run = reopened.objects("s")
+    assert first == {"answer": 42}
+    assert isinstance(run, Run) and run.run_id == "run-1"
+    reopened.close()
+
+
+def test_short_term_memory_uses_the_given_store(tmp_path):
+    store = SqliteSessionStore(str(tmp_path / "sessions.db"))
+    memory = ShortTermMemory(store=store)
+    memory.create_session("s")
+    memory.add("hello", "s")
+
+    assert store.objects("s") == ["hello"]
+    assert ShortTermMemory(store=store).get_last_object("s") == "hello"
+    with pytest.raises(SessionNotFoundError):
+        memory.add("hello", "missing")
+
+
+def test_default_session_is_recreated_after_eviction():
+    memory = ShortTermMemory(store=InMemorySessionStore(max_sessions=1))
+    memory.create_session("s")
+    assert "default" not in memory.get_all_sessions()
+
+    memory.add("hello")
+    assert memory.get_all_objects() == ["hello"]
+
+
+def test_sessions_view_reads_through_to_the_store():
+    memory = ShortTermMemory()
+    memory.create_session("s")
+    memory.add("hello", "s")
+
+    assert dict(memory.sessions) == {"default": [], "s": ["hello"]}
+    assert "s" in memory.sessions and "missing" not in memory.sessions
+    memory.sessions["s"].append("not stored")
+    assert memory.get_all_objects("s") == ["hello"]
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.mark.skipif(os.environ.get("LIB_TREE", "exercises") != "exercises",
+                    reason="already running against another copy")
+def test_suite_passes_against_the_project_copy():
+    """project/lib is a copy of exercises/lib; the same suite must pass on it"""
+    result = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", TESTS],
+        cwd=os.path.dirname(TESTS),
+        env={**os.environ, "LIB_TREE": "project"},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stdout[-4000:]
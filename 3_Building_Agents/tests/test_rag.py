@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+from lib.messages import AIMessage
+from lib.rag import RAG
+
+
+class FakeStore:
+    def query(self, query_texts):
+        return {"documents": [[f"about {query_texts[0]}"]], "distances": [[0.1]]}
+
+
+class FakeLLM:
+    def __init__(self):
+        self.threads = set()
+
+    def invoke(self, messages):
+        self.threads.add(threading.current_thread())
+        return AIMessage(content="sync answer")
+
+    async def ainvoke(self, messages):
+        self.threads.add(threading.current_thread())
+        return AIMessage(content="async answer")
+
+
+def test_invoke_answers_from_the_retrieved_context():
+    llm = FakeLLM()
+    run = RAG(llm, FakeStore()).invoke("chess")
+    state = run.get_final_state()
+
+    assert state["documents"] == ["about chess"]
+    assert "about chess" in state["messages"][1].content
+    assert state["answer"] == "sync answer"
+
+
+def test_ainvoke_awaits_the_llm_on_the_event_loop():
+    llm = FakeLLM()
+    rag = RAG(llm, FakeStore())
+
+    async def main():
+        runs = await asyncio.gather(*(rag.ainvoke(f"question {i}") for i in range(5)))
+        return runs, threading.current_thread()
+
+    runs, loop_thread = asyncio.run(main())
+    assert llm.threads == {loop_thread}
+    assert [run.get_final_state()["answer"] for run in runs] == ["async answer"] * 5
+    assert runs[3].get_final_state()["documents"] == ["about question 3"]
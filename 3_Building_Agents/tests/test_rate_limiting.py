@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from lib.rate_limiting import RateLimiter, TokenCharge
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def limiter(clock, **kwargs):
+    # 600 tokens/min with a one-minute burst: the bucket starts with 600 tokens
+    return RateLimiter(tokens_per_minute=600, burst_seconds=60, base_delay=0.0, jitter=0.0,
+                       clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def failing(times, result="ok"):
+    calls = {"n": 0}
+
+    def send():
+        calls["n"] += 1
+        if calls["n"] <= times:
+            raise Throttled()
+        return result
+    return send
+
+
+def test_failed_attempts_give_their_tokens_back():
+    clock = FakeClock()
+    rate_limiter = limiter(clock)
+    charge = rate_limiter.charge(100)
+
+    assert rate_limiter.call(failing(2), charge.charged) == "ok"
+    assert rate_limiter.tokens.level == pytest.approx(500)
+    assert (rate_limiter.stats.attempts, rate_limiter.stats.retries) == (3, 2)
+
+    rate_limiter.settle(charge, 40)
+    assert rate_limiter.tokens.level == pytest.approx(560)
+    assert (rate_limiter.stats.estimated_tokens, rate_limiter.stats.used_tokens) == (100, 40)
+
+
+def test_a_call_that_fails_for_good_keeps_nothing_charged():
+    clock = FakeClock()
+    rate_limiter = limiter(clock, max_retries=2)
+
+    with pytest.raises(Throttled):
+        rate_limiter.call(failing(10), rate_limiter.charge(100).charged)
+    assert rate_limiter.tokens.level == pytest.approx(600)
+    assert (rate_limiter.stats.attempts, rate_limiter.stats.failures) == (3, 1)
+
+
+def test_async_call_gives_failed_attempts_tokens_back():
+    clock = FakeClock()
+    rate_limiter = limiter(clock)
+    send = failing(2)
+
+    async def asend():
+        return send()
+
+    assert asyncio.run(rate_limiter.acall(asend, 100)) == "ok"
+    assert rate_limiter.tokens.level == pytest.approx(500)
+
+
+def test_settle_uses_the_ratio_of_the_reservation():
+    clock = FakeClock()
+    rate_limiter = limiter(clock)
+    first, second = rate_limiter.charge(100), rate_limiter.charge(100)
+    rate_limiter.call(lambda: None, first.charged)
+    rate_limiter.call(lambda: None, second.charged)
+
+    # the first settle moves the ratio to 0.2 * 0.5 + 0.8 * 1.0 = 0.9
+    rate_limiter.settle(first, 50)
+    assert rate_limiter.usage_ratio == pytest.approx(0.9)
+    # the second call took 100 tokens, so 50 come back, not 90 - 50
+    rate_limiter.settle(second, 50)
+    assert rate_limiter.tokens.level == pytest.approx(500)
+    assert rate_limiter.charge(100) == TokenCharge(100, pytest.approx(82))
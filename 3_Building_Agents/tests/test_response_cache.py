@@ -0,0 +1,30 @@
+from lib.llm import ResponseCache
+from lib.messages import AIMessage, TokenUsage
+
+PAYLOAD = {"model": "model", "temperature": 0.0, "messages": [{"role": "user", "content": "hi"}]}
+
+
+def answer():
+    return AIMessage(content="hello", token_usage=TokenUsage(prompt_tokens=8, completion_tokens=2, total_tokens=10))
+
+
+def test_hits_count_the_tokens_they_save():
+    cache = ResponseCache()
+    key = cache.key(PAYLOAD)
+    assert cache.get(key) is None
+    cache.set(key, PAYLOAD, answer())
+
+    assert cache.get(key).content == "hello"
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.tokens_saved) == (1, 1, 10)
+
+
+def test_sqlite_tier_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "responses.db")
+    first = ResponseCache(path=path)
+    first.set(first.key(PAYLOAD), PAYLOAD, answer())
+
+    second = ResponseCache(path=path)
+    cached = second.get(second.key(PAYLOAD))
+    assert cached.content == "hello"
+    assert cached.token_usage.total_tokens == 10
+    assert second.stats.tokens_saved == 10
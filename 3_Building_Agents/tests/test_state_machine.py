@@ -0,0 +1,357 @@
+import asyncio
+import threading
+import time
+from typing import Annotated, List, TypedDict
+
+import pytest
+
+from lib.state_machine import (
+    CancellationToken,
+    EntryPoint,
+    HedgePolicy,
+    RunCancelledError,
+    RunTimeoutError,
+    SnapshotRetention,
+    StateMachine,
+    Step,
+    StepHooks,
+    StepTimeoutError,
+    Termination,
+    append,
+)
+
+
+class State(TypedDict):
+    messages: Annotated[List[str], append]
+
+
+def say(word):
+    return Step(word, lambda state: {"messages": [word]})
+
+
+def fan_in_machine():
+    """entry -> [A, B]; A -> A2 -> J; B -> J; J -> end"""
+    machine = StateMachine[State](State)
+    entry, end = EntryPoint(), Termination()
+    a, a2, b, join = say("A"), say("A2"), say("B"), say("J")
+    machine.add_steps([entry, a, a2, b, join, end])
+    machine.connect(entry, [a, b])
+    machine.connect(a, a2)
+    machine.connect(a2, join)
+    machine.connect(b, join)
+    machine.connect(join, end)
+    return machine
+
+
+def test_fan_in_waits_for_the_longer_branch():
+    run = fan_in_machine().run({"messages": []})
+
+    assert [s.step_id for s in run.snapshots] == ["__entry__", "A", "B", "A2", "J"]
+    assert run.get_final_state()["messages"] == ["A", "B", "A2", "J"]
+
+
+def test_fan_in_waits_for_the_longer_branch_async():
+    run = asyncio.run(fan_in_machine().arun({"messages": []}))
+
+    assert run.get_final_state()["messages"] == ["A", "B", "A2", "J"]
+
+
+class Scores(TypedDict):
+    log: List[str]
+    best: int
+    last: str
+
+
+def test_branches_join_through_reducers():
+    machine = StateMachine[Scores](Scores, reducers={"best": lambda base, values: max([base] + values)})
+    entry, end = EntryPoint(), Termination()
+    low = Step("low", lambda state: {"log": state["log"] + ["low"], "best": 3, "last": "low"})
+    high = Step("high", lambda state: {"log": state["log"] + ["high"], "best": 7, "last": "high"})
+    machine.add_steps([entry, low, high, end])
+    machine.connect(entry, [low, high])
+    machine.connect(low, end)
+    machine.connect(high, end)
+    final = machine.run({"log": ["start"], "best": 5, "last": ""}).get_final_state()
+
+    # lists without a reducer get every branch's new items, in branch order
+    assert final["log"] == ["start", "low", "high"]
+    assert final["best"] == 7
+    # other fields without a reducer: the last branch wins
+    assert final["last"] == "high"
+
+
+class Counter(TypedDict):
+    items: Annotated[List[int], append]
+    n: int
+
+
+def counting_machine(steps=10, **kwargs):
+    """entry -> tick (looping ``steps`` times) -> end"""
+    machine = StateMachine[Counter](Counter, **kwargs)
+    entry, end = EntryPoint(), Termination()
+    tick = Step("tick", lambda state: {"items": [state["n"]], "n": state["n"] + 1})
+    machine.add_steps([entry, tick, end])
+    machine.connect(entry, tick)
+    machine.connect(tick, [tick, end], lambda state: end if state["n"] >= steps else tick)
+    return machine
+
+
+@pytest.mark.parametrize("retention, kept, dropped_steps", [
+    (None, ["__entry__"] + ["tick"] * 10, 0),
+    (SnapshotRetention.final_only(), ["tick"], 9),
+    (SnapshotRetention.last(3), ["tick"] * 3, 7),
+    (SnapshotRetention.every(4), ["__entry__"] + ["tick"] * 3, 7),
+])
+def test_retention_keeps_the_latest_snapshot_and_counts_the_dropped(retention, kept, dropped_steps):
+    run = counting_machine(retention=retention).run({"items": [], "n": 0})
+
+    assert [s.step_id for s in run.snapshots] == kept
+    assert run.recorded_snapshots == 11
+    assert run.dropped_snapshots == 11 - len(kept)
+    assert run.metadata["dropped_steps"] == dropped_steps
+    # kept snapshots still hold their full state, not only their delta
+    for snapshot in run.snapshots:
+        assert snapshot.state_data["items"] == list(range(snapshot.state_data["n"]))
+    assert run.get_final_state() == {"items": list(range(10)), "n": 10}
+
+
+class Lookup(TypedDict):
+    query: str
+    mode: str
+    detail: str
+    noise: int
+    answer: str
+
+
+def test_step_cache_is_keyed_on_the_fields_the_step_reads():
+    calls = []
+
+    def answer(state):
+        calls.append(state["query"])
+        if state["mode"] == "detailed":
+            return {"answer": f"{state['query']} ({state['detail']})"}
+        return {"answer": state["query"]}
+
+    step = Step("answer", answer, cache=True)
+    machine = StateMachine[Lookup](Lookup)
+    entry, end = EntryPoint(), Termination()
+    machine.add_steps([entry, step, end])
+    machine.connect(entry, step)
+    machine.connect(step, end)
+
+    def run(**fields):
+        state = {"query": "q", "mode": "short", "detail": "d", "noise": 0, "answer": "", **fields}
+        return machine.run(state).get_final_state()["answer"]
+
+    assert run() == "q"
+    # fields the step never read do not invalidate its result
+    assert run(noise=1, detail="other") == "q"
+    assert len(calls) == 1
+    # a field it read does
+    assert run(query="r") == "r"
+    assert len(calls) == 2
+    # a field read only on another path is part of that path's key
+    assert run(mode="detailed") == "q (d)"
+    assert run(mode="detailed", detail="e") == "q (e)"
+    assert run(mode="detailed", detail="e", noise=5) == "q (e)"
+    assert len(calls) == 4
+    stats = machine.cache_stats()["answer"]
+    assert (stats.hits, stats.misses) == (2, 4)
+
+
+def test_append_fields_take_only_the_new_items():
+    initial = {"items": [-1], "n": 0}
+    run = counting_machine(steps=3).run(initial)
+
+    assert run.get_final_state()["items"] == [-1, 0, 1, 2]
+    assert initial == {"items": [-1], "n": 0}
+    assert Step("one", lambda state: {"items": [1]}).run({"items": [0], "n": 0}, Counter)["items"] == [0, 1]
+
+
+def test_append_fields_join_every_branch():
+    machine = StateMachine[Counter](Counter)
+    entry, end = EntryPoint(), Termination()
+    a = Step("a", lambda state: {"items": [100]})
+    b = Step("b", lambda state: {"items": [200, 201]})
+    join = Step("join", lambda state: {"items": [9]})
+    machine.add_steps([entry, a, b, join, end])
+    machine.connect(entry, [a, b])
+    machine.connect(a, join)
+    machine.connect(b, join)
+    machine.connect(join, end)
+    run = machine.run({"items": [1], "n": 0})
+
+    assert [(s.step_id, s.state_data["items"]) for s in run.snapshots] == [
+        ("__entry__", [1]), ("a", [1, 100]), ("b", [1, 200, 201]), ("join", [1, 100, 200, 201, 9])]
+
+
+
+class Recorder(StepHooks[Counter]):
+    """Keeps the item lists every hook call was shown"""
+
+    def __init__(self):
+        self.seen = []
+
+    def before_step(self, step_id, state):
+        self.seen.append((state["items"], list(state["items"])))
+
+    def after_step(self, step_id, state, update, duration):
+        self.seen.append((state["items"], list(state["items"])))
+
+
+def test_append_fields_leave_lists_shown_to_hooks_alone():
+    recorder = Recorder()
+    run = counting_machine(steps=3, hooks=[recorder]).run({"items": [], "n": 0})
+
+    assert run.get_final_state()["items"] == [0, 1, 2]
+    assert [len(kept) for kept, _ in recorder.seen] == [0, 0, 0, 0, 1, 1, 2, 2]
+    assert all(kept == copied for kept, copied in recorder.seen)
+
+def test_fan_in_inside_a_loop_waits_for_the_longer_branch():
+    """entry -> a -> [b -> b2, c] -> d -> a (twice) -> end"""
+    class Loop(TypedDict):
+        messages: Annotated[List[str], append]
+        rounds: int
+
+    machine = StateMachine[Loop](Loop)
+    entry, end = EntryPoint(), Termination()
+    a = Step("a", lambda state: {"messages": ["a"]})
+    b, b2, c = say("b"), say("b2"), say("c")
+    d = Step("d", lambda state: {"messages": ["d:" + ",".join(m for m in state["messages"] if len(m) <= 2)],
+                                 "rounds": state["rounds"] + 1})
+    machine.add_steps([entry, a, b, b2, c, d, end])
+    machine.connect(entry, a)
+    machine.connect(a, [b, c])
+    machine.connect(b, b2)
+    machine.connect(b2, d)
+    machine.connect(c, d)
+    machine.connect(d, [a, end], lambda state: end if state["rounds"] >= 2 else a)
+    run = machine.run({"messages": [], "rounds": 0})
+
+    steps = [s.step_id for s in run.snapshots]
+    assert steps == ["__entry__", "a", "b", "c", "b2", "d", "a", "b", "c", "b2", "d"]
+    messages = run.get_final_state()["messages"]
+    assert messages[:5] == ["a", "b", "c", "b2", "d:a,b,c,b2"]
+    assert messages[5:] == ["a", "b", "c", "b2", "d:a,b,c,b2,a,b,c,b2"]
+
+
+def chain(*steps):
+    """entry -> steps[0] -> ... -> steps[-1] -> end"""
+    machine = StateMachine[State](State)
+    entry, end = EntryPoint(), Termination()
+    machine.add_steps([entry, *steps, end])
+    for source, target in zip([entry, *steps], [*steps, end]):
+        machine.connect(source, target)
+    return machine
+
+
+def test_step_timeout_stops_the_run():
+    release = threading.Event()
+    hung = Step("hung", lambda state: release.wait(5) and {"messages": ["late"]}, timeout=0.05)
+    try:
+        with pytest.raises(StepTimeoutError) as raised:
+            chain(say("A"), hung).run({"messages": []})
+    finally:
+        release.set()
+
+    run = raised.value.run
+    assert [s.step_id for s in run.snapshots] == ["__entry__", "A"]
+    assert [(e["type"], e["step_id"]) for e in run.events] == [("step_timeout", "hung")]
+    assert run.metadata["timeouts"] == 1
+
+
+def test_run_budget_expires_in_the_step_that_overruns_it():
+    def slow(word):
+        return Step(word, lambda state: time.sleep(0.1) or {"messages": [word]})
+
+    with pytest.raises(RunTimeoutError) as raised:
+        chain(slow("A"), slow("B"), slow("C")).run({"messages": []}, timeout=0.15)
+
+    run = raised.value.run
+    assert run.get_final_state()["messages"] == ["A"]
+    assert [(e["type"], e["step_id"]) for e in run.events] == [("run_timeout", "B")]
+
+
+def test_cancellation_stops_a_run_waiting_on_a_step():
+    token, release = CancellationToken(), threading.Event()
+
+    def blocked(state):
+        threading.Timer(0.02, token.cancel, args=("user left",)).start()
+        release.wait(5)
+        return {"messages": ["late"]}
+
+    try:
+        with pytest.raises(RunCancelledError) as raised:
+            chain(say("A"), Step("blocked", blocked)).run({"messages": []}, cancellation=token)
+    finally:
+        release.set()
+
+    run = raised.value.run
+    assert run.get_final_state()["messages"] == ["A"]
+    assert (run.events[0]["type"], run.events[0]["step_id"]) == ("cancelled", "blocked")
+    assert run.events[0]["reason"] == "user left"
+
+
+def test_cancellation_cancels_a_coroutine_step():
+    token, cancelled = CancellationToken(), []
+
+    async def blocked(state):
+        asyncio.get_running_loop().call_later(0.02, token.cancel)
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return {"messages": ["late"]}
+
+    async def main():
+        started = time.perf_counter()
+        with pytest.raises(RunCancelledError) as raised:
+            await chain(say("A"), Step("blocked", blocked)).arun({"messages": []}, cancellation=token)
+        return raised.value.run, time.perf_counter() - started
+
+    run, elapsed = asyncio.run(main())
+    assert elapsed < 1
+    assert cancelled == [True]
+    assert run.metadata["cancelled"]
+
+
+def test_hedged_attempt_wins_over_a_stalled_one():
+    calls, release = [], threading.Event()
+
+    def flaky(state):
+        calls.append(len(calls))
+        if len(calls) == 1:
+            release.wait(5)  # The first attempt stalls
+        return {"messages": [f"attempt {len(calls)}"]}
+
+    machine = chain(Step("flaky", flaky, hedge=HedgePolicy(delay=0.02)))
+    try:
+        run = machine.run({"messages": []})
+    finally:
+        release.set()
+
+    assert run.get_final_state()["messages"] == ["attempt 2"]
+    assert [(e["type"], e["step_id"], e["winner"]) for e in run.events] == [("hedge", "flaky", "hedge")]
+    assert run.metadata["hedge_wins"] == 1
+
+
+def test_hedged_coroutine_attempt_wins_and_the_loser_is_cancelled():
+    calls, cancelled = [], []
+
+    async def flaky(state):
+        calls.append(len(calls))
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        return {"messages": [f"attempt {len(calls)}"]}
+
+    machine = chain(Step("flaky", flaky, hedge=HedgePolicy(delay=0.02)))
+    run = asyncio.run(machine.arun({"messages": []}))
+
+    assert run.get_final_state()["messages"] == ["attempt 2"]
+    assert run.events[0]["winner"] == "hedge"
+    assert cancelled == [True]
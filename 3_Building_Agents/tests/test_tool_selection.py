@@ -0,0 +1,106 @@
+import pytest
+
+import lib.agents as agents
+from lib.messages import AIMessage
+from lib.tool_selection import EmbeddingToolSelector, TfidfToolSelector
+from lib.tooling import tool
+
+
+@tool
+def get_weather(city: str) -> str:
+    """Current weather forecast for a city"""
+    return "sunny"
+
+
+@tool
+def convert_currency(amount: float, currency: str) -> str:
+    """Convert an amount of money into another currency"""
+    return "42"
+
+
+@tool
+def set_reminder(text: str, when: str) -> str:
+    """Schedule a reminder for the user"""
+    return "ok"
+
+
+@tool
+def search_flights(origin: str, destination: str) -> str:
+    """Search flights between two airports"""
+    return "[]"
+
+
+TOOLS = [get_weather, convert_currency, set_reminder, search_flights]
+NAMES = [t.name for t in TOOLS]
+
+
+def embed(texts):
+    """One dimension per topic, counting the topic's keywords in the text"""
+    keywords = [("weather", "forecast", "rain"), ("currency", "money", "euro"),
+                ("reminder", "remind"), ("flight", "airport", "fly")]
+    return [[sum(text.lower().count(word) for word in words) for words in keywords] for text in texts]
+
+
+@pytest.fixture(params=["tfidf", "embedding"])
+def selector(request):
+    if request.param == "tfidf":
+        return TfidfToolSelector().fit(TOOLS)
+    return EmbeddingToolSelector(embed).fit(TOOLS)
+
+
+def test_selects_the_relevant_tool(selector):
+    assert selector.select("Will it rain? Show me the weather forecast", k=1) == ["get_weather"]
+    assert selector.select("remind me to book a flight to the airport", k=2) == ["set_reminder", "search_flights"]
+    assert selector.rank("how many euro is that money")[0][0] == "convert_currency"
+
+
+def test_k_bounds_the_selection(selector):
+    query = "weather forecast before my flight, and remind me about the currency"
+    for k in range(1, len(TOOLS) + 1):
+        assert len(selector.select(query, k)) == k
+    # Names come back in registration order, not by score
+    assert selector.select(query, len(TOOLS)) == NAMES
+
+
+def test_irrelevant_query_falls_back_to_every_tool(selector):
+    assert selector.select("tell me a joke", k=1) == NAMES
+
+
+def test_tools_scoring_zero_are_left_out(selector):
+    assert selector.select("weather forecast", k=3) == ["get_weather"]
+
+
+class FinalAnswerLLM:
+    """Stands in for LLM, recording the tools advertised on each call"""
+    advertised = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def invoke(self, messages, tool_names=None, **kwargs):
+        FinalAnswerLLM.advertised.append(tool_names)
+        return AIMessage(content="final answer")
+
+
+def test_agent_advertises_only_the_selected_tools(monkeypatch):
+    monkeypatch.setattr(agents, "LLM", FinalAnswerLLM)
+    monkeypatch.setattr(FinalAnswerLLM, "advertised", [])
+    agent = agents.Agent("model", "instructions", tools=TOOLS, max_tools=2)
+
+    run = agent.invoke("what is the weather forecast in Lisbon?")
+
+    assert FinalAnswerLLM.advertised == [["get_weather"]]
+    selection = run.metadata["tool_selection"]
+    assert selection["available"] == 4
+    assert selection["selected"] == ["get_weather"]
+    assert selection["schema_tokens_selected"] < selection["schema_tokens_all"]
+
+
+def test_agent_sends_every_tool_without_a_match(monkeypatch):
+    monkeypatch.setattr(agents, "LLM", FinalAnswerLLM)
+    monkeypatch.setattr(FinalAnswerLLM, "advertised", [])
+    agent = agents.Agent("model", "instructions", tools=TOOLS, max_tools=2)
+
+    agent.invoke("tell me a joke")
+
+    assert FinalAnswerLLM.advertised == [NAMES]
@@ -0,0 +1,117 @@
+import json
+
+from lib.messages import AIMessage, SystemMessage, ToolMessage, UserMessage
+from lib.tooling import ToolCall
+from lib.windowing import is_summary, message_tokens, window_messages
+
+
+def tool_turn(i, results=1):
+    """A user question answered through ``results`` tool calls"""
+    calls = [ToolCall(id=f"call-{i}-{j}", type="function",
+                      function={"name": "lookup", "arguments": json.dumps({"query": f"{i}-{j}"})})
+             for j in range(results)]
+    return [
+        UserMessage(content=f"question {i} " + "padding " * 20),
+        AIMessage(content=None, tool_calls=calls),
+        *(ToolMessage(content=f"result {i}-{j} " + "data " * 20, tool_call_id=call.id, name="lookup")
+          for j, call in enumerate(calls)),
+        AIMessage(content=f"answer {i}"),
+    ]
+
+
+def tokens(messages):
+    return sum(message_tokens(m) for m in messages)
+
+
+class Summarizer:
+    """Records what it is asked to fold"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, previous, messages):
+        self.calls.append((previous, messages))
+        return f"summary #{len(self.calls)}"
+
+
+def assert_tool_calls_paired(messages):
+    called = [c.id for m in messages if isinstance(m, AIMessage) for c in m.tool_calls or []]
+    answered = [m.tool_call_id for m in messages if isinstance(m, ToolMessage)]
+    assert sorted(called) == sorted(answered)
+
+
+def test_instructions_and_latest_tool_turns_survive_trimming():
+    instructions = SystemMessage(content="You are a helpful agent.")
+    turns = [tool_turn(i) for i in range(5)]
+    history = [instructions] + [m for turn in turns for m in turn]
+    budget = tokens([instructions] + turns[-1] + turns[-2]) + 10
+
+    window = window_messages(history, budget)
+
+    assert window.messages == [instructions] + turns[-2] + turns[-1]
+    assert window.trimmed_messages == 3 * len(turns[0])
+    assert window.kept_tokens <= budget < window.original_tokens
+    assert not window.summarized
+
+
+def test_history_within_budget_is_left_alone():
+    history = [SystemMessage(content="instructions")] + tool_turn(0)
+    summarize = Summarizer()
+
+    window = window_messages(history, tokens(history), summarize=summarize)
+
+    assert window.messages == history
+    assert summarize.calls == []
+
+
+def test_summary_is_written_once_and_reused():
+    instructions = SystemMessage(content="instructions")
+    turns = [tool_turn(i) for i in range(4)]
+    summarize = Summarizer()
+    budget = tokens([instructions] + turns[-1]) + 210
+
+    first = window_messages([instructions] + [m for turn in turns for m in turn], budget,
+                            summarize=summarize)
+    assert first.summarized
+    assert [previous for previous, _ in summarize.calls] == [None]
+    assert summarize.calls[0][1] == [m for turn in turns[:3] for m in turn]
+    assert is_summary(first.messages[1])
+    assert first.messages[2:] == turns[-1]
+
+    # The next conversation starts from the window; while it fits, the summary is kept as is
+    follow_up = [UserMessage(content="thanks"), AIMessage(content="you're welcome")]
+    second = window_messages(first.messages + follow_up, budget, summarize=summarize)
+    assert second.messages == first.messages + follow_up
+    assert len(summarize.calls) == 1
+
+    # Once it overflows again, the old summary is folded into the new one
+    third = window_messages(second.messages + tool_turn(4) + tool_turn(5), budget, summarize=summarize)
+    assert summarize.calls[1][0] == "summary #1"
+    assert [m.content for m in third.messages if is_summary(m)] == [
+        "Summary of the earlier conversation:\nsummary #2"
+    ]
+
+
+def test_window_never_splits_a_tool_call_from_its_results():
+    instructions = SystemMessage(content="instructions")
+    older, latest = tool_turn(0, results=3), tool_turn(1, results=2)
+    history = [instructions] + older + latest
+    # Room for the latest turn plus the older turn's tail (its results and
+    # answer), but not for the older turn as a whole
+    budget = tokens([instructions] + latest + older[2:]) + 2
+
+    window = window_messages(history, budget)
+
+    assert window.messages == [instructions] + latest
+    assert_tool_calls_paired(window.messages)
+
+
+def test_oversized_latest_turn_is_kept_whole():
+    instructions = SystemMessage(content="instructions")
+    latest = tool_turn(1, results=4)
+    history = [instructions] + tool_turn(0) + latest
+
+    window = window_messages(history, tokens([instructions]) + 10)
+
+    assert window.messages == [instructions] + latest
+    assert_tool_calls_paired(window.messages)